@@ -0,0 +1,74 @@
+"""
+bench_aio.py: Loopback packets per second of the batching asyncio datagram endpoint.
+
+A thread sends serialized packets to a PacketDatagramProtocol over the UDP
+loopback, the handler, optionally a coroutine function, is called once per
+packet (batch size 1) and with larger batches. Reports the packets decoded
+per second and the datagrams lost when the receiver falls behind. Run from
+the repository root:
+    python -m benchmarks.bench_aio [--packets N] [--batch-sizes 1,64] [--coroutine]
+"""
+
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+from serdepa.aio import open_endpoint
+
+from .shapes import SensorRecord
+
+
+def _send(data, address, count):
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for i in range(count):
+            sender.sendto(data[i % len(data)], address)
+    finally:
+        sender.close()
+
+
+async def _receive(data, count, batch_size, coroutine):
+    received = [0]
+
+    def handle(batch):
+        received[0] += len(batch)
+
+    async def handle_async(batch):
+        received[0] += len(batch)
+
+    transport, protocol = await open_endpoint(
+        SensorRecord, handle_async if coroutine else handle, batch_size=batch_size, local_addr=("127.0.0.1", 0))
+    sock = transport.get_extra_info("socket")
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sender = threading.Thread(target=_send, args=(data, transport.get_extra_info("sockname"), count))
+    start = time.perf_counter()
+    sender.start()
+    last = -1
+    while sender.is_alive() or received[0] != last:
+        last = received[0]
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start - 0.1
+    transport.close()
+    await protocol.wait_closed()
+    sender.join()
+    return received[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=100000)
+    parser.add_argument("--batch-sizes", default="1,64")
+    parser.add_argument("--coroutine", action="store_true", help="use a coroutine function as the handler")
+    args = parser.parse_args()
+
+    data = [SensorRecord(node=i, seq=i, timestamp=i).serialize() for i in range(1000)]
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        received, elapsed = asyncio.run(_receive(data, args.packets, batch_size, args.coroutine))
+        print("batch size {:<6} {:>10.0f} packets/s {:>6.1f} % lost".format(
+            batch_size, received / elapsed, 100.0 * (args.packets - received) / args.packets))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+bench_archive.py: Size and speed of packet archives against compressed raw captures.
+
+Writes a capture of interleaved SensorRecord and RoutePacket packets with
+increasing sequence numbers and timestamps as concatenated raw records, compressed
+as a whole, and as archives. Run from the repository root:
+    python -m benchmarks.bench_archive [--count N]
+"""
+
+import argparse
+import io
+import lzma
+import random
+import time
+import zlib
+
+from serdepa.archive import ArchiveWriter, ArchiveReader
+
+from .shapes import SensorRecord, RoutePacket, PointStruct
+
+
+def _capture(count):
+    rnd = random.Random(1)
+    packets = []
+    for i in range(count):
+        packets.append(SensorRecord(node=7, seq=i, timestamp=1600000000 + 5 * i,
+                                    rssi=rnd.randint(-90, -60), lqi=rnd.randint(100, 110)))
+        if i % 4 == 0:
+            packet = RoutePacket(source=7, seq=i // 4, origin=PointStruct(x=1, y=2))
+            packet.hops.extend(PointStruct(x=j, y=-j) for j in range(rnd.randint(0, 4)))
+            packets.append(packet)
+    return packets
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    packets = _capture(args.count)
+    raw = b"".join(packet.serialize() for packet in packets)
+    print("{} packets, {} bytes raw".format(len(packets), len(raw)))
+    print("{:<24} {:>12} {:>8}".format("", "bytes", "ratio"))
+    for name, compress in (("raw + zlib", zlib.compress), ("raw + lzma", lzma.compress)):
+        size = len(compress(raw))
+        print("{:<24} {:>12} {:>7.1f}x".format(name, size, len(raw) / size))
+
+    for compression in ("zlib", "lzma"):
+        def write():
+            f = io.BytesIO()
+            with ArchiveWriter(f, compression=compression) as writer:
+                for packet in packets:
+                    writer.write(packet)
+            return f
+        f, write_time = _timed(write)
+        size = len(f.getvalue())
+        reader = ArchiveReader(f, [SensorRecord, RoutePacket])
+        records, read_time = _timed(lambda: sum(1 for _ in reader.records()))
+        decoded, decode_time = _timed(lambda: sum(1 for _ in reader.packets()))
+        print("{:<24} {:>12} {:>7.1f}x  write {:.2f} s, read {:.2f} s, decode {:.2f} s".format(
+            "archive " + compression, size, len(raw) / size, write_time, read_time, decode_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+bench_clone.py: Packet clone against the generic copy.deepcopy and a serialize round trip.
+
+Copies a packet of every benchmark shape with packet.clone(), which copies
+the values of the fields, with the generic copy.deepcopy of the packet
+objects, as it worked before packets had __deepcopy__, and by deserializing
+the serialized packet into a new one. Run from the repository root:
+    python -m benchmarks.bench_clone [--number N] [--shape NAME]
+"""
+
+import argparse
+import copy
+import timeit
+
+from serdepa import SerdepaPacket
+
+from .shapes import SHAPES
+
+
+def _generic_deepcopy(packet):
+    hooks = SerdepaPacket.__dict__["__copy__"], SerdepaPacket.__dict__["__deepcopy__"]
+    del SerdepaPacket.__copy__, SerdepaPacket.__deepcopy__
+    try:
+        return copy.deepcopy(packet)
+    finally:
+        SerdepaPacket.__copy__, SerdepaPacket.__deepcopy__ = hooks
+
+
+def _round_trip(packet):
+    ret = type(packet)()
+    ret.deserialize(packet.serialize())
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--shape", choices=sorted(SHAPES))
+    args = parser.parse_args()
+
+    print("{:<20} {:>14} {:>14} {:>14}".format("shape", "deepcopy us", "round trip us", "clone us"))
+    for shape, (cls, factory) in sorted(SHAPES.items()):
+        if args.shape and shape != args.shape:
+            continue
+        packet = factory()
+        assert packet.clone() == _round_trip(packet) == packet
+        times = []
+        for func in (_generic_deepcopy, _round_trip, cls.clone):
+            try:
+                func(packet)
+            except TypeError:  # the generic deepcopy can't copy a struct.Struct
+                times.append("fails")
+                continue
+            elapsed = min(timeit.repeat(lambda: func(packet), number=args.number, repeat=5))
+            times.append("{:.1f}".format(elapsed / args.number * 1e6))
+        print("{:<20} {:>14} {:>14} {:>14}".format(shape, *times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+bench_filter.py: Filtering packets on raw bytes against decoding every packet first.
+
+A buffer of SensorRecord packets is filtered with SensorRecord.filter, which
+tests the predicates on the serialized data and only decodes the matching
+packets, and by decoding every packet and testing its fields. Run from the
+repository root:
+    python -m benchmarks.bench_filter [--count N] [--selectivity S]
+"""
+
+import argparse
+import random
+import time
+
+from .shapes import SensorRecord
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--selectivity", type=float, default=0.01, help="fraction of matching packets")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    nodes = max(1, int(round(1 / args.selectivity)))
+    data = b"".join(
+        SensorRecord(node=rnd.randrange(nodes), seq=i, rssi=rnd.randint(-100, -30)).serialize()
+        for i in range(args.count)
+    )
+    size = SensorRecord.static_size()
+
+    start = time.perf_counter()
+    decoded = []
+    for pos in range(0, len(data), size):
+        packet = SensorRecord()
+        packet.deserialize(data, pos, final=False)
+        if packet.node == 0 and packet.rssi > -100:
+            decoded.append(packet)
+    decode_all = time.perf_counter() - start
+
+    start = time.perf_counter()
+    filtered = list(SensorRecord.filter(data, node=0, rssi__gt=-100))
+    pushdown = time.perf_counter() - start
+    assert filtered == decoded
+
+    print("{} packets, {} match".format(args.count, len(filtered)))
+    for name, elapsed in (("decode, then test", decode_all), ("filter on raw bytes", pushdown)):
+        print("{:<24} {:>12.0f} packets/s".format(name, args.count / elapsed))
+
+
+if __name__ == "__main__":
+    main()
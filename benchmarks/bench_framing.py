@@ -0,0 +1,59 @@
+"""
+bench_framing.py: Throughput of HDLC framing and deframing.
+
+Run from the repository root:
+    python -m benchmarks.bench_framing [--size N]
+"""
+
+import argparse
+import os
+import time
+
+from serdepa.framing import escape, unescape, Deframer, frame
+
+
+def _escape_loop(data):
+    out = bytearray()
+    for byte in bytearray(data):
+        if byte in (0x7D, 0x7E):
+            out.append(0x7D)
+            out.append(byte ^ 0x20)
+        else:
+            out.append(byte)
+    return bytes(out)
+
+
+def _measure(name, func, data, repeat=5):
+    best = min(_elapsed(func, data) for _ in range(repeat))
+    print("{:<24} {:>10.1f} MB/s".format(name, len(data) / best / 1e6))
+
+
+def _elapsed(func, data):
+    start = time.perf_counter()
+    func(data)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--frame-size", type=int, default=256)
+    args = parser.parse_args()
+
+    data = os.urandom(args.size)
+    escaped = escape(data)
+    stream = b"".join(frame(data[i:i + args.frame_size]) for i in range(0, len(data), args.frame_size))
+
+    _measure("escape (per-byte loop)", _escape_loop, data[:args.size // 16])
+    _measure("escape", escape, data)
+    _measure("unescape", unescape, escaped)
+
+    def deframe(stream):
+        deframer = Deframer(max_length=2 * args.frame_size)
+        for i in range(0, len(stream), 4096):
+            deframer.feed(stream[i:i + 4096])
+    _measure("deframe 4 KiB chunks", deframe, stream)
+
+
+if __name__ == "__main__":
+    main()
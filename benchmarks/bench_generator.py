@@ -0,0 +1,37 @@
+"""
+bench_generator.py: Packets per second made by PacketGenerator.
+
+Run from the repository root:
+    python -m benchmarks.bench_generator [--count N]
+"""
+
+import argparse
+import time
+
+from serdepa.generator import PacketGenerator
+
+from .shapes import SensorRecord, RoutePacket
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000000)
+    args = parser.parse_args()
+
+    for packet_class in (SensorRecord, RoutePacket):
+        generator = PacketGenerator(packet_class, seed=1, sequence=["seq"])
+        start = time.perf_counter()
+        data = generator.generate(args.count)
+        elapsed = time.perf_counter() - start
+        print("{:<16} {:>12.0f} packets/s {:>8.1f} MB/s".format(
+            packet_class.__name__, args.count / elapsed, len(data) / elapsed / 1e6))
+
+        start = time.perf_counter()
+        for i in range(args.count // 10):
+            packet_class(seq=i).serialize()
+        elapsed = time.perf_counter() - start
+        print("{:<16} {:>12.0f} packets/s".format("  serialize()", args.count // 10 / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+bench_parallel.py: Scaling of decode_file_parallel with the number of worker processes.
+
+Run from the repository root:
+    python -m benchmarks.bench_parallel [--records N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from serdepa.parallel import decode_file_parallel
+
+from .shapes import SensorRecord
+
+
+def _node(packet):
+    return packet.node
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=1 << 20)
+    parser.add_argument("--packets", action="store_true",
+                        help="send whole packets back from the workers instead of a single field")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "records.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(args.records * SensorRecord.static_size()))
+
+        cpus = os.cpu_count() or 1
+        counts = sorted(set([1, 2, 4, 8, 16, cpus]) & set(range(1, cpus + 1)))
+        baseline = None
+        print("{:>8} {:>12} {:>14} {:>8}".format("workers", "seconds", "records/s", "speedup"))
+        for workers in counts:
+            start = time.perf_counter()
+            decoded = sum(1 for _ in decode_file_parallel(path, SensorRecord, workers=workers,
+                                                          chunk_size=args.chunk_size,
+                                                          transform=None if args.packets else _node))
+            elapsed = time.perf_counter() - start
+            assert decoded == args.records
+            baseline = baseline or elapsed
+            print("{:>8} {:>12.3f} {:>14.0f} {:>8.2f}".format(
+                workers, elapsed, decoded / elapsed, baseline / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+bench_pipeline.py: Dispatcher cost of KeyedFanout against decoding in the dispatcher.
+
+Compares the time the dispatching thread spends per packet when it only reads
+the key field and batches the data, and when it deserializes every packet to
+find its key. Run from the repository root:
+    python -m benchmarks.bench_pipeline [--packets N] [--workers N]
+"""
+
+import argparse
+import time
+
+from serdepa.pipeline import KeyedFanout
+
+from .shapes import RoutePacket, PointStruct
+
+
+def _ignore(packet):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true")
+    args = parser.parse_args()
+
+    data = []
+    for i in range(args.packets):
+        packet = RoutePacket(source=i % 50, seq=i)
+        packet.hops.extend(PointStruct(x=j, y=j) for j in range(3))
+        data.append(packet.serialize())
+
+    start = time.perf_counter()
+    for item in data:
+        packet = RoutePacket()
+        packet.deserialize(item)
+        hash(packet.source) % args.workers
+    decode = time.perf_counter() - start
+
+    fanout = KeyedFanout(RoutePacket, "source", _ignore, workers=args.workers, processes=args.processes)
+    start = time.perf_counter()
+    fanout.submit_many(data)
+    fanout.flush()
+    dispatch = time.perf_counter() - start
+    fanout.close()
+    total = time.perf_counter() - start
+
+    print("{:<36} {:>8.2f} us/packet".format("deserialize to find the key", decode / args.packets * 1e6))
+    print("{:<36} {:>8.2f} us/packet".format("KeyedFanout dispatch", dispatch / args.packets * 1e6))
+    print("{:<36} {:>8.2f} us/packet".format("KeyedFanout until all decoded", total / args.packets * 1e6))
+
+
+if __name__ == "__main__":
+    main()
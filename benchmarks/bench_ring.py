@@ -0,0 +1,90 @@
+"""
+bench_ring.py: Packets per second passed to another process through a PacketRing and a multiprocessing.Queue.
+
+The producer sends SensorRecord packets to one consumer process that decodes
+them, through a shared memory PacketRing in batches and through a
+multiprocessing.Queue one pickled packet at a time and in pickled batches.
+Run from the repository root:
+    python -m benchmarks.bench_ring [--count N] [--batch N]
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from serdepa.ring import PacketRing
+
+from .shapes import SensorRecord
+
+
+def _ring_consumer(ring, done):
+    count = 0
+    for packet in ring.reader(0, SensorRecord):
+        count += 1
+    done.put(count)
+    ring.close()
+
+
+def _queue_consumer(queue, done):
+    count = 0
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        count += len(item) if isinstance(item, list) else 1
+    done.put(count)
+
+
+def _run(target, args, produce):
+    done = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=args + (done,))
+    process.start()
+    start = time.perf_counter()
+    produce()
+    count = done.get()
+    elapsed = time.perf_counter() - start
+    process.join()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    packets = [SensorRecord(node=1, seq=i, timestamp=i * 10, rssi=-70, lqi=105) for i in range(args.count)]
+    batches = [packets[i:i + args.batch] for i in range(0, len(packets), args.batch)]
+
+    ring = PacketRing.create(capacity=1 << 20)
+    try:
+        def produce_ring():
+            for batch in batches:
+                ring.publish_many(batch)
+            ring.finish()
+        rate = _run(_ring_consumer, (ring,), produce_ring)
+        print("{:<32} {:>12.0f} packets/s".format("PacketRing, batch {}".format(args.batch), rate))
+    finally:
+        ring.close()
+
+    queue = multiprocessing.Queue(maxsize=1000)
+
+    def produce_queue():
+        for packet in packets:
+            queue.put(packet)
+        queue.put(None)
+    rate = _run(_queue_consumer, (queue,), produce_queue)
+    print("{:<32} {:>12.0f} packets/s".format("Queue, one packet", rate))
+
+    queue = multiprocessing.Queue(maxsize=1000)
+
+    def produce_batches():
+        for batch in batches:
+            queue.put(batch)
+        queue.put(None)
+    rate = _run(_queue_consumer, (queue,), produce_batches)
+    print("{:<32} {:>12.0f} packets/s".format("Queue, batch {}".format(args.batch), rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+bench_startup.py: Import time of a protocol module with many packet classes.
+
+Generates a module with the given number of packet classes and measures, in
+fresh interpreters, importing it, importing and using one class, and importing
+and preparing every class with validate_all(), which is what importing cost
+before classes were prepared lazily. Run from the repository root:
+    python -m benchmarks.bench_startup [--classes N]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+MODULE = '''
+from serdepa import *
+
+
+class Header{i}(SerdepaPacket):
+    _fields_ = [
+        ("dispatch", nx_uint8, 0x3F),
+        ("type", nx_uint8, {type}),
+        ("source", nx_uint16),
+        ("destination", nx_uint16),
+    ]
+
+
+class Packet{i}(SerdepaPacket):
+    _fields_ = [
+        ("header", Header{i}),
+        ("version", nx_bits(3)),
+        ("flags", nx_bits(5)),
+        ("seq", nx_uint32),
+        ("values", Array(nx_int16, 4)),
+        ("count", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+        ("crc", Checksum("crc16-ccitt")),
+    ]
+'''
+
+SCRIPTS = (
+    ("import serdepa", "import serdepa"),
+    ("import module", "import protocol"),
+    ("import, use one class", "import protocol; protocol.Packet0().serialize()"),
+    ("import, validate_all()", "import serdepa, protocol; serdepa.validate_all()"),
+)
+
+
+def _best(code, path, repeat):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([path, os.getcwd()]), PYTHONDONTWRITEBYTECODE="")
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, "-c", code], env=env)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", type=int, default=500, help="number of packet classes, in pairs")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(path, "protocol.py"), "w") as f:
+            for i in range(args.classes // 2):
+                f.write(MODULE.format(i=i, type=i % 256))
+        _best("import protocol", path, 1)  # compile the module once
+
+        print("{} packet classes".format(args.classes // 2 * 2))
+        for name, code in SCRIPTS:
+            print("{:<28} {:>10.1f} ms".format(name, _best(code, path, args.repeat) * 1000))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
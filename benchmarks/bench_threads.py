@@ -0,0 +1,52 @@
+"""
+bench_threads.py: Scaling of concurrent encode/decode with a ThreadPoolExecutor.
+
+Meaningful scaling needs a free-threaded interpreter (e.g. python3.13t), with the
+GIL enabled the numbers show the locking overhead instead. Run from the
+repository root:
+    python -m benchmarks.bench_threads [--packets N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .shapes import RoutePacket, route_packet
+
+
+def _roundtrip(batch):
+    for data in batch:
+        packet = RoutePacket()
+        packet.deserialize(data)
+        packet.serialize()
+    return len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=250)
+    args = parser.parse_args()
+
+    data = route_packet(hops=8).serialize()
+    batches = [[data] * args.batch for _ in range(args.packets // args.batch)]
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("Python {}, GIL {}".format(sys.version.split()[0], "enabled" if gil else "disabled"))
+    cpus = os.cpu_count() or 1
+    counts = sorted(set([1, 2, 4, 8, 16, cpus]) & set(range(1, cpus + 1)))
+    baseline = None
+    print("{:>8} {:>12} {:>14} {:>8}".format("threads", "seconds", "packets/s", "speedup"))
+    for threads in counts:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            start = time.perf_counter()
+            done = sum(executor.map(_roundtrip, batches))
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print("{:>8} {:>12.3f} {:>14.0f} {:>8.2f}".format(threads, elapsed, done / elapsed, baseline / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+bench_view.py: Rewriting a field of forwarded packets in place against decoding and re-encoding.
+
+Every RoutePacket in a list of received buffers gets a new source address and
+origin, once by deserializing, modifying and serializing the packet and once
+through RoutePacket.view, which packs the new values into the buffer. Run from
+the repository root:
+    python -m benchmarks.bench_view [--count N] [--hops N]
+"""
+
+import argparse
+import time
+
+from .shapes import RoutePacket, route_packet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=50000)
+    parser.add_argument("--hops", type=int, default=16)
+    args = parser.parse_args()
+
+    data = route_packet(args.hops).serialize()
+    received = [bytearray(data) for _ in range(args.count)]
+
+    start = time.perf_counter()
+    forwarded = []
+    for buffer in received:
+        packet = RoutePacket()
+        packet.deserialize(buffer)
+        packet.source = 7
+        packet.origin.x += 1
+        forwarded.append(packet.serialize())
+    recode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for buffer in received:
+        view = RoutePacket.view(buffer)
+        view.source = 7
+        origin = view.origin
+        origin.x += 1
+    in_place = time.perf_counter() - start
+    assert received[-1] == forwarded[-1]
+
+    for name, elapsed in (("deserialize, serialize", recode), ("view, pack in place", in_place)):
+        print("{:<24} {:>12.0f} packets/s".format(name, args.count / elapsed))
+
+
+if __name__ == "__main__":
+    main()
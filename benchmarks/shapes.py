@@ -0,0 +1,103 @@
+"""
+shapes.py: Representative packet shapes shared by the benchmarks.
+"""
+
+from serdepa import (
+    SerdepaPacket, Length, List, Array, ByteString, PackedList,
+    nx_uint8, nx_uint16, nx_uint32, nx_int16, nx_int32
+)
+
+
+class SensorRecord(SerdepaPacket):
+    """All fixed-size integer fields."""
+    _fields_ = [
+        ("node", nx_uint16),
+        ("seq", nx_uint32),
+        ("timestamp", nx_uint32),
+        ("rssi", nx_int16),
+        ("lqi", nx_uint8),
+        ("flags", nx_uint8),
+    ]
+
+
+class PointStruct(SerdepaPacket):
+    _fields_ = [
+        ("x", nx_int32),
+        ("y", nx_int32),
+    ]
+
+
+class RoutePacket(SerdepaPacket):
+    """A nested packet followed by a Length defined List of nested packets."""
+    _fields_ = [
+        ("source", nx_uint16),
+        ("seq", nx_uint32),
+        ("origin", PointStruct),
+        ("count", Length(nx_uint8, "hops")),
+        ("hops", List(PointStruct)),
+    ]
+
+
+class BlobPacket(SerdepaPacket):
+    """A small header followed by a large ByteString payload."""
+    _fields_ = [
+        ("header", nx_uint8),
+        ("seq", nx_uint32),
+        ("payload", ByteString()),
+    ]
+
+
+class StructArrayPacket(SerdepaPacket):
+    """A fixed length Array of nested packets."""
+    _fields_ = [
+        ("header", nx_uint8),
+        ("points", Array(PointStruct, 16)),
+    ]
+
+
+class RouteTable(SerdepaPacket):
+    """A Length defined packed list of nested packets, kept by column."""
+    _fields_ = [
+        ("source", nx_uint16),
+        ("count", Length(nx_uint16, "routes")),
+        ("routes", PackedList(PointStruct)),
+    ]
+
+
+def sensor_record():
+    return SensorRecord(node=0x1234, seq=100000, timestamp=1500000000, rssi=-70, lqi=200, flags=3)
+
+
+def route_packet(hops=16):
+    packet = RoutePacket(source=0x0102, seq=42)
+    packet.origin.x = 10
+    packet.origin.y = -10
+    for i in range(hops):
+        packet.hops.append(PointStruct(x=i, y=-i))
+    return packet
+
+
+def blob_packet(size=4096):
+    return BlobPacket(header=1, seq=7, payload=bytearray(i % 256 for i in range(size)))
+
+
+def struct_array_packet():
+    packet = StructArrayPacket(header=0xF1)
+    for i in range(16):
+        packet.points.append(PointStruct(x=i, y=i * 2))
+    return packet
+
+
+def route_table(routes=256):
+    packet = RouteTable(source=0x0102)
+    packet.routes.extend(PointStruct(x=i, y=-i) for i in range(routes))
+    return packet
+
+
+SHAPES = {
+    "fixed_ints": (SensorRecord, sensor_record),
+    "nested_list": (RoutePacket, route_packet),
+    "large_bytestring": (BlobPacket, blob_packet),
+    "struct_array": (StructArrayPacket, struct_array_packet),
+    "packed_struct_list": (RouteTable, route_table),
+}
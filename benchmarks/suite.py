@@ -0,0 +1,131 @@
+"""
+suite.py: Benchmark suite for serialize, serialize_segments, deserialize,
+construction, equality and memory use of representative packet shapes.
+
+Run from the repository root:
+    python -m benchmarks.suite                         # print results
+    python -m benchmarks.suite --save baseline.json    # store a baseline
+    python -m benchmarks.suite --compare baseline.json # exit 1 on regressions
+
+Times are the best per-operation time in microseconds over several repeats,
+memory is the number of bytes allocated per constructed or decoded packet.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+
+from .shapes import SHAPES
+
+
+def _time(func, number, repeat):
+    timer = timeit.Timer(func)
+    if number is None:
+        number = timer.autorange()[0]
+    return min(timer.repeat(number=number, repeat=repeat)) / number * 1e6
+
+
+def _memory(func, number):
+    keep = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(number):
+            keep.append(func())
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return float(after - before) / number
+
+
+def cases():
+    """
+    Yields (name, kind, callable) for every benchmark case, kind is "time" or "memory".
+    """
+    for shape, (cls, factory) in sorted(SHAPES.items()):
+        packet = factory()
+        other = factory()
+        data = packet.serialize()
+
+        def deserialize(cls=cls, data=data):
+            decoded = cls()
+            decoded.deserialize(data)
+            return decoded
+
+        yield "{}.construct".format(shape), "time", factory
+        yield "{}.serialize".format(shape), "time", packet.serialize
+        yield "{}.serialize_segments".format(shape), "time", packet.serialize_segments
+        yield "{}.deserialize".format(shape), "time", deserialize
+        yield "{}.clone".format(shape), "time", packet.clone
+        yield "{}.to_dict".format(shape), "time", packet.to_dict
+        yield "{}.to_dicts".format(shape), "time", lambda cls=cls, data=data * 100: cls.to_dicts(data)
+        yield "{}.equality".format(shape), "time", lambda packet=packet, other=other: packet == other
+        yield "{}.memory.construct".format(shape), "memory", factory
+        yield "{}.memory.deserialize".format(shape), "memory", deserialize
+
+
+def run(pattern=None, number=None, repeat=5):
+    results = {}
+    for name, kind, func in cases():
+        if pattern and pattern not in name:
+            continue
+        if kind == "time":
+            results[name] = _time(func, number, repeat)
+        else:
+            results[name] = _memory(func, number or 50)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of (name, old, new) entries that are worse than the baseline
+    by more than the threshold fraction.
+    """
+    regressions = []
+    for name, value in sorted(results.items()):
+        old = baseline.get(name)
+        if old and value > old * (1 + threshold):
+            regressions.append((name, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", help="only run cases containing this string")
+    parser.add_argument("--number", type=int, help="operations per repeat, automatic by default")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown or growth before failing, default 0.25")
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.number, args.repeat)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    for name, value in sorted(results.items()):
+        unit = "B" if ".memory." in name else "us"
+        line = "{:<40} {:>12.2f} {}".format(name, value, unit)
+        if name in baseline and baseline[name]:
+            line += " {:>+8.1%}".format(value / baseline[name] - 1)
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print("REGRESSION {}: {:.2f} -> {:.2f}".format(name, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+aio.py: An asyncio datagram endpoint that decodes packets and delivers them in batches.
+
+Every datagram holds one serialized packet. The protocol decodes the datagrams
+as they arrive and hands them to the application in batches of (packet, address)
+pairs, when batch_size packets are collected or batch_delay seconds after the
+first packet of the batch, so a burst of datagrams costs one callback.
+Datagrams that fail to decode are dropped and counted by the DeserializeError
+reason, other decoder exceptions are counted as "decoder" and passed to the
+loop's exception handler:
+
+    async def handle(batch):
+        for packet, address in batch:
+            ...
+
+    transport, protocol = await open_endpoint(registry, handle, local_addr=("0.0.0.0", 6000))
+
+Without a handler the batches are put in the asyncio.Queue protocol.batches
+and the protocol can be iterated with async for.
+"""
+
+import asyncio
+
+from .exceptions import DeserializeError
+from .serdepa import SuperSerdepaPacket
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class PacketDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    Decodes datagrams with a decoder, a packet class, a PacketRegistry or any
+    callable taking the datagram, and calls handler, a function or a coroutine
+    function, with lists of (packet, address). Without a handler the batches are
+    queued in batches, at most max_batches of them, further batches are dropped
+    and counted in errors as "overflow".
+    """
+
+    def __init__(self, decoder, handler=None, batch_size=64, batch_delay=0.005, max_batches=0):
+        if isinstance(decoder, SuperSerdepaPacket):
+            packet_class = decoder
+
+            def decoder(data):
+                packet = packet_class()
+                packet.deserialize(data)
+                return packet
+        elif hasattr(decoder, "decode"):
+            decoder = decoder.decode
+        self._decoder = decoder
+        self._handler = handler
+        self._coroutine = asyncio.iscoroutinefunction(handler)
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.batches = asyncio.Queue(max_batches) if handler is None else None
+        self.transport = None
+        self.received = 0
+        self.errors = {}
+        self._batch = []
+        self._timer = None
+        self._tasks = set()
+        self._closed = None
+
+    def _count(self, reason):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._closed = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        try:
+            packet = self._decoder(data)
+        except DeserializeError as e:
+            self._count(e.reason)
+            return
+        except Exception as e:
+            self._failed("decoder", "Packet decoder failed", e)
+            return
+        batch = self._batch
+        batch.append((packet, addr))
+        if len(batch) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_delay, self.flush)
+
+    def flush(self):
+        """
+        Delivers the collected packets now.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        if self._handler is None:
+            try:
+                self.batches.put_nowait(batch)
+            except asyncio.QueueFull:
+                self._count("overflow")
+            return
+        try:
+            if self._coroutine:
+                task = asyncio.get_running_loop().create_task(self._handler(batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._task_done)
+            else:
+                self._handler(batch)
+        except Exception as e:
+            self._failed("handler", "Packet batch handler failed", e)
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._failed("handler", "Packet batch handler failed", task.exception())
+
+    def _failed(self, reason, message, exception):
+        self._count(reason)
+        asyncio.get_running_loop().call_exception_handler({
+            "message": message,
+            "exception": exception,
+            "protocol": self,
+        })
+
+    def error_received(self, exc):
+        self._count("os_error")
+
+    def connection_lost(self, exc):
+        self.flush()
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(exc)
+
+    async def wait_closed(self):
+        """
+        Waits until the transport is closed and the running handlers have finished.
+        """
+        if self._closed is not None:
+            await self._closed
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.batches is None:
+            raise TypeError("The batches go to the handler.")
+        if self._closed is None:
+            raise RuntimeError("The protocol is not connected, iterate it after the endpoint is created.")
+        if self.batches.empty() and self._closed.done():
+            raise StopAsyncIteration
+        getter = asyncio.ensure_future(self.batches.get())
+        done, pending = await asyncio.wait([getter, self._closed], return_when=asyncio.FIRST_COMPLETED)
+        if getter in done:
+            return getter.result()
+        getter.cancel()
+        if not self.batches.empty():
+            return self.batches.get_nowait()
+        raise StopAsyncIteration
+
+
+async def open_endpoint(decoder, handler=None, batch_size=64, batch_delay=0.005, max_batches=0, **kwargs):
+    """
+    Creates a datagram endpoint with a PacketDatagramProtocol and returns the
+    (transport, protocol) pair. The keyword arguments, local_addr, remote_addr
+    etc., are passed to loop.create_datagram_endpoint.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(
+        lambda: PacketDatagramProtocol(decoder, handler, batch_size, batch_delay, max_batches),
+        **kwargs
+    )
@@ -0,0 +1,395 @@
+"""
+archive.py: Compressed archives of packets, delta-encoded per packet class.
+
+Records are grouped into blocks by packet class. In a block, every integer field
+at a static offset is stored as a column of differences to the same field of
+the previous record, so counters and timestamps become runs of small equal
+values, and the remaining bytes are stored column by column as well. The blocks
+are compressed with zlib or lzma and listed in an index at the end of the file
+with the range of sequence numbers they hold, a query only reads and
+decompresses the blocks it touches.
+
+    with ArchiveWriter("capture.sda") as writer:
+        for packet in packets:
+            writer.write(packet)
+
+    reader = ArchiveReader("capture.sda", [Beacon, Report])
+    for packet in reader.packets(start=1000, stop=2000):
+        ...
+
+Every record gets a sequence number in the order it was written, reading returns
+the records in that order across all classes.
+"""
+
+import collections
+import heapq
+import itertools
+import json
+import lzma
+import struct
+import zlib
+
+from .exceptions import DeserializeError
+from .serdepa import SuperSerdepaPacket, BaseInt, BaseFloat, Length, _encode_varuint, _decode_varuints
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+MAGIC = b"SDPA"
+VERSION = 1
+_HEADER = MAGIC + bytes([VERSION])
+_FOOTER = struct.Struct(">QI4s")
+_UNSIGNED = {1: "B", 2: "H", 4: "I", 8: "Q"}
+_MASKS = {"B": 0xFF, "H": 0xFFFF, "I": 0xFFFFFFFF, "Q": 0xFFFFFFFFFFFFFFFF}
+
+COMPRESSORS = {
+    "none": (lambda data, level: data, lambda data: data),
+    "zlib": (lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+Block = collections.namedtuple("Block", "offset size cls compression count first last")
+
+
+def _integer_fields(packet_class, base=0):
+    """
+    Yields (offset, struct format) of the integer fields at static offsets,
+    including those of nested packets.
+    """
+    for name, (_type, default) in packet_class._fields.items():
+        offset = packet_class.field_offset(name)
+        if offset is None:
+            return
+        if isinstance(_type, SuperSerdepaPacket):
+            for item in _integer_fields(_type, base + offset):
+                yield item
+            continue
+        if isinstance(_type, Length):
+            _type = type(_type._type)
+        if (isinstance(_type, type) and issubclass(_type, BaseInt) and not issubclass(_type, BaseFloat)
+                and _type._format and _type.static_size() in _UNSIGNED):
+            yield base + offset, _type._format
+
+
+def class_layout(packet_class):
+    """
+    Returns the delta-encoding layout of a packet class, a dict with the byte
+    order and the columns of its serialized prefix: integer codes for the delta
+    encoded fields and "Ns" for the bytes between them.
+    """
+    order = None
+    columns = []
+    end = 0
+    for offset, fmt in _integer_fields(packet_class):
+        if order is None:
+            order = fmt[0]
+        if fmt[0] != order or offset < end:
+            continue  # fields of the other byte order are kept as bytes
+        if offset > end:
+            columns.append("{}s".format(offset - end))
+        size = struct.calcsize(fmt)
+        columns.append(_UNSIGNED[size])
+        end = offset + size
+    size = packet_class.static_size()
+    if size is not None and size > end:
+        columns.append("{}s".format(size - end))  # the rest of fixed size records is stored by column too
+    return {
+        "name": "{}.{}".format(packet_class.__module__, packet_class.__qualname__),
+        "size": size,
+        "order": order or ">",
+        "columns": columns,
+    }
+
+
+class _Codec(object):
+    """
+    Encodes and decodes the blocks of one packet class.
+    """
+
+    def __init__(self, layout):
+        self.name = layout["name"]
+        self.size = layout["size"]
+        self.order = layout["order"]
+        self.columns = layout["columns"]
+        self.struct = struct.Struct(self.order + "".join(self.columns)) if self.columns else None
+        self.end = self.struct.size if self.struct else 0
+
+    def encode(self, first, seqs, records):
+        parts = [b"".join(_encode_varuint(seq - previous) for seq, previous in zip(seqs, [first] + seqs))]
+        if self.size is None:
+            parts.append(b"".join(_encode_varuint(len(record)) for record in records))
+        if self.struct is not None:
+            unpack_from = self.struct.unpack_from
+            rows = [unpack_from(record) for record in records]
+            for code, column in zip(self.columns, zip(*rows)):
+                if code in _MASKS:
+                    mask = _MASKS[code]
+                    deltas = [(value - previous) & mask for value, previous in zip(column, (0,) + column)]
+                    parts.append(struct.pack("{}{}{}".format(self.order, len(deltas), code), *deltas))
+                else:
+                    parts.append(b"".join(column))
+        end = self.end
+        parts.append(b"".join(record[end:] for record in records))
+        return b"".join(parts)
+
+    def decode(self, data, first, count):
+        """
+        Returns the sequence numbers and the data of the records in a block.
+        """
+        try:
+            return self._decode(data, first, count)
+        except struct.error as e:
+            raise DeserializeError("Invalid archive block of {}.".format(self.name), e, reason="framing")
+
+    def _decode(self, data, first, count):
+        deltas, pos = _decode_varuints(data, 0, count)
+        seqs = list(itertools.accumulate(deltas, initial=first))[1:]
+        if self.size is None:
+            lengths, pos = _decode_varuints(data, pos, count)
+        else:
+            lengths = [self.size] * count
+
+        columns = []
+        for code in self.columns:
+            if code in _MASKS:
+                mask = _MASKS[code]
+                fmt = "{}{}{}".format(self.order, count, code)
+                deltas = struct.unpack_from(fmt, data, pos)
+                columns.append([value & mask for value in itertools.accumulate(deltas)])
+                pos += struct.calcsize(fmt)
+            else:
+                size = int(code[:-1])
+                columns.append([data[i:i + size] for i in range(pos, pos + size * count, size)])
+                pos += size * count
+
+        records = []
+        pack = self.struct.pack if self.struct is not None else None
+        end = self.end
+        for i, row in enumerate(zip(*columns) if columns else [()] * count):
+            size = lengths[i] - end
+            if size < 0 or pos + size > len(data):
+                raise DeserializeError("Invalid archive block of {}.".format(self.name), reason="framing")
+            tail = data[pos:pos + size]
+            pos += size
+            records.append(pack(*row) + tail if pack is not None else tail)
+        if pos != len(data):
+            raise DeserializeError("Invalid archive block of {}.".format(self.name), reason="framing")
+        return seqs, records
+
+
+class ArchiveWriter(object):
+    """
+    Writes packets to an archive file, a path or a binary file object. Blocks are
+    written when block_records records of a class are collected, the index when
+    the writer is closed.
+    """
+
+    def __init__(self, fileobj, compression="zlib", level=None, block_records=4096):
+        if compression not in COMPRESSORS:
+            raise ValueError("Unknown compression {}, use one of {}.".format(compression, sorted(COMPRESSORS)))
+        self._owned = isinstance(fileobj, str)
+        self._file = open(fileobj, "wb") if self._owned else fileobj
+        self._compress = COMPRESSORS[compression][0]
+        self.compression = compression
+        self.level = level
+        self.block_records = block_records
+        self._layouts = []
+        self._codecs = {}
+        self._pending = {}
+        self._blocks = []
+        self._seq = 0
+        self._file.write(_HEADER)
+
+    def write(self, packet):
+        """
+        Adds a packet to the archive and returns its sequence number.
+        """
+        packet_class = type(packet)
+        codec = self._codecs.get(packet_class)
+        if codec is None:
+            layout = class_layout(packet_class)
+            codec = self._codecs[packet_class] = (len(self._layouts), _Codec(layout))
+            self._layouts.append(layout)
+        pending = self._pending.get(packet_class)
+        if pending is None:
+            pending = self._pending[packet_class] = ([], [])
+        seq = self._seq
+        self._seq += 1
+        pending[0].append(seq)
+        pending[1].append(packet.serialize())
+        if len(pending[0]) >= self.block_records:
+            self._write_block(packet_class)
+        return seq
+
+    def _write_block(self, packet_class):
+        seqs, records = self._pending.pop(packet_class)
+        index, codec = self._codecs[packet_class]
+        data = self._compress(codec.encode(seqs[0], seqs, records), self.level)
+        self._blocks.append(Block(self._file.tell(), len(data), index, self.compression,
+                                  len(seqs), seqs[0], seqs[-1]))
+        self._file.write(data)
+
+    def flush(self):
+        """
+        Writes the records collected so far as blocks.
+        """
+        for packet_class in sorted(self._pending, key=lambda c: self._pending[c][0][0]):
+            self._write_block(packet_class)
+
+    def close(self):
+        """
+        Writes the remaining blocks and the index.
+        """
+        if self._file is None:
+            return
+        self.flush()
+        index = json.dumps({
+            "version": VERSION,
+            "classes": self._layouts,
+            "blocks": [list(block) for block in self._blocks],
+        }).encode("utf-8")
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_FOOTER.pack(offset, len(index), MAGIC))
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ArchiveReader(object):
+    """
+    Reads an archive file, a path or a seekable binary file object. Packets are
+    decoded with the given packet classes, matched by module and qualified class
+    name, the raw records can be read without them.
+    """
+
+    def __init__(self, fileobj, classes=()):
+        self._owned = isinstance(fileobj, str)
+        self._file = open(fileobj, "rb") if self._owned else fileobj
+        try:
+            self._read_index()
+        except BaseException:
+            self.close()
+            raise
+        self._classes = {}
+        for packet_class in classes:
+            name = class_layout(packet_class)["name"]
+            if self._classes.get(name, packet_class) is not packet_class:
+                raise ValueError("Packet classes {} and {} have the same name {}.".format(
+                    self._classes[name], packet_class, name))
+            self._classes[name] = packet_class
+        self.blocks_read = 0
+
+    def _read_index(self):
+        f = self._file
+        f.seek(0)
+        if f.read(len(_HEADER)) != _HEADER:
+            raise DeserializeError("Not a serdepa archive.", reason="framing")
+        f.seek(0, 2)
+        if f.tell() < len(_HEADER) + _FOOTER.size:
+            raise DeserializeError("Archive ends before its index.", reason="truncated")
+        f.seek(-_FOOTER.size, 2)
+        offset, length, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise DeserializeError("Archive index is missing, the archive was not closed.", reason="truncated")
+        f.seek(offset)
+        try:
+            index = json.loads(f.read(length).decode("utf-8"))
+        except ValueError as e:
+            raise DeserializeError("Invalid archive index.", e, reason="framing")
+        self.layouts = index["classes"]
+        self._codecs = [_Codec(layout) for layout in self.layouts]
+        self.blocks = [Block(*block) for block in index["blocks"]]
+
+    def __len__(self):
+        return sum(block.count for block in self.blocks)
+
+    def _read_block(self, block):
+        self._file.seek(block.offset)
+        data = self._file.read(block.size)
+        if len(data) != block.size:
+            raise DeserializeError("Archive block is truncated.", reason="truncated")
+        try:
+            data = COMPRESSORS[block.compression][1](data)
+        except (zlib.error, lzma.LZMAError) as e:
+            raise DeserializeError("Archive block can't be decompressed.", e, reason="framing")
+        self.blocks_read += 1
+        seqs, records = self._codecs[block.cls].decode(data, block.first, block.count)
+        name = self._codecs[block.cls].name
+        return ((seq, name, record) for seq, record in zip(seqs, records))
+
+    def records(self, classes=None, start=None, stop=None):
+        """
+        Yields (sequence number, class name, data) of the records with sequence
+        numbers from start up to stop, of the given classes or class names, in
+        sequence order. Only the blocks holding such records are read.
+        """
+        if classes is not None:
+            classes = set(c if isinstance(c, str) else class_layout(c)["name"] for c in classes)
+        pending = collections.deque(sorted(
+            (block for block in self.blocks
+             if (classes is None or self._codecs[block.cls].name in classes)
+             and (start is None or block.last >= start) and (stop is None or block.first < stop)),
+            key=lambda block: block.first
+        ))
+
+        heap = []
+        while pending or heap:
+            # Blocks are opened only once the output reaches their first record.
+            while pending and (not heap or pending[0].first <= heap[0][0]):
+                records = self._read_block(pending.popleft())
+                record = next(records, None)
+                if record is not None:
+                    heapq.heappush(heap, (record[0], record, records))
+            seq, record, records = heapq.heappop(heap)
+            if stop is not None and seq >= stop:
+                return
+            if start is None or seq >= start:
+                yield record
+            record = next(records, None)
+            if record is not None:
+                heapq.heappush(heap, (record[0], record, records))
+
+    def packets(self, classes=None, start=None, stop=None):
+        """
+        Yields the decoded packets of records() in sequence order.
+        """
+        for seq, name, data in self.records(classes, start, stop):
+            packet_class = self._classes.get(name)
+            if packet_class is None:
+                raise DeserializeError("No packet class given for {}.".format(name), reason="unknown_class")
+            packet = packet_class()
+            packet.deserialize(data)
+            yield packet
+
+    def __iter__(self):
+        return self.packets()
+
+    def get(self, seq):
+        """
+        Returns the packet with the given sequence number.
+        """
+        for packet in self.packets(start=seq, stop=seq + 1):
+            return packet
+        raise IndexError("No record {} in the archive.".format(seq))
+
+    def close(self):
+        if self._owned and self._file is not None:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
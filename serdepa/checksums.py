@@ -0,0 +1,161 @@
+"""
+checksums.py: Checksum algorithms for the Checksum field type.
+
+Every algorithm works incrementally, so a checksum can be computed over the
+serialized fields of a packet one piece at a time:
+
+    crc = algorithm.init
+    for chunk in chunks:
+        crc = algorithm.update(crc, chunk)
+    value = algorithm.finalize(crc)
+
+CRC-16/XMODEM and CRC-16/CCITT-FALSE use binascii.crc_hqx and CRC-32 uses
+binascii.crc32, other CRCs are computed with a precomputed 256 entry table.
+"""
+
+import binascii
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+def _reflect(value, width):
+    result = 0
+    for _ in range(width):
+        result = (result << 1) | (value & 1)
+        value >>= 1
+    return result
+
+
+class ChecksumAlgorithm(object):
+    """
+    Base class of checksum algorithms, width is the checksum size in bits.
+    """
+
+    name = None
+    width = None
+    init = 0
+
+    def update(self, crc, data):
+        raise NotImplementedError()
+
+    def finalize(self, crc):
+        return crc
+
+    def compute(self, *chunks):
+        crc = self.init
+        for chunk in chunks:
+            crc = self.update(crc, chunk)
+        return self.finalize(crc)
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, self.name)
+
+
+class Crc(ChecksumAlgorithm):
+    """
+    A table driven CRC of 8 to 64 bits. The polynomial is given in its normal,
+    non-reflected form, init is the initial register value and reflect selects
+    reflected input and output, as in the usual CRC catalogues.
+    """
+
+    def __init__(self, name, width, poly, init=0, reflect=False, xorout=0):
+        if width < 8:
+            raise ValueError("CRCs narrower than 8 bits are not supported.")
+        self.name = name
+        self.width = width
+        self.poly = poly
+        self.init = init
+        self.reflect = reflect
+        self.xorout = xorout
+        self._mask = (1 << width) - 1
+        self._table = self._make_table()
+
+    def _make_table(self):
+        table = []
+        if self.reflect:
+            poly = _reflect(self.poly, self.width)
+            for byte in range(256):
+                crc = byte
+                for _ in range(8):
+                    crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+                table.append(crc)
+        else:
+            top = 1 << (self.width - 1)
+            for byte in range(256):
+                crc = byte << (self.width - 8)
+                for _ in range(8):
+                    crc = ((crc << 1) ^ self.poly) & self._mask if crc & top else (crc << 1) & self._mask
+                table.append(crc)
+        return table
+
+    def update(self, crc, data):
+        table = self._table
+        if self.reflect:
+            for byte in bytearray(data):
+                crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+        else:
+            shift = self.width - 8
+            mask = self._mask
+            for byte in bytearray(data):
+                crc = ((crc << 8) & mask) ^ table[((crc >> shift) ^ byte) & 0xFF]
+        return crc
+
+    def finalize(self, crc):
+        return crc ^ self.xorout
+
+
+class CrcHqx(ChecksumAlgorithm):
+    """
+    CRC-16 with the CCITT polynomial 0x1021 computed by binascii.crc_hqx.
+    """
+
+    width = 16
+
+    def __init__(self, name, init):
+        self.name = name
+        self.init = init
+
+    def update(self, crc, data):
+        return binascii.crc_hqx(data, crc)
+
+
+class Crc32(ChecksumAlgorithm):
+    """
+    The zlib/Ethernet CRC-32 computed by binascii.crc32.
+    """
+
+    name = "crc32"
+    width = 32
+
+    def update(self, crc, data):
+        return binascii.crc32(data, crc) & 0xFFFFFFFF
+
+
+CRC8 = Crc("crc8", 8, 0x07)
+CRC16_XMODEM = CrcHqx("crc16-xmodem", 0x0000)
+CRC16_CCITT_FALSE = CrcHqx("crc16-ccitt-false", 0xFFFF)
+CRC16_X25 = Crc("crc16-x25", 16, 0x1021, init=0xFFFF, reflect=True, xorout=0xFFFF)
+CRC16_ARC = Crc("crc16-arc", 16, 0x8005, reflect=True)
+CRC32 = Crc32()
+
+ALGORITHMS = dict((algorithm.name, algorithm) for algorithm in (
+    CRC8, CRC16_XMODEM, CRC16_CCITT_FALSE, CRC16_X25, CRC16_ARC, CRC32
+))
+# The TinyOS serial stack uses the XMODEM variant of CRC-16-CCITT
+ALGORITHMS["crc16-ccitt"] = CRC16_XMODEM
+
+
+def get_algorithm(algorithm):
+    """
+    Returns the algorithm object for an algorithm name, algorithm objects are returned as is.
+    """
+    if isinstance(algorithm, ChecksumAlgorithm):
+        return algorithm
+    try:
+        return ALGORITHMS[algorithm.lower()]
+    except KeyError:
+        raise ValueError("Unknown checksum algorithm {}, known are {}".format(
+            algorithm, ", ".join(sorted(ALGORITHMS))
+        ))
@@ -0,0 +1,163 @@
+"""
+codegen.py: Specialized serialize and deserialize methods for fixed layout packets.
+
+A packet class made only of fixed size integer and float fields of one byte
+order is encoded and decoded with a single precompiled struct, by methods
+generated for its layout. The compiled code of the methods is kept in a cache
+directory, so later processes load it instead of generating and compiling it
+again. The cache entries are keyed by a hash of the layout, the serdepa
+version and the Python bytecode version, entries for anything else are never
+looked at.
+
+The cache is only used when $SERDEPA_CACHE_DIR names its directory. The code
+in the cache is executed, so the directory must not be writable by others.
+"""
+
+import hashlib
+import importlib.util
+import marshal
+import os
+import struct
+import tempfile
+import threading
+
+from . import __version__
+from .exceptions import DeserializeError, SerializeError
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+# Change when the generated code changes, old cache entries are ignored then.
+GENERATOR_VERSION = 3
+
+_TEMPLATE = '''
+def serialize(self):
+    return _pack({values})
+
+
+def serialize_into(self, buffer, offset=0):
+    end = offset + {size}
+    if end > len(buffer):
+        raise SerializeError("The packet needs {size} bytes, the buffer has {{}} after offset {{}}.".format(
+            len(buffer) - offset, offset
+        ))
+    _pack_into(buffer, offset, {values})
+    return end
+
+
+def deserialize(self, data, pos=0, final=True):
+    try:
+        {targets}, = _unpack_from(data, pos)
+    except _struct_error as e:
+        raise DeserializeError("Invalid length of data to deserialize.", e, reason="truncated")
+    end = pos + {size}
+    if final and end != len(data):
+        raise DeserializeError(
+            "After deserialization, {{}} bytes were left.".format(len(data)-end+1), reason="trailing"
+        )
+    return end
+'''
+
+METHODS = ("serialize", "serialize_into", "deserialize")
+
+_lock = threading.Lock()
+_codecs = {}
+
+
+def cache_dir():
+    """
+    Returns the cache directory, None if SERDEPA_CACHE_DIR is not set and the cache is disabled.
+    """
+    return os.environ.get("SERDEPA_CACHE_DIR") or None
+
+
+def layout_key(names, fmt):
+    """
+    Returns the cache key of the code for the field names and struct format.
+    """
+    layout = repr((GENERATOR_VERSION, __version__, importlib.util.MAGIC_NUMBER, tuple(names), fmt))
+    return hashlib.sha256(layout.encode("utf-8")).hexdigest()
+
+
+def _compile(names, fmt):
+    source = _TEMPLATE.format(
+        values=", ".join("self._{}._value".format(name) for name in names),
+        targets=", ".join("self._{}._value".format(name) for name in names),
+        size=struct.calcsize(fmt),
+    )
+    return compile(source, "<serdepa codec {}>".format(fmt), "exec")
+
+
+def _load(path, names, fmt):
+    try:
+        with open(path, "rb") as f:
+            plan, code = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if plan != (tuple(names), fmt):
+        return None
+    return code
+
+
+def _store(path, names, fmt, code):
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(marshal.dumps(((tuple(names), fmt), code)))
+            os.replace(temp, path)  # readers see the old entry or the complete new one
+        except BaseException:
+            os.unlink(temp)
+            raise
+    except OSError:
+        pass  # a read-only or full cache only costs the compile time
+
+
+def build_function(source, name, namespace):
+    """
+    Compiles the source of a function called name with the given globals and returns the function.
+    """
+    namespace = dict(namespace, __name__=__name__)
+    exec(compile(source, "<serdepa {}>".format(name), "exec"), namespace)
+    return namespace[name]
+
+
+def get_codec(names, fmt):
+    """
+    Returns a dict with the serialize, serialize_into and deserialize functions for a packet of
+    fixed size fields with the given names, packed with the struct format fmt.
+    """
+    key = layout_key(names, fmt)
+    with _lock:
+        codec = _codecs.get(key)
+        if codec is not None:
+            return codec
+
+        directory = cache_dir()
+        path = os.path.join(directory, key + ".codec") if directory else None
+        code = _load(path, names, fmt) if path else None
+        if code is None:
+            code = _compile(names, fmt)
+            if path:
+                _store(path, names, fmt, code)
+
+        packer = struct.Struct(fmt)
+        namespace = {
+            "__name__": __name__,
+            "_pack": packer.pack,
+            "_pack_into": packer.pack_into,
+            "_unpack_from": packer.unpack_from,
+            "_struct_error": struct.error,
+            "DeserializeError": DeserializeError,
+            "SerializeError": SerializeError,
+        }
+        exec(code, namespace)
+        codec = _codecs[key] = dict((name, namespace[name]) for name in METHODS)
+        for function in codec.values():
+            function._generated = True
+        return codec
@@ -14,9 +14,13 @@ class PacketDefinitionError(SerdepaError):
 
 class DeserializeError(SerdepaError):
     """
-    Error that is raised when deserialization fails.
+    Error that is raised when deserialization fails. The reason attribute holds a
+    short machine readable cause, for example "truncated" or "trailing".
     """
-    pass
+
+    def __init__(self, *args, **kwargs):
+        self.reason = kwargs.pop("reason", "invalid")
+        super(DeserializeError, self).__init__(*args, **kwargs)
 
 
 class SerializeError(SerdepaError):
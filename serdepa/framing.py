@@ -0,0 +1,153 @@
+"""
+framing.py: HDLC-style framing and byte stuffing for serial links.
+
+Frames are delimited by 0x7E flag bytes, 0x7E and 0x7D inside a frame are sent
+as 0x7D followed by the byte XOR 0x20, as in the TinyOS serial protocol. The
+escaping is done with bytes.replace, so a frame is processed in a few passes of
+C code instead of a Python loop over every byte.
+
+    data = frame(packet)
+    deframer = Deframer(PacketClass)
+    for packet in deframer.feed(serial.read(4096)):
+        ...
+"""
+
+from .exceptions import DeserializeError
+from .serdepa import SerdepaPacket, SuperSerdepaPacket
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+FLAG = b"\x7e"
+ESCAPE = b"\x7d"
+_ESCAPED_FLAG = b"\x7d\x5e"
+_ESCAPED_ESCAPE = b"\x7d\x5d"
+
+
+def escape(data):
+    """
+    Returns the data with the flag and escape bytes escaped.
+    """
+    data = bytes(data)
+    if ESCAPE in data:
+        data = data.replace(ESCAPE, _ESCAPED_ESCAPE)
+    if FLAG in data:
+        data = data.replace(FLAG, _ESCAPED_FLAG)
+    return data
+
+
+def unescape(data):
+    """
+    Returns the data with escape sequences replaced by the original bytes, raises
+    DeserializeError with reason "framing" on an invalid escape sequence.
+    """
+    data = bytes(data)
+    if ESCAPE not in data:
+        return data
+    # Every escape byte starts a two byte sequence, so the sequences can't overlap.
+    escapes = data.count(ESCAPE)
+    flags = data.count(_ESCAPED_FLAG)
+    escaped = data.count(_ESCAPED_ESCAPE)
+    if escapes != flags + escaped:
+        raise DeserializeError("Invalid escape sequence in frame.", reason="framing")
+    return data.replace(_ESCAPED_FLAG, FLAG).replace(_ESCAPED_ESCAPE, ESCAPE)
+
+
+def frame(data):
+    """
+    Returns a complete frame, with flags, for a packet or serialized data. The
+    fields of a packet are escaped one by one and joined into the frame once.
+    """
+    if isinstance(data, SerdepaPacket):
+        chunks = [FLAG]
+        chunks.extend(escape(chunk) for chunk in data._serialize_chunks())
+        chunks.append(FLAG)
+        return b"".join(chunks)
+    return FLAG + escape(data) + FLAG
+
+
+class Deframer(object):
+    """
+    Collects complete frames from a stream of arbitrary chunks. Bytes before the
+    first flag are discarded, as are frames longer than max_length.
+
+    With a decoder, a packet class, a PacketRegistry or any callable taking the
+    frame data, the frames are returned decoded. Frames that fail to decode are
+    dropped and counted in errors by the DeserializeError reason.
+    """
+
+    def __init__(self, decoder=None, max_length=4096):
+        if isinstance(decoder, SuperSerdepaPacket):
+            packet_class = decoder
+
+            def decoder(data):
+                packet = packet_class()
+                packet.deserialize(data)
+                return packet
+        elif decoder is not None and hasattr(decoder, "decode"):
+            decoder = decoder.decode
+        self._decoder = decoder
+        self.max_length = max_length
+        self._buffer = bytearray()
+        self._synced = False
+        self.dropped = 0
+        self.errors = {}
+
+    def feed(self, data):
+        """
+        Adds a chunk of received data and returns a list of the frames it completed.
+        """
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        if self._synced and FLAG not in data:
+            self._buffer += data
+            self._check_length()
+            return []
+
+        buffer = self._buffer
+        buffer += data
+        if not self._synced:
+            start = buffer.find(FLAG)
+            if start < 0:
+                self.dropped += len(buffer)
+                del buffer[:]
+                return []
+            self.dropped += start
+            del buffer[:start + 1]
+            self._synced = True
+
+        parts = buffer.split(FLAG)
+        self._buffer = parts.pop()
+        self._check_length()
+        frames = []
+        for part in parts:
+            if not part:
+                continue
+            if len(part) > self.max_length:
+                self.dropped += len(part)
+                continue
+            try:
+                part = unescape(part)
+                frames.append(self._decoder(part) if self._decoder is not None else part)
+            except DeserializeError as e:
+                self.errors[e.reason] = self.errors.get(e.reason, 0) + 1
+        return frames
+
+    def _check_length(self):
+        if len(self._buffer) > 2 * self.max_length:
+            # A frame can't be this long even escaped, wait for the next flag.
+            self.dropped += len(self._buffer)
+            self._buffer = bytearray()
+            self._synced = False
+
+
+def deframe(chunks, decoder=None, max_length=4096):
+    """
+    Yields the frames, or decoded packets, found in an iterable of data chunks.
+    """
+    deframer = Deframer(decoder, max_length)
+    for chunk in chunks:
+        for item in deframer.feed(chunk):
+            yield item
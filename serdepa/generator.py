@@ -0,0 +1,371 @@
+"""
+generator.py: Random valid serialized packets for load testing.
+
+PacketGenerator writes the serialized data of random packets of a class without
+creating packet objects. Lengths match their lists, union tags their payloads
+and checksums are computed. Fields with a default value keep it, values given
+to the generator replace the defaults, and sequence fields count up from record
+to record, nested fields are joined with __ as in filter():
+
+    generator = PacketGenerator(Report, seed=1, sequence=["header__seq"], values={"header__node": 7})
+    data = generator.generate(100000)
+
+Classes of a static size are generated in bulk, the random bytes of all records
+are produced at once and only the fixed, sequence and float fields are written
+over them, column by column.
+"""
+
+import random
+import struct
+
+from .serdepa import (
+    SuperSerdepaPacket, BaseInt, BaseFloat, BaseVarInt, BaseBits, BasePacked, PackedArray, FixedPoint,
+    Length, List, Array, ByteString, Union, Checksum
+)
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+def _integer_range(int_type):
+    bits = int_type._length
+    if int_type._signed:
+        return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    return 0, (1 << bits) - 1
+
+
+def _wrap(int_type, value):
+    low, high = _integer_range(int_type)
+    return (value - low) % (high - low + 1) + low
+
+
+class PacketGenerator(object):
+    """
+    Generates serialized packets of packet_class. The random numbers come from
+    a random.Random seeded with seed. sequence is a list of integer field names
+    that count up from 0, or a dict of the names and their start values.
+    Variable length lists and strings get up to max_length items.
+    """
+
+    def __init__(self, packet_class, seed=None, sequence=(), values=None, max_length=8):
+        self.packet_class = packet_class
+        self.random = random.Random(seed)
+        self.max_length = max_length
+        if not isinstance(sequence, dict):
+            sequence = dict((name, 0) for name in sequence)
+        self._sequence = sequence
+        self._values = dict(values or {})
+        self._index = 0
+        self._used = set()
+        self._fixed = self._fixed_plan(packet_class, 0, "")
+        self._emit = None
+        if self._fixed is None:
+            self._used.clear()
+            self._emit = self._packet_emitter(packet_class, "")
+        unknown = (set(self._sequence) | set(self._values)) - self._used
+        if unknown:
+            raise ValueError("{} has no integer fields {}.".format(packet_class.__name__, ", ".join(sorted(unknown))))
+
+    def _setting(self, path, default):
+        """
+        Returns ("sequence", start), ("value", value) or None for a random field.
+        """
+        if path in self._sequence:
+            self._used.add(path)
+            return "sequence", self._sequence[path]
+        if path in self._values:
+            self._used.add(path)
+            return "value", self._values[path]
+        if default is not None:
+            return "value", default
+        return None
+
+    # Classes of a static size ----------------------------------------------
+
+    def _fixed_plan(self, packet_class, base, prefix):
+        """
+        Returns (offset, integer type, setting) of the fields that are not
+        random bytes, None if the class can't be generated in bulk. The unused
+        bits of bit runs are ("mask", byte) settings of single bytes.
+        """
+        if packet_class.static_size() is None:
+            return None
+        plan = []
+        for name, (_type, default) in packet_class._fields.items():
+            path = prefix + name
+            offset = base + packet_class.field_offset(name)
+            if isinstance(_type, SuperSerdepaPacket):
+                nested = self._fixed_plan(_type, offset, path + "__")
+                if nested is None:
+                    return None
+                plan.extend(nested)
+            elif isinstance(_type, type) and issubclass(_type, BaseInt):
+                setting = self._setting(path, default)
+                if setting is None and issubclass(_type, BaseFloat):
+                    setting = "float", None
+                if setting is not None:
+                    plan.append((offset, _type, setting))
+            elif isinstance(_type, (Checksum, Union)):
+                return None
+            elif isinstance(_type, BaseBits):
+                if default is not None or path in self._values or path in self._sequence:
+                    return None
+                run = packet_class._bitruns.get(name)
+                if run is not None:
+                    size, byteorder, table = run
+                    used = 0
+                    for member, shift, mask in table:
+                        used |= mask << shift
+                    for byte, byte_mask in enumerate(used.to_bytes(size, byteorder)):
+                        if byte_mask != 0xFF:
+                            plan.append((offset + byte, None, ("mask", byte_mask)))
+            elif isinstance(_type, (Array, BasePacked)):
+                item = _type._type
+                if isinstance(item, FixedPoint):
+                    continue
+                if not isinstance(item, type) or not issubclass(item, BaseInt) or issubclass(item, BaseFloat):
+                    return None
+            elif isinstance(_type, FixedPoint):
+                if default is not None or path in self._values or path in self._sequence:
+                    return None
+        return plan
+
+    def _fixed_records(self, count):
+        size = self.packet_class.static_size()
+        data = bytearray(self.random.randbytes(size * count))
+        index = self._index
+        for offset, int_type, (kind, value) in self._fixed:
+            if kind == "mask":
+                table = bytes(i & value for i in range(256))
+                data[offset::size] = data[offset::size].translate(table)
+                continue
+            fmt = int_type._format
+            width = struct.calcsize(fmt)
+            if kind == "value":
+                column = struct.pack(fmt, value) * count
+            elif kind == "sequence":
+                column = struct.pack(
+                    "{}{}{}".format(fmt[0], count, fmt[1:]),
+                    *[_wrap(int_type, value + i) for i in range(index, index + count)]
+                )
+            else:
+                uniform = self.random.uniform
+                column = struct.pack(
+                    "{}{}{}".format(fmt[0], count, fmt[1:]), *[uniform(-1e3, 1e3) for _ in range(count)]
+                )
+            for byte in range(width):
+                data[offset + byte::size] = column[byte::width]
+        return data
+
+    # Other classes ---------------------------------------------------------
+
+    def _packet_emitter(self, packet_class, prefix):
+        """
+        Returns a function emit(index, out) appending the data of a random packet to the bytearray out.
+        """
+        emitters = []
+        lengths = []
+        unions = []
+        for name, (_type, default) in packet_class._fields.items():
+            path = prefix + name
+            if isinstance(_type, Length):
+                lengths.append((name, _type._field, _type._type.__class__))
+            elif isinstance(_type, Union):
+                unions.append((name, _type._field, sorted(_type._variants)))
+            emitters.append(self._field_emitter(packet_class, name, path, _type, default))
+        rnd = self.random
+        max_length = self.max_length
+
+        def emit(index, out):
+            chosen = {}
+            for name, dependant, int_type in lengths:
+                length = rnd.randint(0, min(max_length, _integer_range(int_type)[1]))
+                chosen[name] = chosen[dependant] = length
+            for name, tag_field, tags in unions:
+                chosen[name] = chosen[tag_field] = rnd.choice(tags)
+            starts = []
+            for emitter in emitters:
+                starts.append(len(out))
+                emitter(index, out, chosen, starts)
+        return emit
+
+    def _field_emitter(self, packet_class, name, path, _type, default):
+        rnd = self.random
+        if isinstance(_type, SuperSerdepaPacket):
+            emit = self._packet_emitter(_type, path + "__")
+            return lambda index, out, chosen, starts: emit(index, out)
+
+        if isinstance(_type, Length):
+            int_type = _type._type.__class__
+            if not int_type._format:  # varint lengths
+                return lambda index, out, chosen, starts: out.extend(int_type(initial=chosen[name]).serialize())
+            fmt = int_type._format
+            return lambda index, out, chosen, starts: out.extend(struct.pack(fmt, chosen[name]))
+
+        if isinstance(_type, Checksum):
+            first, stop = _type._range
+            compute = _type._algorithm.compute
+            fmt = _type._type._format
+            return lambda index, out, chosen, starts: out.extend(
+                struct.pack(fmt, compute(bytes(out[starts[first]:starts[stop]])))
+            )
+
+        if isinstance(_type, Union):
+            variants = dict((tag, self._packet_emitter(variant, path + "__"))
+                            for tag, variant in _type._variants.items())
+            return lambda index, out, chosen, starts: variants[chosen[name]](index, out)
+
+        if isinstance(_type, BaseBits):
+            run = packet_class._bitruns.get(name)
+            if run is None:
+                return lambda index, out, chosen, starts: None  # written by the first field of the run
+            return self._bits_emitter(packet_class, path[:-len(name)], run)
+
+        if isinstance(_type, type) and issubclass(_type, BaseInt):
+            setting = self._setting(path, default)
+            if name in (union._field for union in self._unions(packet_class)):
+                return lambda index, out, chosen, starts: out.extend(_type(initial=chosen[name]).serialize())
+            return self._int_emitter(_type, setting)
+
+        if isinstance(_type, FixedPoint):
+            setting = self._setting(path, default)
+            if setting is not None and setting[0] == "value":
+                data = _type._type(initial=int(round(setting[1] / _type._scale))).serialize()
+                return lambda index, out, chosen, starts: out.extend(data)
+            return self._int_emitter(_type._type, setting)
+
+        if isinstance(_type, ByteString):
+            if _type._length is not None:
+                size = _type._length
+                return lambda index, out, chosen, starts: out.extend(rnd.randbytes(size))
+            return lambda index, out, chosen, starts: out.extend(rnd.randbytes(self._length(name, chosen)))
+
+        if isinstance(_type, (List, Array, BasePacked)):
+            item = self._item_emitter(_type._type, path)
+            fixed = _type._length if isinstance(_type, (Array, PackedArray)) else None
+            if fixed is None:
+                def emit_items(index, out, chosen, starts):
+                    for _ in range(self._length(name, chosen)):
+                        item(index, out)
+                return emit_items
+
+            def emit_array(index, out, chosen, starts):
+                for _ in range(fixed):
+                    item(index, out)
+            return emit_array
+
+        raise ValueError("Can't generate field {} of type {}.".format(path, type(_type).__name__))
+
+    def _unions(self, packet_class):
+        return [_type for _type, default in packet_class._fields.values() if isinstance(_type, Union)]
+
+    def _length(self, name, chosen):
+        length = chosen.get(name)
+        if length is None:
+            return self.random.randint(0, self.max_length)
+        return length
+
+    def _item_emitter(self, item_type, path):
+        if isinstance(item_type, SuperSerdepaPacket):
+            return self._packet_emitter(item_type, path + "__")
+        if isinstance(item_type, FixedPoint):
+            item_type = item_type._type
+        if not (isinstance(item_type, type) and issubclass(item_type, BaseInt)):
+            raise ValueError("Can't generate items of {} of type {}.".format(path, type(item_type).__name__))
+        emit = self._int_emitter(item_type, None)
+        return lambda index, out: emit(index, out, None, None)
+
+    def _int_emitter(self, int_type, setting):
+        rnd = self.random
+        if setting is not None:
+            kind, value = setting
+            if kind == "value":
+                data = int_type(initial=value).serialize()
+                return lambda index, out, chosen, starts: out.extend(data)
+            return lambda index, out, chosen, starts: out.extend(
+                int_type(initial=_wrap(int_type, value + index)).serialize()
+            )
+        if issubclass(int_type, BaseFloat):
+            fmt = int_type._format
+            return lambda index, out, chosen, starts: out.extend(struct.pack(fmt, rnd.uniform(-1e3, 1e3)))
+        if issubclass(int_type, BaseVarInt):
+            low, high = _integer_range(int_type)
+
+            def emit_varint(index, out, chosen, starts):
+                value = rnd.getrandbits(rnd.randint(1, int_type._length - 1))
+                out.extend(int_type(initial=value if low == 0 or rnd.random() < 0.5 else -value).serialize())
+            return emit_varint
+        size = int_type.static_size()
+        return lambda index, out, chosen, starts: out.extend(rnd.randbytes(size))
+
+    def _bits_emitter(self, packet_class, prefix, run):
+        rnd = self.random
+        size, byteorder, table = run
+        members = []
+        for name, shift, mask in table:
+            default = packet_class._fields[name][1]
+            members.append((shift, mask, self._setting(prefix + name, default)))
+
+        def emit(index, out, chosen, starts):
+            value = 0
+            for shift, mask, setting in members:
+                if setting is None:
+                    bits = rnd.getrandbits(mask.bit_length())
+                elif setting[0] == "value":
+                    bits = setting[1]
+                else:
+                    bits = setting[1] + index
+                value |= (bits & mask) << shift
+            out.extend(value.to_bytes(size, byteorder))
+        return emit
+
+    # Output ----------------------------------------------------------------
+
+    def records(self, count):
+        """
+        Returns a list of the serialized data of count packets.
+        """
+        if self._fixed is not None:
+            size = self.packet_class.static_size()
+            data = bytes(self._fixed_records(count))
+            self._index += count
+            return [data[i:i + size] for i in range(0, len(data), size)]
+        ret = []
+        for index in range(self._index, self._index + count):
+            out = bytearray()
+            self._emit(index, out)
+            ret.append(bytes(out))
+        self._index += count
+        return ret
+
+    def generate(self, count, length_prefix=None):
+        """
+        Returns the serialized data of count packets, back to back or, with
+        length_prefix, an integer type like nx_uint16, each preceded by its length.
+        """
+        if self._fixed is not None and length_prefix is None:
+            data = self._fixed_records(count)
+            self._index += count
+            return bytes(data)
+        if length_prefix is None and self._emit is not None:
+            out = bytearray()
+            emit = self._emit
+            for index in range(self._index, self._index + count):
+                emit(index, out)
+            self._index += count
+            return bytes(out)
+        fmt = length_prefix._format
+        return b"".join(struct.pack(fmt, len(record)) + record for record in self.records(count))
+
+    def write(self, fileobj, count, length_prefix=None, chunk=65536):
+        """
+        Writes count packets to a binary file object in chunks of packets and returns the number of bytes written.
+        """
+        written = 0
+        while count > 0:
+            data = self.generate(min(chunk, count), length_prefix)
+            fileobj.write(data)
+            written += len(data)
+            count -= chunk
+        return written
@@ -0,0 +1,235 @@
+"""
+instrumentation.py: Opt-in counters of encode and decode work per packet class.
+
+Instrumentation is enabled per SerdepaPacket subclass by wrapping the serialize,
+serialize_into, serialize_segments and deserialize methods of that class, disabling it puts the original methods
+back, so packet classes that are not instrumented run exactly the same code as
+without this module. Subclasses are not instrumented with their parent, the
+work of an instance is only counted if its own class is enabled.
+
+    from serdepa import instrumentation
+    instrumentation.enable(DataPacket, BeaconPacket)
+    ...
+    instrumentation.snapshot()
+    {"mymodule.DataPacket": {"encode": {...}, "decode": {...}, "errors": {"truncated": 2}}, ...}
+"""
+
+import bisect
+import threading
+import time
+
+from .exceptions import DeserializeError
+from .serdepa import SerdepaPacket
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2)
+
+_lock = threading.Lock()
+_stats = {}
+_originals = {}
+
+
+class _Counter(object):
+
+    def __init__(self, buckets):
+        self.count = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.histogram = [0] * (len(buckets) + 1)
+
+    def snapshot(self, buckets):
+        histogram = {}
+        total = 0
+        for bound, count in zip(buckets, self.histogram):
+            total += count
+            histogram["{:g}".format(bound)] = total
+        histogram["+Inf"] = total + self.histogram[-1]
+        return {
+            "count": self.count,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "histogram": histogram,
+        }
+
+
+class PacketStats(object):
+    """
+    Encode and decode counters of a single packet class.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.encode = _Counter(self.buckets)
+            self.decode = _Counter(self.buckets)
+            self.errors = {}
+
+    def _record(self, counter, size, seconds):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            counter.count += 1
+            counter.bytes += size
+            counter.seconds += seconds
+            counter.histogram[bucket] += 1
+
+    def record_encode(self, size, seconds):
+        self._record(self.encode, size, seconds)
+
+    def record_decode(self, size, seconds):
+        self._record(self.decode, size, seconds)
+
+    def record_error(self, reason):
+        with self._lock:
+            self.errors[reason] = self.errors.get(reason, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "encode": self.encode.snapshot(self.buckets),
+                "decode": self.decode.snapshot(self.buckets),
+                "errors": dict(self.errors),
+            }
+
+
+def _all_packet_classes(cls=SerdepaPacket):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        for nested in _all_packet_classes(subclass):
+            yield nested
+
+
+def _class_name(cls):
+    return "{}.{}".format(cls.__module__, getattr(cls, "__qualname__", cls.__name__))
+
+
+def _unwrapped(method):
+    # A subclass of an instrumented class must not count its work for its parent as well.
+    return getattr(method, "_original", method)
+
+
+def _instrument(cls, stats):
+    cls._prepare()  # preparing may replace the methods with generated ones
+    # Subclasses that are not instrumented inherit the wrappers, their work is not counted.
+    perf_counter = time.perf_counter
+    original_serialize = _unwrapped(cls.serialize)
+    original_serialize_into = _unwrapped(cls.serialize_into)
+    original_serialize_segments = _unwrapped(cls.serialize_segments)
+    original_deserialize = _unwrapped(cls.deserialize)
+
+    def serialize(self):
+        if type(self) is not cls:
+            return original_serialize(self)
+        start = perf_counter()
+        data = original_serialize(self)
+        stats.record_encode(len(data), perf_counter() - start)
+        return data
+
+    def serialize_into(self, buffer, offset=0):
+        if type(self) is not cls:
+            return original_serialize_into(self, buffer, offset)
+        start = perf_counter()
+        end = original_serialize_into(self, buffer, offset)
+        stats.record_encode(end - offset, perf_counter() - start)
+        return end
+
+    def serialize_segments(self):
+        if type(self) is not cls:
+            return original_serialize_segments(self)
+        start = perf_counter()
+        segments = original_serialize_segments(self)
+        stats.record_encode(sum(len(segment) for segment in segments), perf_counter() - start)
+        return segments
+
+    def deserialize(self, data, pos=0, final=True):
+        if type(self) is not cls:
+            return original_deserialize(self, data, pos, final)
+        start = perf_counter()
+        try:
+            end = original_deserialize(self, data, pos, final)
+        except DeserializeError as e:
+            stats.record_error(e.reason)
+            raise
+        stats.record_decode(end - pos, perf_counter() - start)
+        return end
+
+    serialize._original = original_serialize
+    serialize_into._original = original_serialize_into
+    serialize_segments._original = original_serialize_segments
+    deserialize._original = original_deserialize
+    _originals[cls] = dict(
+        (name, cls.__dict__.get(name)) for name in ("serialize", "serialize_into", "serialize_segments", "deserialize")
+    )
+    cls.serialize = serialize
+    cls.serialize_into = serialize_into
+    cls.serialize_segments = serialize_segments
+    cls.deserialize = deserialize
+
+
+def _restore(cls):
+    for name, original in _originals.pop(cls).items():
+        if original is None:
+            delattr(cls, name)
+        else:
+            setattr(cls, name, original)
+
+
+def enable(*packet_classes, **kwargs):
+    """
+    Start collecting statistics for the given packet classes, or for all currently
+    defined SerdepaPacket subclasses if none are given. The histogram bucket upper
+    bounds in seconds can be given with the buckets keyword argument.
+    """
+    buckets = kwargs.pop("buckets", DEFAULT_BUCKETS)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments {}".format(", ".join(kwargs)))
+    with _lock:
+        for cls in packet_classes or list(_all_packet_classes()):
+            if cls in _originals:
+                continue
+            if cls not in _stats:
+                _stats[cls] = PacketStats(buckets)
+            _instrument(cls, _stats[cls])
+
+
+def disable(*packet_classes):
+    """
+    Stop collecting statistics for the given packet classes, or for all of them.
+    The collected statistics are kept until reset() is called.
+    """
+    with _lock:
+        for cls in packet_classes or list(_originals):
+            if cls in _originals:
+                _restore(cls)
+
+
+def is_enabled(packet_class):
+    return packet_class in _originals
+
+
+def reset():
+    """
+    Forget the statistics collected so far.
+    """
+    with _lock:
+        for cls in list(_stats):
+            if cls in _originals:
+                _stats[cls].reset()
+            else:
+                del _stats[cls]
+
+
+def snapshot():
+    """
+    Returns the collected statistics as a plain dict keyed by the packet class names.
+    """
+    with _lock:
+        stats = list(_stats.items())
+    return dict((_class_name(cls), packet_stats.snapshot()) for cls, packet_stats in stats)
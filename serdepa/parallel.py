@@ -0,0 +1,146 @@
+"""
+parallel.py: Decoding large files of packet records across a pool of worker processes.
+"""
+
+import collections
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .exceptions import DeserializeError
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def decode_file_parallel(path, packet_class, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                         length_prefix=None, ordered=True, transform=None):
+    """
+    Decode a file of consecutive packet records with a pool of worker processes.
+
+    Records are either fixed-size (packet_class must then have a static size) or,
+    when length_prefix is given (an integer type such as nx_uint16), each record
+    is preceded by its length in bytes. The file is split into chunks of about
+    chunk_size bytes at record boundaries and every worker maps the file itself,
+    only the chunk boundaries are sent to it.
+
+    Yields decoded packets, in file order if ordered is True, otherwise in the
+    order the chunks finish decoding. If transform is given, it is called with
+    every packet inside the worker and its results are yielded instead, which
+    avoids sending whole packet objects back from the workers.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if length_prefix is None:
+        record_size = packet_class.static_size()
+        if not record_size:
+            raise ValueError(
+                "{} does not have a static size, a length_prefix is needed.".format(packet_class.__name__)
+            )
+    else:
+        record_size = None
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            chunks = _split_chunks(mm, record_size, length_prefix, chunk_size)
+        finally:
+            mm.close()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = iter(chunks)
+        window = 2 * workers
+        if ordered:
+            pending = collections.deque()
+            for start, end in chunks:
+                pending.append(executor.submit(_decode_chunk, path, packet_class, start, end,
+                                               record_size, length_prefix, transform))
+                if len(pending) >= window:
+                    for packet in pending.popleft().result():
+                        yield packet
+            while pending:
+                for packet in pending.popleft().result():
+                    yield packet
+        else:
+            pending = set()
+            for start, end in chunks:
+                pending.add(executor.submit(_decode_chunk, path, packet_class, start, end,
+                                            record_size, length_prefix, transform))
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for packet in future.result():
+                            yield packet
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for packet in future.result():
+                        yield packet
+
+
+def _split_chunks(data, record_size, length_prefix, chunk_size):
+    size = len(data)
+    if record_size is not None:
+        if size % record_size:
+            raise DeserializeError(
+                "File size {} is not a multiple of the record size {}.".format(size, record_size),
+                reason="truncated"
+            )
+        step = max(1, chunk_size // record_size) * record_size
+        return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+    unpack = struct.Struct(length_prefix._format).unpack_from
+    prefix_size = length_prefix.serialized_size()
+    chunks = []
+    start = pos = 0
+    while pos < size:
+        if pos + prefix_size > size:
+            raise DeserializeError("Truncated length prefix at offset {}.".format(pos), reason="truncated")
+        pos += prefix_size + unpack(data, pos)[0]
+        if pos - start >= chunk_size:
+            chunks.append((start, pos))
+            start = pos
+    if pos > size:
+        raise DeserializeError("Truncated record at the end of the file.", reason="truncated")
+    if start < pos:
+        chunks.append((start, pos))
+    return chunks
+
+
+def _decode_chunk(path, packet_class, start, end, record_size, length_prefix, transform):
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            packets = _decode_records(mm, packet_class, start, end, record_size, length_prefix)
+        finally:
+            mm.close()
+    if transform is not None:
+        return [transform(packet) for packet in packets]
+    return packets
+
+
+def _decode_records(data, packet_class, pos, end, record_size, length_prefix):
+    packets = []
+    if record_size is not None:
+        for pos in range(pos, end, record_size):
+            packet = packet_class()
+            packet.deserialize(data[pos:pos + record_size])
+            packets.append(packet)
+    else:
+        unpack = struct.Struct(length_prefix._format).unpack_from
+        prefix_size = length_prefix.serialized_size()
+        while pos < end:
+            length = unpack(data, pos)[0]
+            pos += prefix_size
+            packet = packet_class()
+            packet.deserialize(data[pos:pos + length])
+            packets.append(packet)
+            pos += length
+    return packets
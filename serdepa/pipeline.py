@@ -0,0 +1,214 @@
+"""
+pipeline.py: Fanning packets out to parallel workers while keeping the order per key.
+
+The dispatcher reads a key field, for example the source address, straight from
+the serialized data at its static offset and sends the data to the worker
+selected by the key, so packets with the same key are handled in order by the
+same worker. Only the workers deserialize. The data is sent in batches to make
+the cost of the queues per packet small.
+
+    def handle(packet):
+        ...
+
+    with KeyedFanout(Report, "source", handle, workers=4) as fanout:
+        for data in receive():
+            fanout.submit(data)
+"""
+
+import multiprocessing
+import queue
+import struct
+import threading
+
+from .exceptions import DeserializeError
+from .serdepa import SuperSerdepaPacket
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+def _decoder(decoder):
+    if isinstance(decoder, SuperSerdepaPacket):
+        return _ClassDecoder(decoder)
+    if hasattr(decoder, "decode"):
+        return decoder.decode
+    return decoder
+
+
+class _ClassDecoder(object):
+    """
+    Decodes data with a packet class, unlike a closure it can be sent to a process.
+    """
+
+    def __init__(self, packet_class):
+        self.packet_class = packet_class
+
+    def __call__(self, data):
+        packet = self.packet_class()
+        packet.deserialize(data)
+        return packet
+
+
+def _work(batches, results, decoder, handler):
+    errors = {}
+    failure = None
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        if failure is not None:
+            continue  # keep draining so the dispatcher is not blocked
+        for data in batch:
+            try:
+                packet = decoder(data)
+            except DeserializeError as e:
+                errors[e.reason] = errors.get(e.reason, 0) + 1
+                continue
+            except Exception as e:
+                failure = e
+                break
+            try:
+                handler(packet)
+            except Exception as e:
+                failure = e
+                break
+    results.put((errors, failure))
+
+
+# Raised by reading the key of data that is too short
+_KEY_ERRORS = (struct.error, IndexError, DeserializeError)
+
+
+class KeyedFanout(object):
+    """
+    Sends serialized packets to workers by a key, decodes them in the worker and
+    calls handler with every packet. The workers are threads, or processes if
+    processes is True, then the decoder and the handler must be picklable.
+
+    The key is the name of an integer field of the packet class at a static
+    offset, or a function returning the key of the data. The decoder is the
+    packet class, or a PacketRegistry or function decoding the data, then the
+    key must be a function. Data that fails to decode is counted in errors by
+    the DeserializeError reason, data too short for the key is dropped by the
+    dispatcher and counted as "truncated", any other exception raised by the decoder or
+    the handler stops its worker and is raised again by close().
+    """
+
+    def __init__(self, decoder, key, handler, workers=None, processes=False, batch_size=256, max_batches=64):
+        if isinstance(key, str):
+            if not isinstance(decoder, SuperSerdepaPacket):
+                raise ValueError("A key field needs a packet class as the decoder.")
+            key = decoder.field_reader(key)
+        self._key = key
+        self.workers = workers or multiprocessing.cpu_count() or 1
+        self.batch_size = batch_size
+        self.processes = processes
+        self.errors = {}
+        self.submitted = 0
+        if processes:
+            make_queue, worker = multiprocessing.Queue, multiprocessing.Process
+        else:
+            make_queue, worker = queue.Queue, threading.Thread
+        self._results = make_queue()
+        self._queues = [make_queue(max_batches) for _ in range(self.workers)]
+        self._pending = [[] for _ in range(self.workers)]
+        self._workers = [
+            worker(target=_work, args=(batches, self._results, _decoder(decoder), handler))
+            for batches in self._queues
+        ]
+        for process in self._workers:
+            process.daemon = True
+            process.start()
+        self._closed = False
+
+    def worker_of(self, data):
+        """
+        Returns the index of the worker the data goes to.
+        """
+        return hash(self._key(data)) % self.workers
+
+    def submit(self, data):
+        """
+        Queues serialized packet data for the worker of its key.
+        """
+        if self.processes and not isinstance(data, bytes):
+            data = bytes(data)
+        self.submitted += 1
+        try:
+            index = hash(self._key(data)) % self.workers
+        except _KEY_ERRORS:
+            self._count_truncated()
+            return
+        pending = self._pending[index]
+        pending.append(data)
+        if len(pending) >= self.batch_size:
+            self._queues[index].put(pending)
+            self._pending[index] = []
+
+    def submit_many(self, items):
+        """
+        Queues every item of an iterable of serialized packets.
+        """
+        key = self._key
+        workers = self.workers
+        pending = self._pending
+        queues = self._queues
+        batch_size = self.batch_size
+        convert = self.processes
+        count = 0
+        for data in items:
+            if convert and not isinstance(data, bytes):
+                data = bytes(data)
+            count += 1
+            try:
+                index = hash(key(data)) % workers
+            except _KEY_ERRORS:
+                self._count_truncated()
+                continue
+            batch = pending[index]
+            batch.append(data)
+            if len(batch) >= batch_size:
+                queues[index].put(batch)
+                pending[index] = []
+        self.submitted += count
+
+    def _count_truncated(self):
+        self.errors["truncated"] = self.errors.get("truncated", 0) + 1
+
+    def flush(self):
+        """
+        Sends the partial batches to the workers.
+        """
+        for index, batch in enumerate(self._pending):
+            if batch:
+                self._queues[index].put(batch)
+                self._pending[index] = []
+
+    def close(self):
+        """
+        Sends the remaining data, waits until the workers have handled all of it
+        and stops them.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        for batches in self._queues:
+            batches.put(None)
+        failure = None
+        for _ in self._workers:
+            errors, error = self._results.get()
+            for reason, count in errors.items():
+                self.errors[reason] = self.errors.get(reason, 0) + count
+            failure = failure or error
+        for process in self._workers:
+            process.join()
+        if failure is not None:
+            raise failure
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
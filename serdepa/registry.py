@@ -0,0 +1,168 @@
+"""
+registry.py: Dispatching serialized data to packet classes by a discriminator field.
+
+A packet class declares its discriminator next to _fields_, either as a field
+name, in which case the default value of the field is used, or as a
+(name, value) tuple:
+
+    class Beacon(SerdepaPacket):
+        _fields_ = [
+            ("type", nx_uint8, 0x01),
+            ("source", nx_uint16),
+        ]
+        _discriminator_ = "type"
+
+    registry = PacketRegistry()
+    registry.register(Beacon)
+    packet = registry.decode(data)
+
+The discriminator is read straight from the data at the static offset of the
+field and looked up in a table, only the selected class deserializes the data.
+Registries can be nested: registering a PacketRegistry under a value of the
+outer discriminator continues the dispatch with the discriminator of the inner
+registry, for example the AM type inside a frame, and the data is still only
+deserialized once by the final class.
+"""
+
+import struct
+
+from .exceptions import PacketDefinitionError, DeserializeError
+from .serdepa import SuperSerdepaPacket, Length
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class PacketRegistry(object):
+    """
+    Maps discriminator values to packet classes or nested registries. The
+    discriminator location can be given as the offset and integer type of the
+    field, otherwise it is taken from the first registered packet class.
+    """
+
+    def __init__(self, offset=None, field_type=None):
+        self._offset = None
+        self._format = None
+        self._size = None
+        self._unpack_from = None
+        self._table = {}
+        self._array = None
+        if offset is not None or field_type is not None:
+            if offset is None or field_type is None:
+                raise PacketDefinitionError("Both the offset and the type of the discriminator are needed.")
+            self._set_discriminator(offset, field_type._format, field_type.static_size())
+
+    def _set_discriminator(self, offset, fmt, size):
+        if self._offset is None:
+            self._offset = offset
+            self._format = fmt
+            self._size = size
+            self._unpack_from = struct.Struct(fmt).unpack_from
+            if size == 1:
+                self._array = [None] * 256
+        elif (offset, fmt) != (self._offset, self._format):
+            raise PacketDefinitionError(
+                "Discriminator at offset {} ({}) does not match the registry discriminator at offset {} ({}).".format(
+                    offset, fmt, self._offset, self._format
+                )
+            )
+
+    @staticmethod
+    def discriminator(packet_class):
+        """
+        Returns the (field name, value) discriminator declared by the packet class.
+        """
+        declared = getattr(packet_class, "_discriminator_", None)
+        if declared is None:
+            raise PacketDefinitionError("{} does not declare a _discriminator_.".format(packet_class.__name__))
+        if isinstance(declared, (tuple, list)):
+            name, value = declared
+        else:
+            name = declared
+            if name not in packet_class._fields:
+                raise PacketDefinitionError("{} has no field {}.".format(packet_class.__name__, name))
+            value = packet_class._fields[name][1]
+            if value is None:
+                raise PacketDefinitionError(
+                    "The discriminator field {} of {} needs a default value.".format(name, packet_class.__name__)
+                )
+        return name, value
+
+    def register(self, target, value=None):
+        """
+        Register a packet class under its declared discriminator value, or a nested
+        PacketRegistry under the given value. Returns the target, so it can be used
+        as a class decorator.
+        """
+        if isinstance(target, PacketRegistry):
+            if value is None:
+                raise PacketDefinitionError("A nested registry needs a discriminator value.")
+            if self._offset is None:
+                raise PacketDefinitionError("The registry discriminator must be known before nesting registries.")
+        elif isinstance(target, SuperSerdepaPacket):
+            name, declared = self.discriminator(target)
+            if value is None:
+                value = declared
+            target.field_reader(name)  # raises PacketDefinitionError if the field can't be read in place
+            _type = target._fields[name][0]
+            if isinstance(_type, Length):
+                _type = _type._type
+            self._set_discriminator(target.field_offset(name), _type._format, _type.static_size())
+        else:
+            raise PacketDefinitionError("Can't register {!r}.".format(target))
+
+        key = self._key(value)
+        if self._table.get(key, target) is not target:
+            raise PacketDefinitionError(
+                "Discriminator value {} is already taken by {!r}.".format(value, self._table[key])
+            )
+        self._table[key] = target
+        if self._array is not None:
+            self._array[key] = target
+        return target
+
+    def _key(self, value):
+        if self._array is not None:
+            return value & 0xFF  # 8 bit discriminators are looked up by the raw byte
+        return value
+
+    def lookup(self, data, pos=0):
+        """
+        Returns the packet class for the data without deserializing anything.
+        """
+        registry = self
+        while True:
+            offset = pos + registry._offset
+            try:
+                if registry._array is not None:
+                    target = registry._array[data[offset]]
+                else:
+                    target = registry._table.get(registry._unpack_from(data, offset)[0])
+            except (IndexError, struct.error):
+                raise DeserializeError("Data too short for the discriminator at offset {}.".format(offset),
+                                       reason="truncated")
+            if target is None:
+                raise DeserializeError(
+                    "Unknown discriminator {!r} at offset {}.".format(
+                        bytes(data[offset:offset + registry._size]), offset
+                    ),
+                    reason="unknown_discriminator"
+                )
+            if not isinstance(target, PacketRegistry):
+                return target
+            registry = target
+
+    def decode(self, data, pos=0):
+        """
+        Deserializes the data, starting at pos, into an instance of the registered packet class.
+        """
+        packet = self.lookup(data, pos)()
+        packet.deserialize(data, pos)
+        return packet
+
+    def __contains__(self, value):
+        return self._key(value) in self._table
+
+    def __len__(self):
+        return len(self._table)
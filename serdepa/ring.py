@@ -0,0 +1,348 @@
+"""
+ring.py: A shared memory ring buffer for passing packets between processes.
+
+One producer serializes packets straight into length prefixed records in a
+multiprocessing.shared_memory block and consumers decode them straight from it,
+nothing is pickled or copied through a pipe. The producer and every consumer
+own a cursor in the block, the producer publishes its cursor after writing a
+batch of records and a consumer publishes its cursor after it is done with a
+batch. Waiting for data or free space polls the cursors.
+
+The cursors are only read and written holding the multiprocessing.Lock of the
+ring, once per batch. Acquiring and releasing the lock are memory barriers, so
+a consumer that sees a cursor sees all the records before it, and the producer
+only reuses space the consumer is done reading, also on processors that
+reorder memory accesses, ARM for example. The lock is shared with the consumer
+processes like other multiprocessing locks, when they are started:
+
+    ring = PacketRing.create(capacity=1 << 20, consumers=2)
+    multiprocessing.Process(target=consume, args=(ring.name, ring.lock, index)).start()
+    ring.publish_many(packets)
+    ring.finish()
+
+    def consume(name, lock, index):
+        ring = PacketRing.attach(name, lock)
+        for packet in ring.reader(index, Report):
+            ...
+
+The ring itself can be passed to the process as well, it is attached there.
+
+The records are divided between the consumers by their sequence number, record
+n goes to the consumer n % consumers, or with partition=False every consumer
+gets every record. A consumer keeps the sequence number of the record at its
+cursor next to the cursor, so a reader attached again continues the same
+partition. The producer waits for the slowest consumer.
+"""
+
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from .exceptions import SerializeError
+from .serdepa import SuperSerdepaPacket
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+MAGIC = b"SDPR"
+_HEADER = struct.Struct("<4sIQQQ")  # magic, partition, capacity, consumers, finished
+_WRITE = _HEADER.size
+_CURSORS = 64  # every cursor has its own cache line
+_CURSOR = struct.Struct("<Q")
+_SEQ = _CURSOR.size  # the offset of the sequence number of a consumer in its cursor line
+_LENGTH = struct.Struct("<I")
+_WRAP = 0xFFFFFFFF
+
+
+def _pause(attempt):
+    time.sleep(min(0.001, 0.00001 * (1 << min(attempt, 7))))
+
+
+class PacketRing(object):
+    """
+    A ring buffer in a shared memory block, created by the producer with
+    create() and opened by the consumer processes with attach().
+    """
+
+    def __init__(self, memory, owner, lock):
+        self._memory = memory
+        # A forked consumer process has a copy of the producer's ring, it must not remove the block.
+        self._owner = os.getpid() if owner else None
+        self.lock = lock
+        magic, self.partition, self.capacity, self.consumers, finished = _HEADER.unpack_from(memory.buf)
+        if magic != MAGIC:
+            raise ValueError("{} is not a packet ring.".format(memory.name))
+        self.partition = bool(self.partition)
+        self._buf = memory.buf
+        self._data_start = _CURSORS * (self.consumers + 1)
+        self._data = memory.buf[self._data_start:self._data_start + self.capacity]
+        self._write = self._load(_WRITE)
+        self._limit = 0
+
+    @classmethod
+    def create(cls, capacity=1 << 20, consumers=1, partition=True, name=None):
+        """
+        Creates a ring with capacity bytes for records and cursors for the given number of consumers.
+        """
+        if consumers < 1:
+            raise ValueError("A ring needs at least one consumer.")
+        memory = shared_memory.SharedMemory(name, create=True, size=_CURSORS * (consumers + 1) + capacity)
+        memory.buf[:_CURSORS * (consumers + 1)] = bytes(_CURSORS * (consumers + 1))
+        _HEADER.pack_into(memory.buf, 0, MAGIC, int(partition), capacity, consumers, 0)
+        return cls(memory, True, multiprocessing.Lock())
+
+    @classmethod
+    def attach(cls, name, lock):
+        """
+        Opens the ring created under name by another process, lock is the lock of that ring.
+        """
+        try:
+            memory = shared_memory.SharedMemory(name, track=False)
+        except TypeError:  # Python < 3.13 has no track argument
+            memory = shared_memory.SharedMemory(name)
+            # Otherwise the resource tracker removes the block when this process exits.
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory, False, lock)
+
+    def __reduce__(self):
+        return PacketRing.attach, (self.name, self.lock)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def _load(self, position):
+        with self.lock:
+            return _CURSOR.unpack_from(self._buf, position)[0]
+
+    def _free_until(self):
+        with self.lock:
+            cursors = [_CURSOR.unpack_from(self._buf, _CURSORS * (i + 1))[0] for i in range(self.consumers)]
+        return min(cursors) + self.capacity
+
+    def _wait(self, write, needed, deadline):
+        self._publish(write)
+        attempt = 0
+        while True:
+            self._limit = self._free_until()
+            if write + needed <= self._limit:
+                return
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("No space in the ring for {} bytes.".format(needed))
+            _pause(attempt)
+            attempt += 1
+
+    def _publish(self, write):
+        self._write = write
+        with self.lock:
+            _CURSOR.pack_into(self._buf, _WRITE, write)
+
+    def _put(self, packet, write, deadline):
+        capacity = self.capacity
+        offset = write % capacity
+        limit = min(capacity, offset + self._limit - write)
+        if limit - offset > _LENGTH.size:
+            try:
+                end = packet.serialize_into(self._data[:limit], offset + _LENGTH.size)
+            except SerializeError:
+                pass  # wraps around or waits for the consumers below
+            else:
+                _LENGTH.pack_into(self._data, offset, end - offset - _LENGTH.size)
+                return write + end - offset
+
+        data = packet.serialize()
+        needed = len(data) + _LENGTH.size
+        if needed > capacity:
+            raise SerializeError("The packet needs {} bytes, the ring has {}.".format(needed, capacity))
+        padding = capacity - offset if capacity - offset < needed else 0
+        if write + padding + needed > self._limit:
+            self._wait(write, padding + needed, deadline)
+        if padding:
+            if padding >= _LENGTH.size:
+                _LENGTH.pack_into(self._data, offset, _WRAP)
+            write += padding
+            offset = 0
+        _LENGTH.pack_into(self._data, offset, len(data))
+        self._data[offset + _LENGTH.size:offset + needed] = data
+        return write + needed
+
+    def publish(self, packet, timeout=None):
+        """
+        Writes a packet to the ring, waiting at most timeout seconds for free space.
+        """
+        self.publish_many((packet,), timeout)
+
+    def publish_many(self, packets, timeout=None):
+        """
+        Writes the packets to the ring and makes them visible to the consumers
+        at once, returns the number of packets. Raises TimeoutError if the
+        consumers do not free space within timeout seconds, the packets written
+        before that are published.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        write = self._write
+        count = 0
+        try:
+            for packet in packets:
+                write = self._put(packet, write, deadline)
+                count += 1
+        finally:
+            self._publish(write)
+        return count
+
+    def finish(self):
+        """
+        Marks the end of the stream, the readers stop after the published records.
+        """
+        with self.lock:
+            _HEADER.pack_into(self._buf, 0, MAGIC, int(self.partition), self.capacity, self.consumers, 1)
+
+    @property
+    def finished(self):
+        with self.lock:
+            return bool(_HEADER.unpack_from(self._buf)[4])
+
+    def reader(self, index, decoder=None):
+        """
+        Returns the reader of consumer index. The decoder, a packet class, a
+        PacketRegistry or any callable taking the record data, is needed for
+        read() and iteration.
+        """
+        if not 0 <= index < self.consumers:
+            raise ValueError("The ring has consumers 0 to {}.".format(self.consumers - 1))
+        return RingReader(self, index, decoder)
+
+    def close(self):
+        """
+        Closes the shared memory block, the creator of the ring also removes it.
+        """
+        if self._memory is None:
+            return
+        self._data.release()
+        self._buf = self._data = None
+        self._memory.close()
+        if self._owner == os.getpid():
+            self._memory.unlink()
+        self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RingReader(object):
+    """
+    Reads the records of one consumer from a PacketRing.
+    """
+
+    def __init__(self, ring, index, decoder=None):
+        if isinstance(decoder, SuperSerdepaPacket):
+            packet_class = decoder
+
+            def decoder(data):
+                packet = packet_class()
+                packet.deserialize(data)
+                return packet
+        elif decoder is not None and hasattr(decoder, "decode"):
+            decoder = decoder.decode
+        self._decoder = decoder
+        self._ring = ring
+        self._index = index
+        self._position = _CURSORS * (index + 1)
+        self._read = ring._load(self._position)
+        self._pending = None
+        self._seq = ring._load(self._position + _SEQ)
+        self._pending_seq = self._seq
+        self._views = []
+
+    def views(self, max_count=None, timeout=None):
+        """
+        Returns memoryviews of the next published records of this consumer, at
+        most max_count of them. Waits at most timeout seconds, forever if it is
+        None, for records and returns an empty list if none came or the ring is
+        finished. The views stay valid until release() or the next call, which
+        hands the space back to the producer.
+        """
+        self.release()
+        ring = self._ring
+        data = ring._data
+        capacity = ring.capacity
+        deadline = None if timeout is None else time.monotonic() + timeout
+        read = self._read
+        attempt = 0
+        while True:
+            write = ring._load(_WRITE)
+            if write != read:
+                break
+            if ring.finished:
+                write = ring._load(_WRITE)
+                if write == read:
+                    return []
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                return []
+            _pause(attempt)
+            attempt += 1
+
+        views = self._views
+        mine = not ring.partition
+        consumers = ring.consumers
+        index = self._index
+        seq = self._seq
+        while read < write and (max_count is None or len(views) < max_count):
+            offset = read % capacity
+            if capacity - offset < _LENGTH.size:
+                read += capacity - offset
+                continue
+            size = _LENGTH.unpack_from(data, offset)[0]
+            if size == _WRAP:
+                read += capacity - offset
+                continue
+            if mine or seq % consumers == index:
+                views.append(data[offset + _LENGTH.size:offset + _LENGTH.size + size])
+            seq += 1
+            read += _LENGTH.size + size
+        self._seq = seq
+        self._pending = read
+        self._pending_seq = seq
+        return list(views)
+
+    def release(self):
+        """
+        Hands the space of the records returned by the last views() call back to the producer.
+        """
+        for view in self._views:
+            view.release()
+        del self._views[:]
+        if self._pending is not None:
+            self._read = self._pending
+            self._pending = None
+            with self._ring.lock:
+                _CURSOR.pack_into(self._ring._buf, self._position + _SEQ, self._pending_seq)
+                _CURSOR.pack_into(self._ring._buf, self._position, self._read)
+
+    def read(self, max_count=None, timeout=None):
+        """
+        Returns the next records decoded, like views().
+        """
+        decoder = self._decoder
+        try:
+            return [decoder(view) for view in self.views(max_count, timeout)]
+        finally:
+            self.release()
+
+    def __iter__(self):
+        while True:
+            packets = self.read(timeout=0.1)
+            if not packets:
+                if self._ring.finished and self._read == self._ring._load(_WRITE):
+                    return
+                continue
+            for packet in packets:
+                yield packet
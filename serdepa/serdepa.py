@@ -2,25 +2,43 @@
 serdepa.py: Binary packet serialization and deserialization library.
 """
 
-from __future__ import unicode_literals
-
-from functools import reduce
 import struct
 import collections
 import warnings
+import array
 import copy
+import itertools
 import math
+import re
+import sys
+import threading
 from codecs import encode
 
-from six import add_metaclass, BytesIO
+try:
+    import numpy
+except ImportError:  # NumPy is optional, only needed for PackedList.as_numpy
+    numpy = None
 
 from .exceptions import PacketDefinitionError, DeserializeError, SerializeError
+from .checksums import get_algorithm
+from .codegen import get_codec, build_function, METHODS as CODEC_METHODS
 
 
 __author__ = "Raido Pahtma, Kaarel Ratas"
 __license__ = "MIT"
 
 
+# Smaller memoryviews are copied in serialize_segments, an extra segment costs more than the copy.
+SEGMENT_MIN_VIEW = 512
+
+
+def _object_sizeof(obj):
+    """
+    Size of an object together with its attribute dictionary, but not the attribute values.
+    """
+    return sys.getsizeof(obj) + sys.getsizeof(obj.__dict__)
+
+
 def add_property(cls, attr, attr_type):
     if hasattr(cls, attr):
         raise PacketDefinitionError(
@@ -28,7 +46,7 @@ def add_property(cls, attr, attr_type):
         )
     else:
 
-        if isinstance(attr_type, BaseIterable) or isinstance(attr_type, ByteString):
+        if isinstance(attr_type, (BaseIterable, ByteString, BasePacked)):
             setter = None
 
             def getter(self):
@@ -43,6 +61,15 @@ def add_property(cls, attr, attr_type):
                     '_field_registry'
                 )[getattr(self, '_depends')[attr]])
 
+        elif isinstance(attr_type, Union):
+            def setter(self, v):
+                union = getattr(self, '_%s' % attr)
+                union.value = v
+                self._field_registry[attr_type._field].value = union.tag
+
+            def getter(self):
+                return getattr(self, '_%s' % attr).value
+
         elif isinstance(attr_type, SuperSerdepaPacket):
             def setter(self, v):
                 if isinstance(v, self._fields[attr][0]):
@@ -71,68 +98,473 @@ def add_property(cls, attr, attr_type):
         setattr(cls, attr, property(getter, setter))
 
 
+class _DefinitionError(object):
+    """
+    Stands in for the attributes of a packet class that failed to prepare, raises the error on every use.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+    def __get__(self, instance, owner):
+        raise PacketDefinitionError(*self.error.args)
+
+
+# Packet classes are prepared on first use, possibly from several threads.
+_prepare_lock = threading.RLock()
+_preparing = set()
+# SerdepaPacket itself is never prepared, it looks like a class without fields.
+_ROOT_ATTRIBUTES = {
+    "_fields": collections.OrderedDict,
+    "_depends": dict,
+    "_checksums": set,
+    "_bitruns": dict,
+    "_struct_layout": lambda: None,
+}
+
+
 class SuperSerdepaPacket(type):
     """
     Metaclass of the SerdepaPacket object. Essentially does the following:
         Reads the _fields_ attribute of the class and for each 2- or
         3-tuple entry sets up the properties of the class to the right
         names. Also checks that each (non-last) List instance has a
-        Length field associated with it.
+        Length field associated with it. The fields that control another
+        field, Length fields and the tag fields of Unions, are recorded
+        in _depends. Consecutive bit fields are packed into shared bytes,
+        their shift and mask tables are recorded in _bitruns.
+
+    The class is prepared when it is first used, not when it is defined, so
+    importing a module with many packet classes is fast. An invalid class
+    raises PacketDefinitionError on every use, validate_all() prepares all
+    the classes at once.
     """
 
     def __init__(cls, what, bases=None, attrs=None):
+        super(SuperSerdepaPacket, cls).__init__(what, bases, attrs)
+        if any("_fields" in base.__dict__ for base in cls.__mro__[1:]):
+            # The attributes of a prepared base class would hide the missing ones of this class.
+            cls._prepare()
+
+    def __getattr__(cls, name):
+        if cls._is_root() and name in _ROOT_ATTRIBUTES:
+            return _ROOT_ATTRIBUTES[name]()
+        if name.startswith("__") or cls._is_root():
+            raise AttributeError(name)
+        with _prepare_lock:
+            if cls in _preparing:
+                raise AttributeError("type object {!r} has no attribute {!r}".format(cls.__name__, name))
+            cls._prepare()
+        return type.__getattribute__(cls, name)
+
+    def _is_root(cls):
+        """
+        Tells if the class is SerdepaPacket itself, which has no fields and is never prepared.
+        """
+        return not any(isinstance(base, SuperSerdepaPacket) for base in cls.__bases__)
 
-        setattr(cls, "_fields", collections.OrderedDict())
-        setattr(cls, "_depends", dict())
-        if '_fields_' in attrs:
-            for field in attrs['_fields_']:
-                if len(field) == 2 or len(field) == 3:
-                    if len(field) == 2:
-                        default = None
-                    elif isinstance(field[1], Length):
+    def _prepare(cls):
+        """
+        Builds the fields and properties of the class and of its subclasses.
+        """
+        if cls._is_root():
+            return
+        with _prepare_lock:
+            prepared = cls.__dict__.get("_fields")
+            if isinstance(prepared, _DefinitionError):
+                prepared.__get__(None, cls)
+            if prepared is not None or cls in _preparing:
+                return
+            _preparing.add(cls)
+            before = set(cls.__dict__)
+            try:
+                cls._build()
+            except Exception:
+                for name in set(cls.__dict__) - before:
+                    delattr(cls, name)
+                raise
+            finally:
+                _preparing.discard(cls)
+            for subclass in cls.__subclasses__():
+                try:
+                    subclass._prepare()
+                except PacketDefinitionError as e:
+                    # Left unprepared, the subclass would use the fields of this class.
+                    for name in ("_depends", "_checksums", "_bitruns", "_fields"):
+                        setattr(subclass, name, _DefinitionError(e))
+
+    def _build(cls):
+        fields = collections.OrderedDict()
+        depends = dict()
+        checksums = set()
+        fields_ = cls.__dict__.get("_fields_", ())
+        for field in fields_:
+            if len(field) == 2 or len(field) == 3:
+                if len(field) == 2:
+                    default = None
+                elif isinstance(field[1], Length):
+                    raise PacketDefinitionError(
+                        "A Length field can't have a default value: {}".format(
+                            field
+                        )
+                    )
+                else:
+                    default = field[2]
+                name, value = field[0], field[1]
+                add_property(cls, name, value)
+                if name in fields:
+                    raise PacketDefinitionError(
+                        "The field {} appears more than once in {}.".format(
+                            name, cls.__name__
+                        )
+                    )
+                fields[name] = [value, default]
+                if not (
+                            isinstance(value, (SerdepaPacket, BaseField)) or
+                            issubclass(value, (SerdepaPacket, BaseField))
+                ):
+                    raise PacketDefinitionError(
+                        "Invalid type {} of field {} in {}".format(
+                            value.__name__, name, cls.__name__
+                        )
+                    )
+                elif isinstance(value, Length):
+                    depends[name] = value._field
+                elif isinstance(value, Union):
+                    tag = fields.get(value._field)
+                    if tag is None or not (isinstance(tag[0], type) and issubclass(tag[0], BaseInt)):
                         raise PacketDefinitionError(
-                            "A Length field can't have a default value: {}".format(
-                                field
+                            "The tag {} of union {} must be a preceding integer field.".format(
+                                value._field, name
                             )
                         )
-                    else:
-                        default = field[2]
-                    name, value = field[0], field[1]
-                    add_property(cls, name, value)
-                    if name in getattr(cls, "_fields"):
+                    depends[value._field] = name
+                elif isinstance(value, Checksum):
+                    names = list(fields)[:-1]
+                    first, last = value._covering or (names[0] if names else None, names[-1] if names else None)
+                    if first not in names or last not in names or names.index(first) > names.index(last):
                         raise PacketDefinitionError(
-                            "The field {} appears more than once in {}.".format(
-                                name, cls.__name__
+                            "Checksum {} must cover a range of preceding fields: {}".format(
+                                name, value._covering
                             )
                         )
-                    getattr(cls, "_fields")[name] = [value, default]
-                    if not (
-                                isinstance(value, (SerdepaPacket, BaseField)) or
-                                issubclass(value, (SerdepaPacket, BaseField))
-                    ):
+                    # The prototype may be shared with other packet classes.
+                    value = fields[name][0] = value._copy()
+                    value._range = (names.index(first), names.index(last) + 1)
+                    checksums.add(name)
+                elif isinstance(value, (List, ByteString, PackedList)):
+                    if not (name in depends.values() or field == fields_[-1]):
                         raise PacketDefinitionError(
-                            "Invalid type {} of field {} in {}".format(
-                                value.__name__, name, cls.__name__
+                            "Only the last field can have an undefined length ({} of type {})".format(
+                                name,
+                                type(value)
                             )
                         )
-                    elif isinstance(value, Length):
-                        getattr(cls, "_depends")[name] = value._field
-                    elif isinstance(value, (List, ByteString)):
-                        if not (name in getattr(cls, "_depends").values() or field == attrs['_fields_'][-1]):
-                            raise PacketDefinitionError(
-                                "Only the last field can have an undefined length ({} of type {})".format(
-                                    name,
-                                    type(value)
-                                )
-                            )
-                else:
-                    raise PacketDefinitionError("A field needs both a name and a type: {}".format(field))
+            else:
+                raise PacketDefinitionError("A field needs both a name and a type: {}".format(field))
+
+        setattr(cls, "_depends", depends)
+        setattr(cls, "_checksums", checksums)
+        setattr(cls, "_bitruns", _pack_bit_runs(fields))
+        _install_codec(cls, fields)
+        # Set last, the class counts as prepared once it has _fields
+        setattr(cls, "_fields", fields)
+
+
+def _pack_bit_runs(fields):
+    """
+    Groups consecutive bit fields of the same byte order into runs and returns
+    the runs by field name. The first field of a run holds the size of the
+    whole run and the others are empty, so the sizes and offsets of the fields
+    come out right.
+    """
+    bitruns = {}
+    runs = []
+    previous = None
+    for name, entry in fields.items():
+        if isinstance(entry[0], BaseBits):
+            # The prototype may be shared with other packet classes.
+            entry[0] = entry[0]._copy()
+            if previous is None or type(previous) is not type(entry[0]):
+                runs.append([])
+            runs[-1].append((name, entry[0]))
+            previous = entry[0]
+        else:
+            previous = None
+
+    for run in runs:
+        bits = sum(field._length for name, field in run)
+        size = (bits + 7) // 8
+        table = []
+        offset = 0
+        for name, field in run:
+            if field._byteorder == "big":
+                shift = size * 8 - offset - field._length
+            else:
+                shift = offset
+            table.append((name, shift, (1 << field._length) - 1))
+            offset += field._length
+            field._size = 0
+            bitruns[name] = None
+        run[0][1]._size = size
+        bitruns[run[0][0]] = (size, run[0][1]._byteorder, tuple(table))
+    return bitruns
+
+
+def _install_codec(cls, fields):
+    """
+    Gives a class of fixed size integer fields of a single byte order the
+    generated serialize, serialize_into and deserialize methods from codegen.
+    Other classes must not inherit the generated methods of a base class.
+    """
+    formats = []
+    for name, (_type, default) in fields.items():
+        if not (isinstance(_type, type) and issubclass(_type, BaseInt) and _type._format and name.isidentifier()):
+            formats = None
+            break
+        formats.append(_type._format)
+    codec = None
+    layout = None
+    if formats and len(set(fmt[0] for fmt in formats)) == 1:
+        layout = (tuple(fields), formats[0][0] + "".join(fmt[1:] for fmt in formats))
+        codec = get_codec(*layout)
+    setattr(cls, "_struct_layout", layout)
+
+    for method in CODEC_METHODS:
+        if method in cls.__dict__:
+            continue  # defined by the class itself
+        if codec is not None:
+            setattr(cls, method, codec[method])
+        else:
+            inherited = getattr(cls, method)
+            # Look through the wrappers of the instrumentation module.
+            if getattr(getattr(inherited, "_original", inherited), "_generated", False):
+                setattr(cls, method, getattr(SerdepaPacket, method))
+
+
+def _plain(field):
+    """
+    Returns the value of any field as plain ints, floats, lists, bytes and dicts.
+    """
+    if isinstance(field, SerdepaPacket):
+        return field.to_dict()
+    elif isinstance(field, ByteString):
+        return bytes(field._data)
+    elif isinstance(field, BasePacked):
+        return field._values.tolist()
+    elif isinstance(field, BaseIterable):
+        return [_plain(item) for item in list.__iter__(field)]
+    elif isinstance(field, Union):
+        return None if field._value is None else field._value.to_dict()
+    return field.value
+
+
+def _make_to_dict(cls):
+    """
+    Generates the to_dict function of a packet class, a dict display with an
+    expression for every field, and stores it on the class.
+    """
+    items = []
+    for name, (_type, default) in cls._fields.items():
+        field = "r[{!r}]".format(name)
+        if isinstance(_type, Length):
+            expr = "len(r[{!r}])".format(cls._depends[name])
+        elif isinstance(_type, SuperSerdepaPacket):
+            expr = field + ".to_dict()"
+        elif isinstance(_type, ByteString):
+            expr = "bytes({}._data)".format(field)
+        elif isinstance(_type, BasePacked):
+            expr = field + "._values.tolist()"
+        elif isinstance(_type, BaseIterable) and isinstance(_type._type, SuperSerdepaPacket):
+            expr = "[item.to_dict() for item in _list_iter({})]".format(field)
+        elif isinstance(_type, BaseIterable) and (isinstance(_type._type, FixedPoint) or (
+                isinstance(_type._type, type) and issubclass(_type._type, BaseInt))):
+            expr = "[item._value for item in _list_iter({})]".format(field)
+        elif isinstance(_type, (BaseInt, BaseBits, FixedPoint, Checksum)) or (
+                isinstance(_type, type) and issubclass(_type, BaseInt)):
+            expr = field + "._value"
+        else:
+            expr = "_plain({})".format(field)
+        items.append("{!r}: {}".format(name, expr))
+    source = "def to_dict(self):\n    r = self._field_registry\n    return {{{}}}\n".format(", ".join(items))
+    to_dict = build_function(source, "to_dict", {"_list_iter": list.__iter__, "_plain": _plain})
+    setattr(cls, "_to_dict", to_dict)
+    return to_dict
+
+
+def _make_from_dict(cls):
+    """
+    Returns and stores on the class a list of (name, convert) pairs, convert
+    turns the dict value of a field into the keyword argument of the packet
+    constructor, None if the value is used as is.
+    """
+    plan = []
+    for name, (_type, default) in cls._fields.items():
+        if isinstance(_type, (Length, Checksum)):
+            continue  # computed when serializing
+        elif isinstance(_type, SuperSerdepaPacket):
+            convert = _nested_from_dict(_type)
+        elif isinstance(_type, BaseIterable) and isinstance(_type._type, SuperSerdepaPacket):
+            convert = _list_from_dict(_type._type)
+        elif isinstance(_type, Union):
+            convert = _union_from_dict(_type)
+        else:
+            convert = None
+        plan.append((name, convert))
+    setattr(cls, "_from_dict_plan", plan)
+    return plan
+
+
+def _nested_from_dict(packet_class):
+    def convert(value, values):
+        return packet_class.from_dict(value)
+    return convert
 
-        super(SuperSerdepaPacket, cls).__init__(what, bases, attrs)
 
+def _list_from_dict(packet_class):
+    def convert(value, values):
+        return [packet_class.from_dict(item) for item in value]
+    return convert
 
-@add_metaclass(SuperSerdepaPacket)
-class SerdepaPacket(object):
+
+def _union_from_dict(union):
+    def convert(value, values):
+        if value is None:
+            return None
+        if union._field not in values:
+            raise ValueError("The tag {} is needed to select the union type.".format(union._field))
+        try:
+            return union._variants[values[union._field]].from_dict(value)
+        except KeyError:
+            raise ValueError("Unknown union tag {}.".format(values[union._field]))
+    return convert
+
+
+_OPERATORS = {"eq": "==", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">=", "in": "in"}
+
+
+def _static_field(cls, path):
+    """
+    Returns the offset and integer type of a possibly nested field at a static offset.
+    """
+    offset = 0
+    for i, name in enumerate(path):
+        field_offset = cls.field_offset(name)
+        _type = cls._fields[name][0]
+        if field_offset is None:
+            raise PacketDefinitionError("Field {} of {} is not at a static offset.".format(name, cls.__name__))
+        offset += field_offset
+        if i < len(path) - 1:
+            if not isinstance(_type, SuperSerdepaPacket):
+                raise PacketDefinitionError("Field {} of {} is not a packet.".format(name, cls.__name__))
+            cls = _type
+    if isinstance(_type, Length):
+        _type = _type._type
+    if not getattr(_type, "_format", None) or _type.static_size() is None:
+        raise PacketDefinitionError("Field {} of {} is not an integer at a static offset.".format(
+            "__".join(path), cls.__name__
+        ))
+    return offset, _type
+
+
+def _ends_in_operator(cls, path):
+    """
+    Tells if the last name of the path follows a field that is not a packet, so it must be an operator.
+    """
+    for name in path[:-1]:
+        if name not in cls._fields:
+            return False
+        _type = cls._fields[name][0]
+        if not isinstance(_type, SuperSerdepaPacket):
+            return name == path[-2]
+        cls = _type
+    return False
+
+
+def _compile_predicate(cls, predicates):
+    """
+    Generates the match(data, pos=0) and scan(data, start, stop, size)
+    functions of the predicates and returns them with the number of bytes the
+    predicate fields need.
+    """
+    if not predicates:
+        raise ValueError("No predicates given.")
+    terms = []
+    namespace = {}
+    end = 0
+    for i, (key, value) in enumerate(predicates.items()):
+        path = key.split("__")
+        operator = "=="
+        if len(path) > 1 and path[-1] in _OPERATORS:
+            operator = _OPERATORS[path.pop()]
+        elif _ends_in_operator(cls, path):
+            raise PacketDefinitionError("Unknown operator {} in {}, the operators are {}.".format(
+                path[-1], key, ", ".join(_OPERATORS)
+            ))
+        offset, _type = _static_field(cls, path)
+        end = max(end, offset + _type.static_size())
+        if operator == "in":
+            value = frozenset(value)
+        namespace["_v{}".format(i)] = value
+        if _type._format[1:] == "B":
+            read = "data[pos + {}]".format(offset)  # a single byte is compared as is
+        else:
+            namespace["_u{}".format(i)] = struct.Struct(_type._format).unpack_from
+            read = "_u{}(data, pos + {})[0]".format(i, offset)
+        terms.append("{} {} _v{}".format(read, operator, i))
+    condition = " and ".join(terms)
+    source = (
+        "def match(data, pos=0):\n"
+        "    return {condition}\n"
+        "\n"
+        "\n"
+        "def scan(data, start, stop, size):\n"
+        "    for pos in range(start, stop, size):\n"
+        "        if {condition}:\n"
+        "            yield pos\n"
+    ).format(condition=condition)
+    match = build_function(source, "match", namespace)
+    return match, match.__globals__["scan"], end
+
+
+# Reads attributes of BaseInt fields past their __getattribute__.
+_get_attribute = object.__getattribute__
+
+
+def _make_clone_plan(cls):
+    """
+    Returns and stores on the class the (name, attribute, int_type) of every
+    field for copying packets, int_type is the class of the integer fields
+    that are copied by value.
+    """
+    plan = tuple(
+        (name, "_" + name, _type if isinstance(_type, type) and issubclass(_type, BaseInt) else None)
+        for name, (_type, default) in cls._fields.items()
+    )
+    setattr(cls, "_clone_plan", plan)
+    return plan
+
+
+def _all_subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        for nested in _all_subclasses(subclass):
+            yield nested
+
+
+def validate_all(classes=None):
+    """
+    Prepares all the packet classes defined so far, or the given classes,
+    raises PacketDefinitionError for the first invalid one. Meant for tests and
+    for programs that would rather fail at startup.
+    """
+    if classes is None:
+        classes = list(_all_subclasses(SerdepaPacket))
+    for cls in classes:
+        cls._prepare()
+
+
+class SerdepaPacket(object, metaclass=SuperSerdepaPacket):
     """
     The superclass for any packets. Defining a subclass works as such:
         class Packet(SerdepaPacket):
@@ -154,57 +586,190 @@ class SerdepaPacket(object):
         self._field_registry = collections.OrderedDict()
         for name, (type_, default) in self._fields.items():
             if name in kwargs:
-                if issubclass(type_, SerdepaPacket):
-                    self._field_registry[name] = copy.copy(kwargs[name])
-                else:
-                    self._field_registry[name] = type_(initial=copy.copy(kwargs[name]))
-            elif default:
+                self._set_field(name, type_, kwargs[name])
+                continue
+            if default:
                 self._field_registry[name] = type_(initial=copy.copy(default))
+                if isinstance(type_, Union):
+                    self._field_registry[type_._field].value = self._field_registry[name].tag
             else:
                 self._field_registry[name] = type_()
             setattr(self, '_%s' % name, self._field_registry[name])
 
+    def _set_field(self, name, type_, value):
+        if isinstance(type_, SuperSerdepaPacket):
+            self._field_registry[name] = copy.copy(value)
+        else:
+            self._field_registry[name] = type_(initial=copy.copy(value))
+        if isinstance(type_, Union):
+            self._field_registry[type_._field].value = self._field_registry[name].tag
+        setattr(self, '_%s' % name, self._field_registry[name])
+
+    def _clone(self):
+        cls = type(self)
+        plan = cls.__dict__.get("_clone_plan")
+        if plan is None:
+            plan = _make_clone_plan(cls)
+        ret = cls.__new__(cls)
+        attrs = ret.__dict__
+        registry = attrs["_field_registry"] = collections.OrderedDict()
+        fields = self._field_registry
+        for name, attr, int_type in plan:
+            if int_type is None:
+                field = fields[name]._clone()
+            else:
+                field = int_type(_get_attribute(fields[name], "_value"))
+            registry[name] = attrs[attr] = field
+        return ret
+
+    def clone(self, **overrides):
+        """
+        Returns a copy of the packet that shares no field objects with it, only
+        the values of the fields are copied. The keyword arguments set fields of
+        the copy like the arguments of the constructor. copy.copy and
+        copy.deepcopy return the same copy.
+        """
+        ret = self._clone()
+        for name, value in overrides.items():
+            if name not in self._fields:
+                raise TypeError("{} has no field {}.".format(type(self).__name__, name))
+            ret._set_field(name, self._fields[name][0], value)
+        return ret
+
+    def __copy__(self):
+        return self._clone()
+
+    def __deepcopy__(self, memo):
+        ret = memo.get(id(self))
+        if ret is None:
+            # Kept in memo so a packet referenced twice is copied once.
+            ret = memo[id(self)] = self._clone()
+        return ret
+
+    def __getattr__(self, name):
+        # Instances made without __init__, unpickled for example, may see the class unprepared.
+        cls = type(self)
+        if name.startswith("__") or "_fields" in cls.__dict__:
+            raise AttributeError("{!r} object has no attribute {!r}".format(cls.__name__, name))
+        if cls._is_root():
+            return getattr(cls, name)
+        cls._prepare()
+        return getattr(self, name)
+
     def serialize(self):
-        serialized = BytesIO()
+        return b"".join(self._serialize_chunks())
+
+    def serialize_into(self, buffer, offset=0):
+        """
+        Serializes the packet into a writable buffer (bytearray, memoryview, mmap)
+        starting at offset and returns the offset after the packet.
+        """
+        chunks = self._serialize_segments()
+        end = offset + sum(len(chunk) for chunk in chunks)
+        if end > len(buffer):
+            raise SerializeError("The packet needs {} bytes, the buffer has {} after offset {}.".format(
+                end - offset, len(buffer) - offset, offset
+            ))
+        view = memoryview(buffer)
+        for chunk in chunks:
+            view[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        return offset
+
+    def serialize_segments(self):
+        """
+        Returns the serialized packet as a list of buffers for socket.sendmsg or
+        os.writev. ByteString and PackedList payloads of at least SEGMENT_MIN_VIEW
+        bytes are memoryviews of the field storage instead of copies, the fields
+        between them are joined into bytes. The payload can't be resized while
+        the views exist.
+        """
+        return self._serialize_segments()
+
+    def _serialize_segments(self):
+        segments = []
+        small = []
+        for parts in self._serialize_chunks(segments=True):
+            for part in parts:
+                if isinstance(part, memoryview) and part.nbytes >= SEGMENT_MIN_VIEW:
+                    if small:
+                        segments.append(b"".join(small))
+                        small = []
+                    segments.append(part)
+                else:
+                    small.append(part)
+        if small:
+            segments.append(b"".join(small))
+        return segments
+
+    def _serialize_chunks(self, segments=False):
+        """
+        Returns the serialized fields as a list with one entry for every field.
+        With segments every entry is a list of buffers from serialize_segments of the field.
+        """
+        chunks = []
         for name, field in self._field_registry.items():
+            if segments and name not in self._depends and name not in self._checksums and name not in self._bitruns:
+                chunks.append(field.serialize_segments())
+                continue
             if name in self._depends:
-                serialized.write(
-                    field.serialize(self._field_registry[self._depends[name]].length)
-                )
+                dependant = self._field_registry[self._depends[name]]
+                if isinstance(field, Length):
+                    chunk = field.serialize(dependant.length)
+                elif dependant.tag is not None:
+                    chunk = field.__class__(initial=dependant.tag).serialize()
+                else:
+                    chunk = field.serialize()
+            elif name in self._checksums:
+                chunk = field.serialize_for(chunks)
+            elif name in self._bitruns:
+                chunk = _pack_bits(self._field_registry, self._bitruns[name])
             else:
-                serialized.write(field.serialize())
-        ret = serialized.getvalue()
-        serialized.close()
-        return ret
+                chunk = field.serialize()
+            chunks.append([chunk] if segments else chunk)
+        return chunks
 
     def deserialize(self, data, pos=0, final=True):
+        starts = []
         for i, (name, field) in enumerate(self._field_registry.items()):
+            starts.append(pos)
+            if name in self._bitruns:
+                if self._bitruns[name] is not None:
+                    pos = _unpack_bits(self._field_registry, data, pos, self._bitruns[name])
+                continue
             if pos >= len(data):
-                if i == len(self._field_registry) - 1 and isinstance(field, (List, ByteString)):
+                if i == len(self._field_registry) - 1 and isinstance(field, (List, ByteString, PackedList)):
                     break
                 else:
-                    raise DeserializeError("Invalid length of data to deserialize.")
+                    raise DeserializeError("Invalid length of data to deserialize.", reason="truncated")
             try:
                 pos = field.deserialize(data, pos, False)
             except AttributeError:
                 for key, value in self._depends.items():
                     if name == value:
-                        pos = field.deserialize(data, pos, False, self._field_registry[key]._type.value)
+                        pos = field.deserialize(data, pos, False, self._field_registry[key].value)
                         break
                 else:
                     pos = field.deserialize(data, pos, False, -1)
+            if name in self._checksums:
+                field.verify(data, starts)
             if pos > len(data):
-                raise DeserializeError("Invalid length of data to deserialize. {}, {}".format(pos, len(data)))
+                raise DeserializeError(
+                    "Invalid length of data to deserialize. {}, {}".format(pos, len(data)), reason="truncated"
+                )
         if final and pos != len(data):
             raise DeserializeError(
-                "After deserialization, {} bytes were left.".format(len(data)-pos+1)
+                "After deserialization, {} bytes were left.".format(len(data)-pos+1), reason="trailing"
             )
         return pos
 
     def serialized_size(self):
         size = 0
         for name, field in self._field_registry.items():
-            size += field.serialized_size()
+            if isinstance(field, Length):
+                size += field.serialized_size(self._field_registry[self._depends[name]].length)
+            else:
+                size += field.serialized_size()
         return size
 
     @classmethod
@@ -214,6 +779,216 @@ class SerdepaPacket(object):
             size += _type.minimal_size()
         return size
 
+    @classmethod
+    def static_size(cls):
+        """
+        Returns the serialized size of the packet if it is the same for every
+        instance, None if the packet contains variable length fields.
+        """
+        size = 0
+        for name, (_type, default) in cls._fields.items():
+            field_size = _type.static_size()
+            if field_size is None:
+                return None
+            size += field_size
+        return size
+
+    @classmethod
+    def field_offset(cls, name):
+        """
+        Returns the offset of the field in the serialized packet, None if the
+        offset depends on the contents of preceding variable length fields.
+        Bit fields return the offset of the bytes shared by their run.
+        """
+        if name not in cls._fields:
+            raise PacketDefinitionError("{} has no field {}.".format(cls.__name__, name))
+        offset = 0
+        run_offset = 0
+        for field_name, (_type, default) in cls._fields.items():
+            if cls._bitruns.get(field_name) is not None:
+                run_offset = offset
+            if field_name == name:
+                return run_offset if field_name in cls._bitruns else offset
+            size = _type.static_size()
+            if size is None:
+                return None
+            offset += size
+
+    @classmethod
+    def field_reader(cls, name):
+        """
+        Returns a function reader(data, pos=0) that reads the value of the integer
+        field straight from serialized data of a packet starting at pos, without
+        deserializing the packet.
+        """
+        offset = cls.field_offset(name)
+        _type = cls._fields[name][0]
+        if isinstance(_type, Length):
+            _type = _type._type
+        if offset is None or not getattr(_type, "_format", None) or _type.static_size() is None:
+            raise PacketDefinitionError(
+                "Field {} of {} is not an integer at a static offset.".format(name, cls.__name__)
+            )
+        unpack_from = struct.Struct(_type._format).unpack_from
+
+        def reader(data, pos=0):
+            return unpack_from(data, pos + offset)[0]
+        return reader
+
+    @classmethod
+    def view(cls, buffer, offset=0):
+        """
+        Returns a PacketView of the packet serialized in the buffer at offset.
+        Assigning to a field of the view packs the value into the buffer, a
+        bytearray, a writable memoryview or mmap, without deserializing or
+        serializing the other fields.
+        """
+        view_class = cls.__dict__.get("_view_class")
+        if view_class is None:
+            view_class = _make_view_class(cls)
+        return view_class(buffer, offset)
+
+    @classmethod
+    def predicate(cls, **predicates):
+        """
+        Returns a function match(data, pos=0) that tests the predicates on the
+        serialized data of a packet starting at pos, without deserializing it.
+        The predicates are integer fields at static offsets, nested fields are
+        joined with "__", with an optional comparison suffix:
+            type=5, source__in={1, 2}, rssi__gt=-70, header__seq__le=1000
+        The suffixes are eq, ne, lt, le, gt, ge and in.
+        """
+        return _compile_predicate(cls, predicates)[0]
+
+    @classmethod
+    def filter(cls, source, /, *, _decode=True, **predicates):
+        """
+        Yields the packets of the source that match the predicates, see
+        predicate(). The predicates are tested on the serialized data and only
+        the matching packets are deserialized, with _decode False their data is
+        yielded instead, the underscore keeps it apart from the field names.
+        The source is an iterable of serialized packets, or, for classes of a
+        static size, a buffer or a binary file of consecutive packets. Packets
+        too short to hold the predicate fields don't match.
+        """
+        match, scan, end = _compile_predicate(cls, predicates)
+        size = cls.static_size()
+        try:
+            chunks = [memoryview(source)]
+        except TypeError:
+            chunks = None
+        if chunks is None and hasattr(source, "read"):
+            if not size:
+                raise ValueError("{} does not have a static size to split a file.".format(cls.__name__))
+            chunks = iter(lambda: source.read(size * 4096), b"")
+
+        if chunks is None:
+            for data in source:
+                if len(data) >= end and match(data):
+                    if _decode:
+                        packet = cls()
+                        packet.deserialize(data)
+                        yield packet
+                    else:
+                        yield data
+            return
+
+        if not size:
+            raise ValueError("{} does not have a static size to split a buffer.".format(cls.__name__))
+        rest = b""
+        for chunk in chunks:
+            data = rest + chunk if rest else chunk
+            stop = len(data) - len(data) % size
+            for pos in scan(data, 0, stop, size):
+                if _decode:
+                    packet = cls()
+                    packet.deserialize(data, pos, final=False)
+                    yield packet
+                else:
+                    yield bytes(data[pos:pos + size])
+            rest = bytes(data[stop:])
+        if rest:
+            raise DeserializeError("The data is not a whole number of packets.", reason="truncated")
+
+    def deep_sizeof(self, per_field=False):
+        """
+        Returns the number of bytes used by the packet instance including all of
+        its field objects, list elements and nested packets. With per_field the
+        sizes of the fields are returned in an OrderedDict instead, the total
+        additionally includes the packet object and its field registry.
+        """
+        fields = collections.OrderedDict(
+            (name, field.deep_sizeof()) for name, field in self._field_registry.items()
+        )
+        if per_field:
+            return fields
+        return _object_sizeof(self) + sys.getsizeof(self._field_registry) + sum(fields.values())
+
+    @classmethod
+    def memory_profile(cls):
+        """
+        Returns an OrderedDict of the bytes held by the class level prototype of
+        every field. Integer types and nested packet classes need no prototype.
+        """
+        return collections.OrderedDict(
+            (name, 0 if isinstance(_type, type) else _type.deep_sizeof())
+            for name, (_type, default) in cls._fields.items()
+        )
+
+    def to_dict(self):
+        """
+        Returns the values of the fields as a dict of ints, floats, lists, bytes
+        and dicts of nested packets, ready for JSON or MsgPack encoding.
+        """
+        to_dict = type(self).__dict__.get("_to_dict")
+        if to_dict is None:
+            to_dict = _make_to_dict(type(self))
+        return to_dict(self)
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Returns a new packet with the fields set from a dict like the ones from
+        to_dict. Length and Checksum fields are computed, their values are ignored.
+        """
+        plan = cls.__dict__.get("_from_dict_plan")
+        if plan is None:
+            plan = _make_from_dict(cls)
+        kwargs = {}
+        for name, convert in plan:
+            if name in values:
+                kwargs[name] = values[name] if convert is None else convert(values[name], values)
+        return cls(**kwargs)
+
+    @classmethod
+    def to_dicts(cls, source):
+        """
+        Returns a list of dicts for an iterable of packets or for a buffer of
+        consecutive serialized packets. Buffers of classes with only fixed size
+        integer fields are converted straight to dicts with struct.iter_unpack,
+        without creating any packet or field objects.
+        """
+        try:
+            data = memoryview(source)
+        except TypeError:
+            return [packet.to_dict() for packet in source]
+
+        layout = cls._struct_layout
+        if layout is not None:
+            names, fmt = layout
+            try:
+                return [dict(zip(names, values)) for values in struct.iter_unpack(fmt, data)]
+            except struct.error as e:
+                raise DeserializeError("The data is not a whole number of packets.", e, reason="truncated")
+
+        dicts = []
+        pos = 0
+        while pos < len(data):
+            packet = cls()
+            pos = packet.deserialize(data, pos, final=False)
+            dicts.append(packet.to_dict())
+        return dicts
+
     def __str__(self):
         return encode(self.serialize(), "hex").decode().upper()
 
@@ -224,17 +999,38 @@ class SerdepaPacket(object):
 class BaseField(object):
 
     def __call__(self, **kwargs):
-        ret = copy.copy(self)
+        ret = self._copy()
         if "initial" in kwargs:
             ret._set_to(kwargs["initial"])
         return ret
 
+    def _copy(self):
+        """
+        Returns a copy of the field that shares no mutable state with this one,
+        fields in _fields are prototypes that every packet instance copies.
+        """
+        ret = type(self).__new__(type(self))
+        ret.__dict__.update(self.__dict__)
+        return ret
+
+    def _clone(self):
+        """
+        Returns a copy of the field and its value for a copy of a packet.
+        """
+        return self._copy()
+
 #    def __call__(self):
 #        return NotImplemented
 #
     def serialize(self):
         return bytearray([])
 
+    def serialize_segments(self):
+        """
+        Returns the serialized field as a list of buffers.
+        """
+        return [self.serialize()]
+
     def deserialize(self, value, pos, final=True):
         raise NotImplementedError()
 
@@ -242,6 +1038,12 @@ class BaseField(object):
     def minimal_size(cls):
         raise NotImplementedError()
 
+    def static_size(self):
+        return None
+
+    def deep_sizeof(self):
+        return _object_sizeof(self)
+
 
 class BaseIterable(BaseField, list):
 
@@ -250,6 +1052,22 @@ class BaseIterable(BaseField, list):
         for value in initial:
             self.append(self._type(initial=copy.copy(value)))
 
+    def _copy(self):
+        if len(self) == 0:
+            return copy.copy(self)
+        return copy.deepcopy(self)
+
+    def _clone(self):
+        ret = type(self).__new__(type(self))
+        ret.__dict__.update(self.__dict__)
+        _type = self._type
+        if isinstance(_type, type) and issubclass(_type, BaseInt):
+            items = [_type(_get_attribute(item, "_value")) for item in list.__iter__(self)]
+        else:
+            items = [item._clone() for item in list.__iter__(self)]
+        list.extend(ret, items)
+        return ret
+
     def _set_to(self, values):
         while len(self) > 0:
             self.pop()
@@ -257,24 +1075,62 @@ class BaseIterable(BaseField, list):
             self.append(value)
 
     def append(self, value):
-        if isinstance(value, self._type):
+        if isinstance(value, self._type if isinstance(self._type, type) else type(self._type)):
             new_value = value
         else:
             new_value = self._type(initial=value)
         super(BaseIterable, self).append(new_value)
 
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + sum(
+            sys.getsizeof(item) if isinstance(item, int) else item.deep_sizeof()
+            for item in list.__iter__(self)
+        )
+
+    def __reduce__(self):
+        # The default list reduction restores the items through __iter__ and
+        # append, before the instance attributes are in place.
+        return _restore_iterable, (self.__class__, self.__dict__.copy(), list(list.__iter__(self)))
+
     def serialize(self):
+        pack_many = getattr(self._type, "_pack_many", None)
+        if pack_many is not None:
+            return bytearray(pack_many([item._value for item in list.__iter__(self)][:self.length]))
         ret = bytearray()
         for i in range(self.length):
             ret += self[i].serialize()
         return ret
 
     def deserialize(self, value, pos, final=True):
-        for i in range(self.length):
-            self[i] = self._type()
-            pos = self[i].deserialize(value, pos, final=final)
+        return self._deserialize_items(value, pos, self.length, final=final)
+
+    def _deserialize_items(self, value, pos, count, final=True):
+        """
+        Replaces the items with count values deserialized from pos, -1 for as many
+        as the data holds. Integer types are unpacked all at once.
+        """
+        _type = self._type
+        unpack_many = getattr(_type, "_unpack_many", None)
+        if unpack_many is not None:
+            values, pos = unpack_many(value, pos, count)
+            self[:] = [_type(initial=v) for v in values]
+            return pos
+        if count == -1:
+            count = (len(value) - pos) // _type().serialized_size()
+        self[:] = [_type() for _ in range(count)]
+        for item in list.__iter__(self):
+            pos = item.deserialize(value, pos, final=final)
         return pos
 
+    def _items_size(self):
+        if self._type.static_size() is not None:
+            return self._type.static_size() * len(self)
+        return sum(item.serialized_size() for item in list.__iter__(self))
+
     def __iter__(self):
         for i in range(len(self)):
             try:
@@ -283,6 +1139,13 @@ class BaseIterable(BaseField, list):
                 yield self[i]
 
 
+def _restore_iterable(cls, state, items):
+    ret = cls.__new__(cls)
+    ret.__dict__.update(state)
+    list.extend(ret, items)
+    return ret
+
+
 class BaseInt(BaseField):
     """
     Base class for all integer types. Has _signed (bool) and _format (struct format string).
@@ -298,6 +1161,9 @@ class BaseInt(BaseField):
     def _set_to(self, value):
         self._value = value
 
+    def _clone(self):
+        return type(self)(_get_attribute(self, "_value"))
+
     @property
     def value(self):
         return self._value
@@ -309,11 +1175,30 @@ class BaseInt(BaseField):
     def serialize(self):
         return struct.pack(self._format, self._value)
 
+    @classmethod
+    def _pack_many(cls, values):
+        return struct.pack("{}{}{}".format(cls._format[0], len(values), cls._format[1:]), *values)
+
+    @classmethod
+    def _unpack_many(cls, data, pos, count):
+        """
+        Returns a tuple of count values unpacked from data starting at pos, -1 for
+        as many as the data holds, and the position after them.
+        """
+        size = cls.static_size()
+        if count == -1:
+            count = (len(data) - pos) // size
+        try:
+            values = struct.unpack_from("{}{}{}".format(cls._format[0], count, cls._format[1:]), data, pos)
+        except struct.error as e:
+            raise DeserializeError("Invalid length of data!", e, reason="truncated")
+        return values, pos + count * size
+
     def deserialize(self, value, pos, final=True):
         try:
             self._value = struct.unpack(self._format, value[pos:pos+self.serialized_size()])[0]
         except struct.error as e:
-            raise DeserializeError("Invalid length of data!", e)
+            raise DeserializeError("Invalid length of data!", e, reason="truncated")
         return pos + self.serialized_size()
 
     @classmethod
@@ -344,6 +1229,13 @@ class BaseInt(BaseField):
     def minimal_size(cls):
         return int(math.ceil(cls._length/8.0))
 
+    @classmethod
+    def static_size(cls):
+        return cls.minimal_size()
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + sys.getsizeof(self._value)
+
 
 class Length(BaseField):
     """
@@ -354,12 +1246,22 @@ class Length(BaseField):
         self._type = object_type()
         self._field = field_name
 
-    def serialized_size(self):
-        return self._type.serialized_size()
+    def _copy(self):
+        ret = copy.copy(self)
+        ret._type = self._type()
+        return ret
+
+    def serialized_size(self, length=None):
+        if length is None:
+            return self._type.serialized_size()
+        return self._type.__class__(initial=length).serialized_size()
+
+    @property
+    def value(self):
+        return self._type.value
 
     def serialize(self, length):  # TODO PyCharm does not like this approach, method signatures don't match
-        self._type.value = length
-        return self._type.serialize()
+        return self._type.__class__(initial=length).serialize()
 
     def deserialize(self, value, pos, final=True):
         return self._type.deserialize(value, pos, final=final)
@@ -367,6 +1269,12 @@ class Length(BaseField):
     def minimal_size(self):
         return self.serialized_size()
 
+    def static_size(self):
+        return self._type.static_size()
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + self._type.deep_sizeof()
+
 
 class List(BaseIterable):
     """
@@ -382,21 +1290,12 @@ class List(BaseIterable):
         return len(self)
 
     def serialized_size(self):
-        return self._type.serialized_size() * self.length
+        return self._items_size()
 
     def deserialize(self, value, pos, final=True, length=None):
         if length is None:
             raise AttributeError("Unknown length.")
-        elif length == -1:
-            del self[:]     # clear the internal list - deserialization will overwrite anyway.
-            for i in range(len(self), (len(value)-pos)//self._type().serialized_size()):
-                self.append(0)
-            return super(List, self).deserialize(value, pos, final=final)
-        else:
-            del self[:]     # clear the internal list - deserialization will overwrite anyway.
-            for i in range(len(self), length):
-                self.append(0)
-            return super(List, self).deserialize(value, pos, final=final)
+        return self._deserialize_items(value, pos, length, final=final)
 
     def minimal_size(cls):
         return 0
@@ -417,82 +1316,1025 @@ class Array(BaseIterable):
         return self._length
 
     def serialized_size(self):
-        return self._type.serialized_size() * self.length
+        if self._type.static_size() is not None:
+            return self._type.static_size() * self.length
+        dl = max(self.length - len(self), 0)
+        return sum(self[i].serialized_size() for i in range(min(len(self), self.length))) + \
+            self._type().serialized_size() * dl
 
     def serialize(self):
         dl = self.length - len(self)
         if dl < 0:
             warnings.warn(RuntimeWarning("The number of items in the Array exceeds the length of the array."))
-        elif dl > 0:
-            self += [self._type() for _ in range(dl)]  # TODO is this correct???
-        ret = super(Array, self).serialize()
-        for i in range(dl):
-            self.pop(-1)
+        if dl > 0:
+            return self._serialize_padded(dl)
+        return super(Array, self).serialize()
+
+    def _serialize_padded(self, dl):
+        pack_many = getattr(self._type, "_pack_many", None)
+        if pack_many is not None:
+            return bytearray(pack_many([item._value for item in list.__iter__(self)] + [0] * dl))
+        ret = bytearray()
+        for i in range(len(self)):
+            ret += self[i].serialize()
+        ret += self._type().serialize() * dl
         return ret
 
-    def deserialize(self, value, pos, final=True):
-        for i in range(len(self), self.length):
-            self.append(self._type())
-        return super(Array, self).deserialize(value, pos, final=final)
-
     def minimal_size(self):
-        return self.serialized_size()
+        return self._type.minimal_size() * self.length
 
+    def static_size(self):
+        size = self._type.static_size()
+        if size is None:
+            return None
+        return size * self.length
 
-class ByteString(BaseField):
+
+class FixedPoint(BaseField):
     """
-    A variable or fixed-length string of bytes.
+    A fixed point number stored as an integer of base_type, the value is the
+    integer multiplied by scale, for example FixedPoint(nx_int16, 2 ** -8) for
+    a Q7.8 number.
     """
 
-    def __init__(self, length=None, **kwargs):
-        if length is not None:
-            self._data_container = Array(nx_uint8, length)
-        else:
-            self._data_container = List(nx_uint8)
-        super(ByteString, self).__init__(**kwargs)
-
-    def __getattr__(self, attr):
-        if attr not in ['_data_container']:
-            return getattr(self._data_container, attr)
-        else:
-            return super(ByteString, self).__getattribute__(attr)
+    def __init__(self, base_type, scale, initial=0.0):
+        if not (isinstance(base_type, type) and issubclass(base_type, BaseInt) and base_type._format):
+            raise PacketDefinitionError("The base type of a FixedPoint must be a fixed size integer type.")
+        self._type = base_type
+        self._scale = scale
+        self._value = initial
 
-    def __setattr__(self, attr, value):
-        if attr not in ['_data_container', '_value']:
-            setattr(self._data_container, attr, value)
-        else:
-            super(ByteString, self).__setattr__(attr, value)
+    def _set_to(self, value):
+        self._value = value
 
     @property
-    def _value(self):
-        return reduce(
-            lambda x, v: x + (v[1] << (8*v[0])),
-            enumerate(
-                reversed(list(self._data_container))
-            ),
-            0
-        )
+    def value(self):
+        return self._value
 
-    def deserialize(self, *args, **kwargs):
-        return self._data_container.deserialize(*args, **kwargs)
+    @value.setter
+    def value(self, value):
+        self._value = float(value)
 
-    def serialize(self, *args, **kwargs):
-        return self._data_container.serialize(*args, **kwargs)
+    def _raw(self, value):
+        return int(round(value / self._scale))
 
-    def __eq__(self, other):
-        return self._value == other
+    def serialize(self):
+        return self._type(initial=self._raw(self._value)).serialize()
 
-    def __repr__(self):
-        return "{} with value {}".format(self.__class__, self._value)
+    def deserialize(self, value, pos, final=True):
+        raw = self._type()
+        pos = raw.deserialize(value, pos, final=final)
+        self._value = raw.value * self._scale
+        return pos
 
-    def __str__(self):
+    def _pack_many(self, values):
+        return self._type._pack_many([self._raw(value) for value in values])
+
+    def _unpack_many(self, data, pos, count):
+        scale = self._scale
+        values, pos = self._type._unpack_many(data, pos, count)
+        return [value * scale for value in values], pos
+
+    def serialized_size(self):
+        return self._type.static_size()
+
+    def minimal_size(self):
+        return self._type.static_size()
+
+    def static_size(self):
+        return self._type.static_size()
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + sys.getsizeof(self._value)
+
+    def __float__(self):
+        return float(self._value)
+
+    def __repr__(self):
+        return "{} with value {}".format(self.__class__, self._value)
+
+
+def _array_typecode(fmt):
+    """
+    Returns the array.array typecode for a struct format of a single value.
+    """
+    size = struct.calcsize(fmt)
+    for typecode in {"i": "il", "I": "IL"}.get(fmt[1], fmt[1]):
+        if array.array(typecode).itemsize == size:
+            return typecode
+    raise PacketDefinitionError("No array type for the struct format {}.".format(fmt))
+
+
+class PacketColumns(object):
+    """
+    The items of a packed list of packets, one array.array of values per field.
+    The packet class must be made of fixed size integer and float fields of one
+    byte order, all the rows are unpacked with a single struct. Items are
+    returned as PacketRow proxies, column(name) returns the values of a field.
+    """
+
+    def __init__(self, packet_class, rows=()):
+        layout = packet_class._struct_layout
+        if layout is None:
+            raise PacketDefinitionError(
+                "A packed list of {} needs a packet class of fixed size integer and float fields "
+                "of one byte order.".format(packet_class.__name__)
+            )
+        self._class = packet_class
+        self._names, fmt = layout
+        self._positions = dict((name, i) for i, name in enumerate(self._names))
+        self._struct = struct.Struct(fmt)
+        self._typecodes = [_array_typecode(packet_class._fields[name][0]._format) for name in self._names]
+        self._columns = [array.array(typecode) for typecode in self._typecodes]
+        self.extend(rows)
+
+    @property
+    def size(self):
+        return self._struct.size
+
+    def column(self, name):
+        """
+        Returns the array.array of the values of a field.
+        """
+        try:
+            return self._columns[self._positions[name]]
+        except KeyError:
+            raise AttributeError("{} has no field {}.".format(self._class.__name__, name))
+
+    def row(self, index):
+        """
+        Returns the values of the fields of an item as a tuple.
+        """
+        return tuple(column[index] for column in self._columns)
+
+    def _row_values(self, item):
+        """
+        Returns the values of the fields of an item, packed once to check them
+        before any column is changed.
+        """
+        if isinstance(item, PacketRow):
+            values = item._owner.row(item._index)
+        elif isinstance(item, SerdepaPacket):
+            registry = item._field_registry
+            values = [registry[name]._value for name in self._names]
+        elif isinstance(item, dict):
+            values = [item[name] for name in self._names]
+        else:
+            values = item
+        try:
+            self._struct.pack(*values)
+        except (struct.error, OverflowError) as e:
+            raise SerializeError("Item {!r} does not fit into {}.".format(item, self._class.__name__), e)
+        return values
+
+    def append(self, item):
+        for column, value in zip(self._columns, self._row_values(item)):
+            column.append(value)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def copy(self):
+        ret = copy.copy(self)
+        ret._columns = [array.array(column.typecode, column) for column in self._columns]
+        return ret
+
+    def tolist(self):
+        return [dict(zip(self._names, row)) for row in zip(*self._columns)]
+
+    def packets(self):
+        """
+        Returns the items as packet objects.
+        """
+        return [self._class(**dict(zip(self._names, row))) for row in zip(*self._columns)]
+
+    def tobytes(self):
+        return b"".join(itertools.starmap(self._struct.pack, zip(*self._columns)))
+
+    def frombytes(self, data):
+        """
+        Appends the items unpacked from the data, a whole number of items.
+        """
+        rows = self._struct.iter_unpack(data)
+        for column, values in zip(self._columns, zip(*rows)):
+            column.extend(values)
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + sum(sys.getsizeof(column) for column in self._columns)
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def __iter__(self):
+        return (PacketRow(self, index) for index in range(len(self)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ret = copy.copy(self)
+            ret._columns = [column[index] for column in self._columns]
+            return ret
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PacketColumns index out of range")
+        return PacketRow(self, index)
+
+    def __setitem__(self, index, item):
+        for column, value in zip(self._columns, self._row_values(item)):
+            column[index] = value
+
+    def __delitem__(self, index):
+        for column in self._columns:
+            del column[index]
+
+
+class PacketRow(object):
+    """
+    An item of PacketColumns, its fields are read and written in the columns.
+    A row refers to a position, it moves to another item if items before it
+    are removed.
+    """
+
+    __slots__ = ("_owner", "_index")
+
+    def __init__(self, owner, index):
+        object.__setattr__(self, "_owner", owner)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, name):
+        return self._owner.column(name)[self._index]
+
+    def __setattr__(self, name, value):
+        self._owner.column(name)[self._index] = value
+
+    def to_dict(self):
+        return dict(zip(self._owner._names, self._owner.row(self._index)))
+
+    def serialize(self):
+        return self._owner._struct.pack(*self._owner.row(self._index))
+
+    def __str__(self):
+        return encode(self.serialize(), "hex").decode().upper()
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __repr__(self):
+        return "{} row {}".format(self._owner._class.__name__, self.to_dict())
+
+
+class PacketView(object):
+    """
+    A packet read and written in place in a buffer, made by
+    PacketClass.view(buffer, offset). Every field at a static offset is a
+    property that unpacks the value from the buffer or packs a new value into
+    it, nested packets are views themselves and fixed length ByteStrings are
+    memoryviews of the buffer. Fields after a variable length field can't be
+    used in a view. Lengths are read only, checksums are not recomputed until
+    update_checksums() is called.
+    """
+
+    __slots__ = ("_buffer", "_offset")
+    _class = None
+    _size = None
+    _end = 0
+    _checksum_plan = ()
+
+    def __init__(self, buffer, offset=0):
+        if len(buffer) < offset + self._end:
+            raise DeserializeError(
+                "A view of {} needs {} bytes, the buffer has {}.".format(
+                    self._class.__name__, self._end, len(buffer) - offset
+                ), reason="truncated"
+            )
+        self._buffer = buffer
+        self._offset = offset
+
+    @property
+    def size(self):
+        return self._size
+
+    def update_checksums(self):
+        """
+        Recomputes the checksums at static offsets that cover fields at static offsets.
+        """
+        data = memoryview(self._buffer)
+        for start, stop, offset, pack_into, algorithm in self._checksum_plan:
+            pos = self._offset
+            pack_into(self._buffer, pos + offset, algorithm.compute(data[pos + start:pos + stop]))
+
+    def packet(self):
+        """
+        Deserializes the viewed data into a packet object. A view of a variable
+        size packet must reach to the end of the buffer.
+        """
+        packet = self._class()
+        packet.deserialize(self._buffer, self._offset, final=self._size is None)
+        return packet
+
+    def serialize(self):
+        size = self._size
+        if size is None:
+            return bytes(self._buffer[self._offset:])
+        return bytes(self._buffer[self._offset:self._offset + size])
+
+    def __str__(self):
+        return encode(self.serialize(), "hex").decode().upper()
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __repr__(self):
+        return "{} at offset {}".format(type(self).__name__, self._offset)
+
+
+def _view_error(message):
+    def getter(self):
+        raise PacketDefinitionError(message)
+    return property(getter)
+
+
+def _int_view(fmt, offset, scale=None, writable=True):
+    unpacker = struct.Struct(fmt)
+    unpack_from = unpacker.unpack_from
+    pack_into = unpacker.pack_into
+
+    if scale is None:
+        def getter(self):
+            return unpack_from(self._buffer, self._offset + offset)[0]
+    else:
+        def getter(self):
+            return unpack_from(self._buffer, self._offset + offset)[0] * scale
+
+    def setter(self, value):
+        if scale is not None:
+            value = int(round(value / scale))
+        try:
+            pack_into(self._buffer, self._offset + offset, value)
+        except struct.error as e:
+            raise SerializeError("Value {} does not fit into {}.".format(value, fmt), e)
+    return property(getter, setter if writable else None)
+
+
+def _bits_view(offset, size, byteorder, shift, mask):
+    def getter(self):
+        pos = self._offset + offset
+        return (int.from_bytes(self._buffer[pos:pos + size], byteorder) >> shift) & mask
+
+    def setter(self, value):
+        if value & ~mask:
+            raise SerializeError("Value {} does not fit into {} bits.".format(value, mask.bit_length()))
+        pos = self._offset + offset
+        word = int.from_bytes(self._buffer[pos:pos + size], byteorder)
+        self._buffer[pos:pos + size] = ((word & ~(mask << shift)) | (value << shift)).to_bytes(size, byteorder)
+    return property(getter, setter)
+
+
+def _bytes_view(offset, length):
+    def getter(self):
+        pos = self._offset + offset
+        return memoryview(self._buffer)[pos:pos + length]
+
+    def setter(self, value):
+        if len(value) != length:
+            raise SerializeError("A ByteString({}) can't be set to {} bytes.".format(length, len(value)))
+        pos = self._offset + offset
+        self._buffer[pos:pos + length] = value
+    return property(getter, setter)
+
+
+def _packet_view(packet_class, offset):
+    size = packet_class.static_size()
+
+    def getter(self):
+        return packet_class.view(self._buffer, self._offset + offset)
+
+    def setter(self, value):
+        data = value.serialize()
+        if size is None or len(data) != size:
+            raise SerializeError("A {} of {} bytes can't be written in place.".format(
+                packet_class.__name__, len(data)
+            ))
+        pos = self._offset + offset
+        self._buffer[pos:pos + size] = data
+    return property(getter, setter)
+
+
+def _make_view_class(cls):
+    """
+    Generates the PacketView subclass of a packet class and stores it on the class.
+    """
+    attrs = {"__slots__": (), "_class": cls}
+    checksums = []
+    starts = []
+    offset = 0
+    end = 0
+    for name, (_type, default) in cls._fields.items():
+        starts.append(offset)
+        size = _type.static_size()
+        if offset is None:
+            attrs[name] = _view_error("Field {} of {} is not at a static offset.".format(name, cls.__name__))
+            continue
+        run = cls._bitruns.get(name, False)
+        if run is not False:
+            if run is not None:
+                run_size, byteorder, table = run
+                for bit_name, shift, mask in table:
+                    attrs[bit_name] = _bits_view(offset, run_size, byteorder, shift, mask)
+        elif isinstance(_type, SuperSerdepaPacket):
+            attrs[name] = _packet_view(_type, offset)
+        elif isinstance(_type, type) and issubclass(_type, BaseInt) and _type._format:
+            attrs[name] = _int_view(_type._format, offset)
+        elif isinstance(_type, Length) and getattr(_type._type, "_format", None):
+            attrs[name] = _int_view(_type._type._format, offset, writable=False)
+        elif isinstance(_type, FixedPoint):
+            attrs[name] = _int_view(_type._type._format, offset, scale=_type._scale)
+        elif isinstance(_type, Checksum):
+            attrs[name] = _int_view(_type._type._format, offset)
+            checksums.append((_type, offset))
+        elif isinstance(_type, ByteString) and size is not None:
+            attrs[name] = _bytes_view(offset, size)
+        else:
+            attrs[name] = _view_error("Field {} of {} can't be used in a view.".format(name, cls.__name__))
+            offset = None if size is None else offset + size
+            continue
+        end = offset + (_type.minimal_size() if size is None else size)
+        offset = None if size is None else offset + size
+    starts.append(offset)
+
+    plan = []
+    for _type, checksum_offset in checksums:
+        first, stop = _type._range
+        if starts[first] is not None and starts[stop] is not None:
+            plan.append((starts[first], starts[stop], checksum_offset,
+                         struct.Struct(_type._type._format).pack_into, _type._algorithm))
+    attrs["_checksum_plan"] = tuple(plan)
+    attrs["_size"] = cls.static_size()
+    attrs["_end"] = end
+    view_class = type(str("{}View".format(cls.__name__)), (PacketView,), attrs)
+    setattr(cls, "_view_class", view_class)
+    return view_class
+
+
+class BasePacked(BaseField):
+    """
+    Base class of the packed lists: integers, floats or fixed point numbers kept
+    in an array.array instead of a list of field objects, or packets kept as
+    PacketColumns. All the items are converted at once when deserializing and
+    serializing.
+    """
+
+    def __init__(self, object_type, initial=()):
+        if isinstance(object_type, SuperSerdepaPacket):
+            self._type = object_type
+            self._scale = None
+            self._swap = False
+            self._values = PacketColumns(object_type, initial)
+            self._size = self._values.size
+            return
+        if isinstance(object_type, FixedPoint):
+            self._scale = object_type._scale
+            fmt = object_type._type._format
+        elif isinstance(object_type, type) and issubclass(object_type, BaseInt) and object_type._format:
+            self._scale = None
+            fmt = object_type._format
+        else:
+            raise PacketDefinitionError(
+                "A packed list needs a fixed size integer, float, FixedPoint or packet type."
+            )
+        self._type = object_type
+        self._size = struct.calcsize(fmt)
+        self._raw_typecode = _array_typecode(fmt)
+        self._swap = ("big" if fmt[0] == ">" else "little") != sys.byteorder
+        self._values = array.array("d" if self._scale is not None else self._raw_typecode, initial)
+
+    def _copy(self):
+        ret = copy.copy(self)
+        if isinstance(self._values, PacketColumns):
+            ret._values = self._values.copy()
+        else:
+            ret._values = array.array(self._values.typecode, self._values)
+        return ret
+
+    def _set_to(self, values):
+        if isinstance(self._values, PacketColumns):
+            self._values = PacketColumns(self._type, values)
+        else:
+            self._values = array.array(self._values.typecode, values)
+
+    @property
+    def value(self):
+        return self._values
+
+    def as_array(self):
+        """
+        Returns the items as the underlying array.array.
+        """
+        return self._values
+
+    def column(self, name):
+        """
+        Returns the array.array of the values of a field of the packets in the list.
+        """
+        if not isinstance(self._values, PacketColumns):
+            raise AttributeError("Only a packed list of packets has columns.")
+        return self._values.column(name)
+
+    def as_numpy(self):
+        """
+        Returns a NumPy array sharing memory with the items, the list can't change
+        its size while the NumPy array exists.
+        """
+        if numpy is None:
+            raise ImportError("NumPy is not installed.")
+        return numpy.frombuffer(self._values, dtype=self._values.typecode)
+
+    def append(self, value):
+        self._values.append(value)
+
+    def extend(self, values):
+        self._values.extend(values)
+
+    def _encode(self, values):
+        if isinstance(values, PacketColumns):
+            return values.tobytes()
+        if self._scale is not None:
+            scale = self._scale
+            values = array.array(self._raw_typecode, [int(round(value / scale)) for value in values])
+        elif self._swap:
+            values = array.array(values.typecode, values)
+        if self._swap:
+            values.byteswap()
+        return values.tobytes()
+
+    def _segments(self, values):
+        if self._scale is not None or self._swap or isinstance(values, PacketColumns):
+            return [self._encode(values)]
+        return [memoryview(values).cast("B")]
+
+    def _decode(self, data, pos, count):
+        end = pos + count * self._size
+        if end > len(data):
+            raise DeserializeError("Invalid length of data!", reason="truncated")
+        if isinstance(self._values, PacketColumns):
+            self._values = PacketColumns(self._type)
+            self._values.frombytes(data[pos:end])
+            return end
+        values = array.array(self._raw_typecode)
+        values.frombytes(data[pos:end])
+        if self._swap:
+            values.byteswap()
+        if self._scale is not None:
+            scale = self._scale
+            values = array.array("d", [value * scale for value in values])
+        self._values = values
+        return end
+
+    def deep_sizeof(self):
+        if isinstance(self._values, PacketColumns):
+            return _object_sizeof(self) + self._values.deep_sizeof()
+        return _object_sizeof(self) + sys.getsizeof(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __setitem__(self, index, value):
+        self._values[index] = value
+
+    def __repr__(self):
+        return "{} with value {}".format(self.__class__, list(self._values))
+
+
+class PackedList(BasePacked):
+    """
+    A packed list with its length defined elsewhere.
+    """
+
+    @property
+    def length(self):
+        return len(self._values)
+
+    def serialize(self):
+        return self._encode(self._values)
+
+    def serialize_segments(self):
+        return self._segments(self._values)
+
+    def deserialize(self, value, pos, final=True, length=None):
+        if length is None:
+            raise AttributeError("Unknown length.")
+        elif length == -1:
+            length = (len(value) - pos) // self._size
+        return self._decode(value, pos, length)
+
+    def serialized_size(self):
+        return self._size * len(self._values)
+
+    def minimal_size(self):
+        return 0
+
+
+class PackedArray(BasePacked):
+    """
+    A fixed-length packed array of values.
+    """
+
+    def __init__(self, object_type, length, **kwargs):
+        self._length = length
+        super(PackedArray, self).__init__(object_type, **kwargs)
+
+    @property
+    def length(self):
+        return self._length
+
+    def serialize(self):
+        return b"".join(self.serialize_segments())
+
+    def serialize_segments(self):
+        dl = self._length - len(self._values)
+        if dl < 0:
+            warnings.warn(RuntimeWarning("The number of items in the Array exceeds the length of the array."))
+            return [self._encode(self._values[:self._length])]
+        elif dl > 0:
+            return self._segments(self._values) + [bytes(self._size * dl)]
+        return self._segments(self._values)
+
+    def deserialize(self, value, pos, final=True):
+        return self._decode(value, pos, self._length)
+
+    def serialized_size(self):
+        return self._size * self._length
+
+    def minimal_size(self):
+        return self._size * self._length
+
+    def static_size(self):
+        return self._size * self._length
+
+
+class Union(BaseField):
+    """
+    A nested packet whose type is selected by the value of a preceding integer
+    tag field. The variants map tag values to packet classes:
+        ("kind", nx_uint8),
+        ("payload", Union("kind", {1: Temperature, 2: Humidity})),
+    The tag is written from the type of the assigned packet when serializing.
+    """
+
+    def __init__(self, tag_field, variants, **kwargs):
+        self._field = tag_field
+        self._variants = dict(variants)
+        self._tags = dict((packet_class, tag) for tag, packet_class in self._variants.items())
+        for packet_class in self._tags:
+            if not isinstance(packet_class, SuperSerdepaPacket):
+                raise PacketDefinitionError("Union variants must be packet classes: {}".format(packet_class))
+        self._value = None
+        if "initial" in kwargs:
+            self._set_to(kwargs["initial"])
+
+    def _clone(self):
+        ret = self._copy()
+        if self._value is not None:
+            ret._value = self._value._clone()
+        return ret
+
+    def _set_to(self, value):
+        if value is not None and value.__class__ not in self._tags:
+            raise ValueError(
+                "Cannot assign a value of type {} to a union of {}".format(
+                    value.__class__.__name__,
+                    ", ".join(sorted(packet_class.__name__ for packet_class in self._tags))
+                )
+            )
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._set_to(value)
+
+    @property
+    def tag(self):
+        if self._value is None:
+            return None
+        return self._tags[self._value.__class__]
+
+    def serialize(self):
+        if self._value is None:
+            return b""
+        return self._value.serialize()
+
+    def deserialize(self, value, pos, final=True, tag=None):
+        if tag is None:
+            raise AttributeError("Unknown tag.")
+        try:
+            packet_class = self._variants[tag]
+        except KeyError:
+            raise DeserializeError("Unknown union tag {} at {}.".format(tag, pos), reason="unknown_tag")
+        self._value = packet_class()
+        return self._value.deserialize(value, pos, final=False)
+
+    def serialized_size(self):
+        if self._value is None:
+            return 0
+        return self._value.serialized_size()
+
+    def minimal_size(self):
+        return min(packet_class.minimal_size() for packet_class in self._tags)
+
+    def static_size(self):
+        sizes = set(packet_class.static_size() for packet_class in self._tags)
+        if len(sizes) == 1:
+            return sizes.pop()
+        return None
+
+    def deep_sizeof(self):
+        size = _object_sizeof(self)
+        if self._value is not None:
+            size += self._value.deep_sizeof()
+        return size
+
+
+def _pack_bits(registry, run):
+    if run is None:
+        return b""
+    size, byteorder, table = run
+    word = 0
+    for name, shift, mask in table:
+        value = registry[name]._value
+        if value & ~mask:
+            raise SerializeError("Value {} of {} does not fit into {} bits.".format(value, name, mask.bit_length()))
+        word |= value << shift
+    return word.to_bytes(size, byteorder)
+
+
+def _unpack_bits(registry, data, pos, run):
+    size, byteorder, table = run
+    end = pos + size
+    if end > len(data):
+        raise DeserializeError("Invalid length of data to deserialize.", reason="truncated")
+    word = int.from_bytes(data[pos:end], byteorder)
+    for name, shift, mask in table:
+        registry[name]._value = (word >> shift) & mask
+    return end
+
+
+class BaseBits(BaseField):
+    """
+    Base class for unsigned bit fields of a given number of bits. In a packet
+    the consecutive bit fields share bytes and are read and written as a single
+    integer, a bit field on its own takes up whole bytes.
+    """
+
+    _byteorder = None
+
+    def __init__(self, length, initial=0):
+        if length < 1:
+            raise PacketDefinitionError("A bit field needs at least one bit.")
+        self._length = length
+        self._size = (length + 7) // 8
+        self._value = initial
+
+    def _set_to(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = int(value)
+
+    def serialize(self):
+        if self._size == 0:
+            return b""
+        return _pack_bits({None: self}, (self._size, self._byteorder, ((None, 0, (1 << self._length) - 1),)))
+
+    def deserialize(self, value, pos, final=True):
+        if self._size == 0:
+            return pos
+        run = (self._size, self._byteorder, ((None, 0, (1 << self._length) - 1),))
+        return _unpack_bits({None: self}, value, pos, run)
+
+    def serialized_size(self):
+        return self._size
+
+    def minimal_size(self):
+        return self._size
+
+    def static_size(self):
+        return self._size
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + sys.getsizeof(self._value)
+
+    def __int__(self):
+        return self._value
+
+    def __repr__(self):
+        return "{}({}) with value {}".format(self.__class__.__name__, self._length, self._value)
+
+
+class nx_bits(BaseBits):
+    """
+    Big endian bit fields, the first field of a run takes the most significant bits.
+    """
+    _byteorder = "big"
+
+
+class bits(BaseBits):
+    """
+    Little endian bit fields, the first field of a run takes the least significant bits.
+    """
+    _byteorder = "little"
+
+
+class Checksum(BaseField):
+    """
+    A checksum over a range of preceding fields, computed when the packet is
+    serialized and verified when it is deserialized. The algorithm is a name
+    from serdepa.checksums.ALGORITHMS or an algorithm object, covering is the
+    (first_field, last_field) range and defaults to all preceding fields. The
+    value is stored as a big-endian unsigned integer of the algorithm width,
+    unless value_type specifies another integer type.
+    """
+
+    def __init__(self, algorithm, covering=None, value_type=None, **kwargs):
+        self._algorithm = get_algorithm(algorithm)
+        self._covering = covering
+        self._range = None
+        if value_type is None:
+            value_type = {8: nx_uint8, 16: nx_uint16, 32: nx_uint32, 64: nx_uint64}[self._algorithm.width]
+        self._type = value_type
+        self._value = 0
+        if "initial" in kwargs:
+            self._set_to(kwargs["initial"])
+
+    def _set_to(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = int(value)
+
+    def serialize(self):
+        return struct.pack(self._type._format, self._value)
+
+    def serialize_for(self, chunks):
+        """
+        Serializes the checksum of the covered fields, chunks are the serialized
+        fields or lists of the segments of the fields.
+        """
+        first, stop = self._range
+        covered = []
+        for chunk in chunks[first:stop]:
+            if isinstance(chunk, list):
+                covered.extend(chunk)
+            else:
+                covered.append(chunk)
+        return struct.pack(self._type._format, self._algorithm.compute(*covered))
+
+    def deserialize(self, value, pos, final=True):
+        try:
+            self._value = struct.unpack(self._type._format, value[pos:pos+self.serialized_size()])[0]
+        except struct.error as e:
+            raise DeserializeError("Invalid length of data!", e, reason="truncated")
+        return pos + self.serialized_size()
+
+    def verify(self, data, starts):
+        """
+        Checks the deserialized value against the data, starts are the positions of the fields.
+        """
+        first, stop = self._range
+        expected = self._algorithm.compute(memoryview(data)[starts[first]:starts[stop]])
+        if expected != self._value:
+            raise DeserializeError(
+                "Checksum mismatch, expected {:X}, got {:X}.".format(expected, self._value), reason="checksum"
+            )
+
+    def serialized_size(self):
+        return self._type.serialized_size()
+
+    def minimal_size(self):
+        return self._type.minimal_size()
+
+    def static_size(self):
+        return self._type.static_size()
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + sys.getsizeof(self._value)
+
+
+class ByteString(BaseField):
+    """
+    A variable or fixed-length string of bytes, stored in a bytearray.
+    """
+
+    def __init__(self, length=None, initial=b""):
+        self._length = length
+        self._data = bytearray(initial)
+
+    def _copy(self):
+        ret = copy.copy(self)
+        ret._data = bytearray(self._data)
+        return ret
+
+    def _set_to(self, value):
+        self._data = bytearray(value)
+
+    def __getattr__(self, attr):
+        # The bytearray methods, append, extend, etc., are available on the field.
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._data, attr)
+
+    @property
+    def _value(self):
+        return int.from_bytes(self._data, "big")
+
+    @property
+    def length(self):
+        if self._length is None:
+            return len(self._data)
+        return self._length
+
+    def deserialize(self, value, pos, final=True, length=None):
+        if self._length is not None:
+            length = self._length
+        elif length is None:
+            raise AttributeError("Unknown length.")
+        elif length == -1:
+            length = len(value) - pos
+        if pos + length > len(value):
+            raise DeserializeError("Invalid length of data!", reason="truncated")
+        self._data = bytearray(value[pos:pos + length])
+        return pos + length
+
+    def serialize(self):
+        return b"".join(self.serialize_segments())
+
+    def serialize_segments(self):
+        """
+        Returns the serialized field as a list of a memoryview of the data and the padding of a fixed length string.
+        """
+        dl = self.length - len(self._data)
+        if dl < 0:
+            warnings.warn(RuntimeWarning("The number of items in the Array exceeds the length of the array."))
+            return [memoryview(self._data)[:self.length]]
+        elif dl > 0:
+            return [memoryview(self._data), bytes(dl)]
+        return [memoryview(self._data)]
+
+    def serialized_size(self):
+        return self.length
+
+    def minimal_size(self):
+        return self._length or 0
+
+    def static_size(self):
+        return self._length
+
+    def deep_sizeof(self):
+        return _object_sizeof(self) + sys.getsizeof(self._data)
+
+    def __eq__(self, other):
+        return self._value == other
+
+    def __repr__(self):
+        return "{} with value {}".format(self.__class__, self._value)
+
+    def __str__(self):
         return "{value:0{size}X}".format(
             value=self._value,
-            size=self._data_container.serialized_size()*2,
+            size=self.serialized_size()*2,
         )
 
     def __len__(self):
-        return len(self._data_container)
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __getitem__(self, index):
+        return self._data[index]
+
+    def __setitem__(self, index, value):
+        self._data[index] = value
 
 
 class nx_uint8(BaseInt):
@@ -589,3 +2431,176 @@ class int64(BaseInt):
     _signed = True
     _length = 64
     _format = "<q"
+
+
+class BaseFloat(BaseInt):
+    """
+    Base class for the IEEE 754 floating point types.
+    """
+
+    def __init__(self, initial=0.0):
+        super(BaseFloat, self).__init__(initial)
+
+    @BaseInt.value.setter
+    def value(self, value):
+        self._value = float(value)
+
+    def __int__(self):
+        return int(self._value)
+
+    def __float__(self):
+        return float(self._value)
+
+
+class nx_float32(BaseFloat):
+    _signed = True
+    _length = 32
+    _format = ">f"
+
+
+class float32(BaseFloat):
+    _signed = True
+    _length = 32
+    _format = "<f"
+
+
+class nx_float64(BaseFloat):
+    _signed = True
+    _length = 64
+    _format = ">d"
+
+
+class float64(BaseFloat):
+    _signed = True
+    _length = 64
+    _format = "<d"
+
+
+# The nesC names of the big endian types
+nx_float = nx_float32
+nx_double = nx_float64
+
+
+_VARINT_MAX_BYTES = 10
+_VARINT = re.compile(b"[\x80-\xff]*[\x00-\x7f]")
+_VARINT_CONTINUATION = re.compile(b"[\x80-\xff]")
+
+
+def _encode_varuint(value):
+    ret = bytearray()
+    while value > 0x7F:
+        ret.append((value & 0x7F) | 0x80)
+        value >>= 7
+    ret.append(value)
+    return ret
+
+
+def _decode_varuints(data, pos, count):
+    """
+    Decodes count LEB128 values, -1 for all until the end of data, starting at pos.
+    The value boundaries are found with a regular expression and single byte
+    values, the common case for small counters, are taken from the data as is.
+    """
+    end = len(data) if count == -1 else min(len(data), pos + count * _VARINT_MAX_BYTES)
+    chunk = bytearray(data[pos:end])
+    if count == -1 and _VARINT_CONTINUATION.search(chunk) is None:
+        return list(chunk), end
+    if 0 <= count <= len(chunk) and _VARINT_CONTINUATION.search(chunk, 0, count) is None:
+        return list(chunk[:count]), pos + count
+
+    values = []
+    last = 0
+    for match in _VARINT.finditer(chunk):
+        if len(values) == count:
+            break
+        start, last = match.span()
+        size = last - start
+        if size == 1:
+            values.append(chunk[start])
+        elif size == 2:
+            values.append((chunk[start] & 0x7F) | (chunk[start + 1] << 7))
+        elif size > _VARINT_MAX_BYTES:
+            raise DeserializeError("Varint longer than {} bytes.".format(_VARINT_MAX_BYTES), reason="overflow")
+        else:
+            value = 0
+            for byte in reversed(chunk[start:last]):
+                value = (value << 7) | (byte & 0x7F)
+            if value >> 64:
+                raise DeserializeError("Varint does not fit into 64 bits.", reason="overflow")
+            values.append(value)
+    if (count == -1 and last != len(chunk)) or len(values) < count:
+        if len(chunk) - last >= _VARINT_MAX_BYTES:
+            raise DeserializeError("Varint longer than {} bytes.".format(_VARINT_MAX_BYTES), reason="overflow")
+        raise DeserializeError("Invalid length of data!", reason="truncated")
+    return values, pos + last
+
+
+class BaseVarInt(BaseInt):
+    """
+    Base class for the variable length integers, LEB128 encoded with 7 bits per
+    byte and the high bit set on all but the last byte. Signed values are zigzag
+    encoded first, so small negative values stay short. The values are limited
+    to 64 bits. The size depends on the value, so a varint field makes the
+    offsets of all following fields variable.
+    """
+
+    _length = 64
+    _format = ""
+
+    @classmethod
+    def _zigzag(cls, value):
+        return value
+
+    @classmethod
+    def _unzigzag(cls, value):
+        return value
+
+    def serialize(self):
+        return self._pack_many([self._value])
+
+    def deserialize(self, value, pos, final=True):
+        values, pos = self._unpack_many(value, pos, 1)
+        self._value = values[0]
+        return pos
+
+    @classmethod
+    def _pack_many(cls, values):
+        ret = bytearray()
+        for value in values:
+            value = cls._zigzag(value)
+            if not 0 <= value < 1 << cls._length:
+                raise SerializeError("Value {} does not fit into {}.".format(value, cls.__name__))
+            ret += _encode_varuint(value)
+        return ret
+
+    @classmethod
+    def _unpack_many(cls, data, pos, count):
+        values, pos = _decode_varuints(data, pos, count)
+        return [cls._unzigzag(value) for value in values] if cls._signed else values, pos
+
+    def serialized_size(self):
+        return max(1, (self._zigzag(self._value).bit_length() + 6) // 7)
+
+    @classmethod
+    def minimal_size(cls):
+        return 1
+
+    @classmethod
+    def static_size(cls):
+        return None
+
+
+class varuint(BaseVarInt):
+    _signed = False
+
+
+class varint(BaseVarInt):
+    _signed = True
+
+    @classmethod
+    def _zigzag(cls, value):
+        return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+    @classmethod
+    def _unzigzag(cls, value):
+        return (value >> 1) ^ -(value & 1)
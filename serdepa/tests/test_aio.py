@@ -0,0 +1,166 @@
+"""test_aio.py: Tests for the asyncio datagram endpoint. """
+
+import asyncio
+import socket
+import unittest
+
+from serdepa import SerdepaPacket, nx_uint16, nx_uint32
+from serdepa.aio import PacketDatagramProtocol, open_endpoint
+from serdepa.registry import PacketRegistry
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class Beacon(SerdepaPacket):
+    _fields_ = [
+        ("type", nx_uint16, 7),
+        ("source", nx_uint16),
+        ("seq", nx_uint32),
+    ]
+    _discriminator_ = "type"
+
+
+class _Transport(object):
+
+    def close(self):
+        pass
+
+
+def _run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+class PacketDatagramProtocolTester(unittest.TestCase):
+
+    def test_batch_size_and_delay(self):
+        async def main():
+            batches = []
+            protocol = PacketDatagramProtocol(Beacon, batches.append, batch_size=4, batch_delay=0.01)
+            protocol.connection_made(_Transport())
+            for i in range(10):
+                protocol.datagram_received(Beacon(seq=i).serialize(), ("127.0.0.1", 1))
+            self.assertEqual([len(batch) for batch in batches], [4, 4])
+            await asyncio.sleep(0.05)
+            self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+            protocol.datagram_received(Beacon(seq=10).serialize(), ("127.0.0.1", 2))
+            protocol.connection_lost(None)
+            await protocol.wait_closed()
+            return batches
+
+        batches = _run(main())
+        self.assertEqual([packet.seq for batch in batches for packet, addr in batch], list(range(11)))
+        self.assertEqual(batches[-1][0][1], ("127.0.0.1", 2))
+
+    def test_errors_are_counted(self):
+        async def main():
+            registry = PacketRegistry()
+            registry.register(Beacon)
+            batches = []
+            protocol = PacketDatagramProtocol(registry, batches.append, batch_size=2)
+            protocol.connection_made(_Transport())
+            protocol.datagram_received(Beacon(seq=1).serialize(), None)
+            protocol.datagram_received(b"\x00\x07\x00", None)
+            protocol.datagram_received(b"\x00\x09\x00\x01\x00\x00\x00\x00", None)
+            protocol.datagram_received(Beacon(seq=2).serialize() + b"\x00", None)
+            protocol.datagram_received(Beacon(seq=3).serialize(), None)
+            protocol.error_received(ConnectionRefusedError())
+            protocol.connection_lost(None)
+            return protocol, batches
+
+        protocol, batches = _run(main())
+        self.assertEqual(protocol.received, 5)
+        self.assertEqual(protocol.errors, {"truncated": 1, "unknown_discriminator": 1, "trailing": 1, "os_error": 1})
+        self.assertEqual([[packet.seq for packet, addr in batch] for batch in batches], [[1, 3]])
+
+    def test_handler_error(self):
+        async def main():
+            failures = []
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: failures.append(context))
+
+            async def handler(batch):
+                raise RuntimeError("handler failed")
+
+            protocol = PacketDatagramProtocol(Beacon, handler, batch_size=1)
+            protocol.connection_made(_Transport())
+            protocol.datagram_received(Beacon().serialize(), None)
+            protocol.datagram_received(Beacon().serialize(), None)
+            protocol.connection_lost(None)
+            await protocol.wait_closed()
+            return protocol, failures
+
+        protocol, failures = _run(main())
+        self.assertEqual(protocol.errors, {"handler": 2})
+        self.assertIsInstance(failures[0]["exception"], RuntimeError)
+
+    def test_decoder_error(self):
+        async def main():
+            failures = []
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: failures.append(context))
+
+            def decoder(data):
+                if not data:
+                    raise ValueError("empty")
+                return data
+
+            batches = []
+            protocol = PacketDatagramProtocol(decoder, batches.append, batch_size=1)
+            protocol.connection_made(_Transport())
+            protocol.datagram_received(b"", None)
+            protocol.datagram_received(b"\x01", None)
+            protocol.connection_lost(None)
+            return protocol, batches, failures
+
+        protocol, batches, failures = _run(main())
+        self.assertEqual(protocol.errors, {"decoder": 1})
+        self.assertEqual(batches, [[(b"\x01", None)]])
+        self.assertIsInstance(failures[0]["exception"], ValueError)
+
+    def test_iterate_before_connection(self):
+        async def main():
+            protocol = PacketDatagramProtocol(Beacon)
+            with self.assertRaises(RuntimeError):
+                await protocol.__anext__()
+
+        _run(main())
+
+    def test_queue_overflow(self):
+        async def main():
+            protocol = PacketDatagramProtocol(Beacon, batch_size=1, max_batches=2)
+            protocol.connection_made(_Transport())
+            for i in range(3):
+                protocol.datagram_received(Beacon(seq=i).serialize(), None)
+            protocol.connection_lost(None)
+            return protocol, [batch async for batch in protocol]
+
+        protocol, batches = _run(main())
+        self.assertEqual(protocol.errors, {"overflow": 1})
+        self.assertEqual([batch[0][0].seq for batch in batches], [0, 1])
+
+    def test_loopback(self):
+        async def main():
+            transport, protocol = await open_endpoint(Beacon, batch_size=16, local_addr=("127.0.0.1", 0))
+            address = transport.get_extra_info("sockname")
+            sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sender.sendto(b"\x00", address)
+                for i in range(40):
+                    sender.sendto(Beacon(source=3, seq=i).serialize(), address)
+                seqs = []
+                async for batch in protocol:
+                    seqs.extend(packet.seq for packet, addr in batch)
+                    if len(seqs) == 40:
+                        transport.close()
+            finally:
+                sender.close()
+            await protocol.wait_closed()
+            return protocol, seqs
+
+        protocol, seqs = _run(main())
+        self.assertEqual(seqs, list(range(40)))
+        self.assertEqual(protocol.errors, {"truncated": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+"""test_archive.py: Tests for delta-encoded packet archives. """
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from serdepa import SerdepaPacket, Length, List, ByteString, nx_uint8, nx_uint16, nx_uint32, uint16, nx_int32, nx_float
+from serdepa.archive import ArchiveWriter, ArchiveReader, class_layout
+from serdepa.exceptions import DeserializeError
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class Header(SerdepaPacket):
+    _fields_ = [
+        ("node", nx_uint16),
+        ("seq", nx_uint32),
+    ]
+
+
+class Sample(SerdepaPacket):
+    _fields_ = [
+        ("header", Header),
+        ("timestamp", nx_uint32),
+        ("value", nx_int32),
+        ("ratio", nx_float),
+        ("channel", uint16),
+    ]
+
+
+class Message(SerdepaPacket):
+    _fields_ = [
+        ("seq", nx_uint16),
+        ("length", Length(nx_uint8, "text")),
+        ("text", ByteString()),
+    ]
+
+
+class Empty(SerdepaPacket):
+    _fields_ = [
+        ("count", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+    ]
+
+
+class Node(object):
+
+    class Reading(SerdepaPacket):
+        _fields_ = [
+            ("value", nx_uint16),
+        ]
+
+
+class Gateway(object):
+
+    class Reading(SerdepaPacket):
+        _fields_ = [
+            ("value", nx_uint32),
+        ]
+
+
+def _samples(count, start=0):
+    return [
+        Sample(header=Header(node=3, seq=i), timestamp=1000000 + 10 * i, value=-i // 3, ratio=0.5, channel=i % 4)
+        for i in range(start, start + count)
+    ]
+
+
+class ArchiveTester(unittest.TestCase):
+
+    def write(self, packets, **kwargs):
+        f = io.BytesIO()
+        with ArchiveWriter(f, **kwargs) as writer:
+            for packet in packets:
+                writer.write(packet)
+        f.seek(0)
+        return f
+
+    def test_layout(self):
+        layout = class_layout(Sample)
+        self.assertEqual(layout["order"], ">")
+        self.assertEqual(layout["columns"], ["H", "I", "I", "I", "6s"])
+        self.assertEqual(layout["size"], 20)
+        self.assertEqual(class_layout(Message)["columns"], ["H", "B"])
+        self.assertEqual(class_layout(Message)["size"], None)
+
+    def test_roundtrip_in_order(self):
+        packets = []
+        for i in range(300):
+            packets.append(_samples(1, i)[0])
+            if i % 3 == 0:
+                packets.append(Message(seq=i, text=b"event %d" % i))
+            if i % 50 == 0:
+                packets.append(Empty(data=[i % 256] * (i % 5)))
+        for compression in ("zlib", "lzma", "none"):
+            reader = ArchiveReader(self.write(packets, compression=compression, block_records=64),
+                                   [Sample, Message, Empty])
+            self.assertEqual(len(reader), len(packets))
+            self.assertEqual(list(reader), packets)
+
+    def test_smaller_than_compressed_raw(self):
+        packets = _samples(5000)
+        raw = b"".join(packet.serialize() for packet in packets)
+        size = len(self.write(packets).getvalue())
+        self.assertLess(size * 3, len(zlib.compress(raw, 6)))
+
+    def test_range_reads_only_touched_blocks(self):
+        packets = _samples(1000)
+        reader = ArchiveReader(self.write(packets, block_records=100), [Sample])
+        self.assertEqual(len(reader.blocks), 10)
+        self.assertEqual(list(reader.packets(start=250, stop=260)), packets[250:260])
+        self.assertEqual(reader.blocks_read, 1)
+        self.assertEqual(reader.get(999), packets[999])
+        with self.assertRaises(IndexError):
+            reader.get(1000)
+
+    def test_records_by_class(self):
+        packets = [Message(seq=i, text=b"x") for i in range(10)] + _samples(10)
+        reader = ArchiveReader(self.write(packets))
+        records = list(reader.records(classes=[Message]))
+        self.assertEqual([seq for seq, name, data in records], list(range(10)))
+        self.assertEqual(records[0][1], class_layout(Message)["name"])
+        self.assertEqual(records[4][2], packets[4].serialize())
+        with self.assertRaises(DeserializeError) as cm:
+            list(reader.packets())
+        self.assertEqual(cm.exception.reason, "unknown_class")
+
+    def test_same_class_name(self):
+        packets = [Node.Reading(value=1), Gateway.Reading(value=2), Node.Reading(value=3)]
+        reader = ArchiveReader(self.write(packets), [Node.Reading, Gateway.Reading])
+        self.assertEqual(list(reader), packets)
+        self.assertEqual([type(packet) for packet in reader], [Node.Reading, Gateway.Reading, Node.Reading])
+        self.assertEqual(class_layout(Gateway.Reading)["name"], "{}.Gateway.Reading".format(__name__))
+
+        def local():
+            class Reading(SerdepaPacket):
+                _fields_ = [("value", nx_uint8)]
+            return Reading
+        with self.assertRaises(ValueError):
+            ArchiveReader(self.write(packets), [local(), local()])
+
+    def test_file_path(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "capture.sda")
+            with ArchiveWriter(path, compression="lzma") as writer:
+                for packet in _samples(10):
+                    writer.write(packet)
+            with ArchiveReader(path, [Sample]) as reader:
+                self.assertEqual(list(reader), _samples(10))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_invalid(self):
+        data = self.write(_samples(10)).getvalue()
+        with self.assertRaises(DeserializeError) as cm:
+            ArchiveReader(io.BytesIO(b"XXXX" + data[4:]))
+        self.assertEqual(cm.exception.reason, "framing")
+        with self.assertRaises(DeserializeError) as cm:
+            ArchiveReader(io.BytesIO(data[:-1]))
+        self.assertEqual(cm.exception.reason, "truncated")
+        corrupt = bytearray(data)
+        corrupt[8] ^= 0xFF
+        with self.assertRaises(DeserializeError) as cm:
+            list(ArchiveReader(io.BytesIO(bytes(corrupt)), [Sample]))
+        self.assertEqual(cm.exception.reason, "framing")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""test_checksums.py: Tests for checksum algorithms and the Checksum field. """
+
+import unittest
+from codecs import decode
+
+from serdepa import validate_all, SerdepaPacket, Checksum, Length, List, nx_uint8, nx_uint16, uint16
+from serdepa.checksums import ALGORITHMS, Crc, get_algorithm
+from serdepa.exceptions import DeserializeError, PacketDefinitionError, SerializeError
+
+
+class Frame(SerdepaPacket):
+    _fields_ = [
+        ("protocol", nx_uint8, 0x45),
+        ("length", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+        ("crc", Checksum("crc16-ccitt")),
+    ]
+
+
+class PartialFrame(SerdepaPacket):
+    _fields_ = [
+        ("sync", nx_uint16, 0xAA55),
+        ("source", nx_uint16),
+        ("destination", nx_uint16),
+        ("crc", Checksum("crc16-x25", covering=("source", "destination"), value_type=uint16)),
+        ("tail", nx_uint8),
+    ]
+
+
+class AlgorithmTester(unittest.TestCase):
+    check = {
+        "crc8": 0xF4,
+        "crc16-xmodem": 0x31C3,
+        "crc16-ccitt": 0x31C3,
+        "crc16-ccitt-false": 0x29B1,
+        "crc16-x25": 0x906E,
+        "crc16-arc": 0xBB3D,
+        "crc32": 0xCBF43926,
+    }
+
+    def test_check_values(self):
+        self.assertEqual(set(ALGORITHMS), set(self.check))
+        for name, value in self.check.items():
+            self.assertEqual(get_algorithm(name).compute(b"123456789"), value, name)
+
+    def test_incremental(self):
+        for name, value in self.check.items():
+            self.assertEqual(get_algorithm(name).compute(b"1234", bytearray(b"5"), memoryview(b"6789")), value, name)
+
+    def test_custom_crc(self):
+        crc32c = Crc("crc32c", 32, 0x1EDC6F41, init=0xFFFFFFFF, reflect=True, xorout=0xFFFFFFFF)
+        self.assertEqual(crc32c.compute(b"123456789"), 0xE3069283)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_algorithm("md5")
+
+
+class ChecksumFieldTester(unittest.TestCase):
+    frame = "45" "03" "010203" "C8D2"
+
+    def test_serialize(self):
+        packet = Frame(data=[1, 2, 3])
+        self.assertEqual(packet.serialize(), decode(self.frame, "hex"))
+        self.assertEqual(
+            get_algorithm("crc16-ccitt").compute(decode(self.frame[:-4], "hex")),
+            0xC8D2
+        )
+
+    def test_deserialize(self):
+        packet = Frame()
+        packet.deserialize(decode(self.frame, "hex"))
+        self.assertEqual(packet.crc, 0xC8D2)
+        self.assertEqual(list(packet.data), [1, 2, 3])
+
+    def test_mismatch(self):
+        packet = Frame()
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode("45030102035000", "hex"))
+        self.assertEqual(cm.exception.reason, "checksum")
+
+    def test_covering(self):
+        packet = PartialFrame(source=1, destination=2, tail=9)
+        data = packet.serialize()
+        crc = get_algorithm("crc16-x25").compute(decode("00010002", "hex"))
+        self.assertEqual(data, decode("AA5500010002", "hex") + uint16(initial=crc).serialize() + b"\x09")
+
+        decoded = PartialFrame()
+        decoded.deserialize(b"\x00\x00" + data[2:])
+        self.assertEqual(decoded.crc, crc)
+
+    def test_serialize_into(self):
+        packet = Frame(data=[1, 2, 3])
+        buffer = bytearray(10)
+        self.assertEqual(packet.serialize_into(buffer, 2), 9)
+        self.assertEqual(buffer[2:9], decode(self.frame, "hex"))
+        with self.assertRaises(SerializeError):
+            packet.serialize_into(buffer, 4)
+
+    def test_shared_prototype(self):
+        crc = Checksum("crc8")
+
+        class Long(SerdepaPacket):
+            _fields_ = [
+                ("a", nx_uint8),
+                ("b", nx_uint8),
+                ("crc", crc),
+            ]
+
+        class Short(SerdepaPacket):
+            _fields_ = [
+                ("a", nx_uint8),
+                ("crc", crc),
+            ]
+
+        validate_all([Short, Long])
+        for packet_class in (Short, Long):
+            packet = packet_class(a=1)
+            data = packet.serialize()
+            self.assertEqual(data[-1], get_algorithm("crc8").compute(data[:-1]))
+            decoded = packet_class()
+            decoded.deserialize(data)
+
+    def test_invalid_covering(self):
+        with self.assertRaises(PacketDefinitionError):
+            class Invalid(SerdepaPacket):
+                _fields_ = [
+                    ("crc", Checksum("crc8", covering=("data", "data"))),
+                    ("data", nx_uint8),
+                ]
+            Invalid()
+
+
+if __name__ == '__main__':
+    unittest.main()
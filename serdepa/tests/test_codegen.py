@@ -0,0 +1,156 @@
+"""test_codegen.py: Tests for generated codecs and their cache. """
+
+import os
+import shutil
+import tempfile
+import unittest
+from codecs import decode
+
+from serdepa import SerdepaPacket, Length, List, nx_uint8, nx_uint16, nx_int32, uint16, nx_float
+from serdepa import codegen
+from serdepa.exceptions import DeserializeError, SerializeError
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class Fixed(SerdepaPacket):
+    _fields_ = [
+        ("node", nx_uint16),
+        ("value", nx_int32, -2),
+        ("ratio", nx_float),
+    ]
+
+
+class Variable(SerdepaPacket):
+    _fields_ = [
+        ("count", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+    ]
+
+
+class MixedOrder(SerdepaPacket):
+    _fields_ = [
+        ("big", nx_uint16),
+        ("little", uint16),
+    ]
+
+
+class Wrapper(SerdepaPacket):
+    _fields_ = [
+        ("inner", Fixed),
+        ("tail", nx_uint8),
+    ]
+
+
+class CodegenTester(unittest.TestCase):
+    data = "0102" "FFFFFFFE" "3F000000"
+
+    def test_generated_methods(self):
+        self.assertTrue(getattr(Fixed.serialize, "_generated", False))
+        self.assertFalse(getattr(Variable.serialize, "_generated", False))
+        self.assertFalse(getattr(MixedOrder.deserialize, "_generated", False))
+
+    def test_roundtrip(self):
+        packet = Fixed(node=0x0102, ratio=0.5)
+        self.assertEqual(packet.serialize(), decode(self.data, "hex"))
+        result = Fixed()
+        self.assertEqual(result.deserialize(decode("AA" + self.data, "hex"), 1), 11)
+        self.assertEqual((result.node, result.value, result.ratio), (0x0102, -2, 0.5))
+
+        wrapper = Wrapper()
+        wrapper.deserialize(decode(self.data + "07", "hex"))
+        self.assertEqual(wrapper.inner.value, -2)
+        self.assertEqual(wrapper.serialize(), decode(self.data + "07", "hex"))
+
+    def test_serialize_into(self):
+        self.assertTrue(getattr(Fixed.serialize_into, "_generated", False))
+        buffer = bytearray(12)
+        self.assertEqual(Fixed(node=0x0102, ratio=0.5).serialize_into(memoryview(buffer), 2), 12)
+        self.assertEqual(bytes(buffer), decode("0000" + self.data, "hex"))
+        with self.assertRaises(SerializeError):
+            Fixed().serialize_into(buffer, 3)
+
+    def test_errors(self):
+        packet = Fixed()
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode(self.data[:-2], "hex"))
+        self.assertEqual(cm.exception.reason, "truncated")
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode(self.data + "00", "hex"))
+        self.assertEqual(cm.exception.reason, "trailing")
+
+    def test_subclass_does_not_inherit(self):
+        class Extended(Fixed):
+            _fields_ = [
+                ("count", Length(nx_uint8, "data")),
+                ("data", List(nx_uint8)),
+            ]
+        self.assertIs(Extended.serialize, SerdepaPacket.serialize)
+        self.assertEqual(Extended(data=[1]).serialize(), decode("0101", "hex"))
+
+
+class CacheTester(unittest.TestCase):
+    names = ["a", "b"]
+    fmt = ">BH"
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environ = os.environ.get("SERDEPA_CACHE_DIR")
+        os.environ["SERDEPA_CACHE_DIR"] = os.path.join(self.directory, "cache")
+        codegen._codecs.clear()
+
+    def tearDown(self):
+        if self.environ is None:
+            os.environ.pop("SERDEPA_CACHE_DIR", None)
+        else:
+            os.environ["SERDEPA_CACHE_DIR"] = self.environ
+        codegen._codecs.clear()
+        shutil.rmtree(self.directory)
+
+    def path(self):
+        return os.path.join(self.directory, "cache", codegen.layout_key(self.names, self.fmt) + ".codec")
+
+    def test_stored_and_loaded(self):
+        codegen.get_codec(self.names, self.fmt)
+        self.assertTrue(os.path.exists(self.path()))
+
+        codegen._codecs.clear()
+        compile_ = codegen._compile
+        codegen._compile = None  # loading from the cache must not compile
+        try:
+            codec = codegen.get_codec(self.names, self.fmt)
+        finally:
+            codegen._compile = compile_
+        self.assertTrue(codec["serialize"]._generated)
+
+    def test_corrupt_entry(self):
+        os.makedirs(os.path.dirname(self.path()))
+        with open(self.path(), "wb") as f:
+            f.write(b"garbage")
+        codec = codegen.get_codec(self.names, self.fmt)
+        self.assertIn("deserialize", codec)
+
+    def test_key(self):
+        key = codegen.layout_key(self.names, self.fmt)
+        self.assertNotEqual(key, codegen.layout_key(["a", "c"], self.fmt))
+        self.assertNotEqual(key, codegen.layout_key(self.names, "<BH"))
+        version = codegen.__version__
+        codegen.__version__ = "0"
+        try:
+            self.assertNotEqual(key, codegen.layout_key(self.names, self.fmt))
+        finally:
+            codegen.__version__ = version
+
+    def test_disabled(self):
+        del os.environ["SERDEPA_CACHE_DIR"]
+        self.assertIsNone(codegen.cache_dir())
+        os.environ["SERDEPA_CACHE_DIR"] = ""
+        self.assertIsNone(codegen.cache_dir())
+        codegen.get_codec(self.names, self.fmt)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "cache")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""test_framing.py: Tests for HDLC-style framing. """
+
+import unittest
+from codecs import decode
+
+from serdepa import SerdepaPacket, List, nx_uint8, nx_uint16
+from serdepa.exceptions import DeserializeError
+from serdepa.framing import escape, unescape, frame, Deframer, deframe
+
+
+class SerialPacket(SerdepaPacket):
+    _fields_ = [
+        ("dispatch", nx_uint8),
+        ("source", nx_uint16),
+        ("data", List(nx_uint8)),
+    ]
+
+
+class EscapeTester(unittest.TestCase):
+
+    def test_escape(self):
+        self.assertEqual(escape(decode("017E027D03", "hex")), decode("017D5E027D5D03", "hex"))
+        self.assertEqual(escape(decode("7D5E", "hex")), decode("7D5D5E", "hex"))
+
+    def test_roundtrip(self):
+        data = bytes(bytearray(range(256))) * 2 + decode("7D7D7E7E7D5E7D5D", "hex")
+        escaped = escape(data)
+        self.assertNotIn(b"\x7e", escaped)
+        self.assertEqual(unescape(escaped), data)
+
+    def test_invalid_escape(self):
+        for data in ("017D01", "017D"):
+            with self.assertRaises(DeserializeError) as cm:
+                unescape(decode(data, "hex"))
+            self.assertEqual(cm.exception.reason, "framing")
+
+    def test_frame_packet(self):
+        packet = SerialPacket(dispatch=0x7E, source=0x7D7E, data=[1, 0x7D])
+        self.assertEqual(frame(packet), decode("7E7D5E7D5D7D5E017D5D7E", "hex"))
+        self.assertEqual(frame(packet), frame(packet.serialize()))
+
+
+class DeframerTester(unittest.TestCase):
+
+    def test_byte_by_byte(self):
+        data = b"garbage" + frame(b"\x01\x7e") + frame(b"") + frame(b"\x7d\x02")
+        deframer = Deframer()
+        frames = []
+        for i in range(len(data)):
+            frames.extend(deframer.feed(data[i:i + 1]))
+        self.assertEqual(frames, [b"\x01\x7e", b"\x7d\x02"])
+        self.assertEqual(deframer.dropped, 7)
+
+    def test_shared_flags(self):
+        data = decode("7E01027E03047E05", "hex")
+        deframer = Deframer()
+        self.assertEqual(deframer.feed(data), [b"\x01\x02", b"\x03\x04"])
+        self.assertEqual(deframer.feed(b"\x7e"), [b"\x05"])
+
+    def test_decode_packets(self):
+        packets = [SerialPacket(dispatch=0, source=i, data=[i, 0x7E]) for i in range(10)]
+        stream = b"".join(frame(p) for p in packets) + frame(b"\x00") + b"\x7e\x00\x7d\x01\x7e"
+        chunks = [stream[i:i + 5] for i in range(0, len(stream), 5)]
+
+        deframer = Deframer(SerialPacket)
+        decoded = []
+        for chunk in chunks:
+            decoded.extend(deframer.feed(chunk))
+        self.assertEqual(decoded, packets)
+        self.assertEqual(deframer.errors, {"truncated": 1, "framing": 1})
+
+    def test_max_length(self):
+        deframer = Deframer(max_length=4)
+        self.assertEqual(deframer.feed(b"\x7e" + b"\x01" * 10), [])
+        self.assertEqual(deframer.feed(b"\x7e\x02\x7e"), [b"\x02"])
+        self.assertEqual(deframer.dropped, 10)
+
+    def test_deframe(self):
+        chunks = [b"\x7e\x01", b"\x02\x7e\x7e", b"\x03\x7e"]
+        self.assertEqual(list(deframe(chunks)), [b"\x01\x02", b"\x03"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+"""test_generator.py: Tests for generating random serialized packets. """
+
+import io
+import struct
+import unittest
+
+from serdepa import (
+    SerdepaPacket, Length, List, Array, ByteString, Union, Checksum, FixedPoint, PackedList,
+    nx_uint8, nx_uint16, nx_uint32, nx_int16, uint16, nx_float, nx_bits, varint, varuint
+)
+from serdepa.generator import PacketGenerator
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class Header(SerdepaPacket):
+    _fields_ = [
+        ("type", nx_uint8, 0x3F),
+        ("node", nx_uint16),
+        ("seq", nx_uint32),
+    ]
+
+
+class Sample(SerdepaPacket):
+    _fields_ = [
+        ("header", Header),
+        ("counter", uint16),
+        ("value", nx_int16),
+        ("ratio", nx_float),
+        ("raw", Array(nx_uint8, 3)),
+        ("name", ByteString(2)),
+    ]
+
+
+class Temperature(SerdepaPacket):
+    _fields_ = [
+        ("celsius", nx_int16),
+    ]
+
+
+class Humidity(SerdepaPacket):
+    _fields_ = [
+        ("percent", nx_uint8),
+        ("raw", nx_uint16),
+    ]
+
+
+class Frame(SerdepaPacket):
+    _fields_ = [
+        ("version", nx_bits(3), 5),
+        ("flags", nx_bits(5)),
+        ("seq", nx_uint16),
+        ("kind", nx_uint8),
+        ("payload", Union("kind", {1: Temperature, 2: Humidity})),
+        ("offset", varint),
+        ("scaled", FixedPoint(nx_int16, 0.5)),
+        ("count", Length(nx_uint8, "samples")),
+        ("samples", List(Temperature)),
+        ("size", Length(nx_uint8, "text")),
+        ("text", ByteString()),
+        ("crc", Checksum("crc16-ccitt")),
+        ("levels", PackedList(nx_uint16)),
+    ]
+
+
+class Flags(SerdepaPacket):
+    _fields_ = [
+        ("node", nx_uint16),
+        ("mode", nx_bits(3)),
+        ("level", nx_bits(2)),
+        ("seq", nx_uint16),
+    ]
+
+
+class Message(SerdepaPacket):
+    _fields_ = [
+        ("size", Length(varuint, "text")),
+        ("text", ByteString()),
+    ]
+
+
+def _decode(packet_class, data):
+    packet = packet_class()
+    packet.deserialize(data)
+    return packet
+
+
+class PacketGeneratorTester(unittest.TestCase):
+
+    def test_fixed(self):
+        generator = PacketGenerator(Sample, seed=1, sequence={"header__seq": 4294967294}, values={"counter": 7})
+        self.assertIsNotNone(generator._fixed)
+        data = generator.generate(100)
+        self.assertEqual(len(data), 100 * 20)
+        packets = [_decode(Sample, record) for record in generator.records(3)]
+        for i in range(100):
+            packet = _decode(Sample, data[i * 20:(i + 1) * 20])
+            self.assertEqual(packet.header.type, 0x3F)
+            self.assertEqual(packet.header.seq, (4294967294 + i) % 2 ** 32)
+            self.assertEqual(packet.counter, 7)
+            self.assertTrue(-1000 <= packet.ratio <= 1000)
+        self.assertEqual([packet.header.seq for packet in packets], [98, 99, 100])
+
+    def test_unused_bits(self):
+        generator = PacketGenerator(Flags, seed=6)
+        self.assertIsNotNone(generator._fixed)
+        data = generator.generate(200)
+        records = [data[i:i + 5] for i in range(0, len(data), 5)]
+        self.assertEqual([_decode(Flags, record).serialize() for record in records], records)
+        self.assertEqual({record[2] & 0x07 for record in records}, {0})
+        self.assertEqual(len({record[2] for record in records}), 32)
+
+    def test_seed(self):
+        self.assertEqual(PacketGenerator(Sample, seed=3).generate(10), PacketGenerator(Sample, seed=3).generate(10))
+        self.assertNotEqual(PacketGenerator(Frame, seed=3).generate(10), PacketGenerator(Frame, seed=4).generate(10))
+        self.assertEqual(PacketGenerator(Frame, seed=3).generate(10), PacketGenerator(Frame, seed=3).generate(10))
+
+    def test_variable(self):
+        generator = PacketGenerator(Frame, seed=2, sequence=["seq"], max_length=4)
+        self.assertIsNone(generator._fixed)
+        kinds = set()
+        for i, record in enumerate(generator.records(200)):
+            packet = _decode(Frame, record)  # lengths, tags and the checksum are valid
+            self.assertEqual(packet.version, 5)
+            self.assertEqual(packet.seq, i)
+            self.assertLessEqual(len(packet.samples), 4)
+            self.assertLessEqual(len(packet.text), 4)
+            kinds.add(packet.kind)
+        self.assertEqual(kinds, {1, 2})
+
+    def test_varint_length(self):
+        records = PacketGenerator(Message, seed=7, max_length=300).records(20)
+        packets = [_decode(Message, record) for record in records]
+        self.assertEqual([packet.serialize() for packet in packets], records)
+        self.assertTrue(any(len(packet.text) > 127 for packet in packets))
+
+    def test_output(self):
+        generator = PacketGenerator(Frame, seed=5)
+        data = generator.generate(20, length_prefix=nx_uint16)
+        pos = 0
+        for _ in range(20):
+            length, = struct.unpack_from(">H", data, pos)
+            _decode(Frame, data[pos + 2:pos + 2 + length])
+            pos += 2 + length
+        self.assertEqual(pos, len(data))
+
+        f = io.BytesIO()
+        self.assertEqual(PacketGenerator(Sample, seed=5, sequence=["header__seq"]).write(f, 1000, chunk=300), 20000)
+        data = f.getvalue()
+        seqs = [_decode(Sample, data[i:i + 20]).header.seq for i in range(0, len(data), 20)]
+        self.assertEqual(seqs, list(range(1000)))
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            PacketGenerator(Sample, sequence=["seq"])
+        with self.assertRaises(ValueError):
+            PacketGenerator(Frame, values={"header__node": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
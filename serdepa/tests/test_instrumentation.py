@@ -0,0 +1,123 @@
+"""test_instrumentation.py: Tests for the per-class encode/decode counters. """
+
+import unittest
+from codecs import decode
+
+from serdepa import SerdepaPacket, Length, List, nx_uint8, nx_uint16, nx_uint32
+from serdepa.exceptions import DeserializeError
+from serdepa import instrumentation
+
+
+class CountedPacket(SerdepaPacket):
+    _fields_ = [
+        ("header", nx_uint8),
+        ("length", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+    ]
+
+
+class CountedSubPacket(CountedPacket):
+    _fields_ = [
+        ("value", nx_uint32),
+    ]
+
+
+class InstrumentationTester(unittest.TestCase):
+    name = "{}.CountedPacket".format(__name__)
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_counts(self):
+        instrumentation.enable(CountedPacket)
+        packet = CountedPacket(header=1, data=[1, 2, 3])
+        self.assertEqual(packet.serialize(), decode("0103010203", "hex"))
+        packet.serialize_into(bytearray(5))
+        packet.serialize_segments()
+        packet.deserialize(decode("0102AABB", "hex"))
+        packet.deserialize(decode("0100", "hex"))
+
+        stats = instrumentation.snapshot()[self.name]
+        self.assertEqual(stats["encode"]["count"], 3)
+        self.assertEqual(stats["encode"]["bytes"], 15)
+        self.assertEqual(stats["decode"]["count"], 2)
+        self.assertEqual(stats["decode"]["bytes"], 6)
+        self.assertEqual(stats["decode"]["histogram"]["+Inf"], 2)
+        self.assertGreater(stats["decode"]["seconds"], 0)
+
+    def test_errors(self):
+        instrumentation.enable(CountedPacket)
+        packet = CountedPacket()
+        with self.assertRaises(DeserializeError):
+            packet.deserialize(decode("01", "hex"))
+        with self.assertRaises(DeserializeError):
+            packet.deserialize(decode("0100FF", "hex"))
+
+        stats = instrumentation.snapshot()[self.name]
+        self.assertEqual(stats["errors"], {"truncated": 1, "trailing": 1})
+        self.assertEqual(stats["decode"]["count"], 0)
+
+    def test_disable_restores_methods(self):
+        serialize = CountedPacket.serialize
+        instrumentation.enable(CountedPacket)
+        self.assertTrue(instrumentation.is_enabled(CountedPacket))
+        self.assertIsNot(CountedPacket.serialize, serialize)
+        instrumentation.disable(CountedPacket)
+        self.assertIs(CountedPacket.serialize, serialize)
+        self.assertNotIn("serialize", CountedPacket.__dict__)
+
+        CountedPacket().serialize()
+        self.assertEqual(instrumentation.snapshot()[self.name]["encode"]["count"], 0)
+
+    def test_subclass_counted_separately(self):
+        instrumentation.enable(CountedPacket, CountedSubPacket)
+        CountedSubPacket(value=1).serialize()
+
+        stats = instrumentation.snapshot()
+        self.assertEqual(stats[self.name]["encode"]["count"], 0)
+        self.assertEqual(stats[self.name.replace("CountedPacket", "CountedSubPacket")]["encode"]["count"], 1)
+
+    def test_subclass_not_counted_for_parent(self):
+        instrumentation.enable(CountedPacket)
+        packet = CountedSubPacket(value=1)
+        data = packet.serialize()
+        packet.serialize_into(bytearray(len(data)))
+        packet.serialize_segments()
+        CountedSubPacket().deserialize(data)
+
+        stats = instrumentation.snapshot()
+        self.assertEqual(stats[self.name]["encode"]["count"], 0)
+        self.assertEqual(stats[self.name]["decode"]["count"], 0)
+        self.assertNotIn(self.name.replace("CountedPacket", "CountedSubPacket"), stats)
+
+    def test_subclass_defined_while_enabled(self):
+        class Fixed(SerdepaPacket):
+            _fields_ = [
+                ("a", nx_uint8),
+                ("b", nx_uint16),
+            ]
+        self.assertIsNotNone(Fixed._struct_layout)
+        instrumentation.enable(Fixed)
+
+        class Variable(Fixed):
+            _fields_ = [
+                ("count", Length(nx_uint8, "data")),
+                ("data", List(nx_uint8)),
+            ]
+
+        class Other(Fixed):
+            _fields_ = [
+                ("c", nx_uint32),
+            ]
+        for _ in range(2):
+            self.assertEqual(Variable(data=[1, 2]).serialize(), decode("020102", "hex"))
+            self.assertEqual(Other(c=1).serialize(), decode("00000001", "hex"))
+            packet = Variable()
+            packet.deserialize(decode("0103", "hex"))
+            self.assertEqual(list(packet.data), [3])
+            instrumentation.disable()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""test_parallel.py: Tests for decoding record files in parallel. """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from serdepa import SerdepaPacket, Length, List, nx_uint8, nx_uint16, nx_uint32
+from serdepa.exceptions import DeserializeError
+from serdepa.parallel import decode_file_parallel
+
+
+class FixedRecord(SerdepaPacket):
+    _fields_ = [
+        ("seq", nx_uint32),
+        ("value", nx_uint16),
+    ]
+
+
+class VariableRecord(SerdepaPacket):
+    _fields_ = [
+        ("seq", nx_uint32),
+        ("length", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+    ]
+
+
+def _seq(packet):
+    return packet.seq
+
+
+class ParallelDecodeTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "records.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def test_fixed_size_records(self):
+        packets = [FixedRecord(seq=i, value=i * 3) for i in range(1000)]
+        self.write(b"".join(p.serialize() for p in packets))
+
+        decoded = list(decode_file_parallel(self.path, FixedRecord, workers=2, chunk_size=600))
+        self.assertEqual(decoded, packets)
+
+    def test_length_prefixed_records(self):
+        packets = [VariableRecord(seq=i, data=list(range(i % 7))) for i in range(500)]
+        data = b""
+        for packet in packets:
+            serialized = packet.serialize()
+            data += nx_uint16(initial=len(serialized)).serialize() + serialized
+        self.write(data)
+
+        decoded = list(decode_file_parallel(self.path, VariableRecord, workers=2, chunk_size=256,
+                                            length_prefix=nx_uint16))
+        self.assertEqual(decoded, packets)
+
+    def test_unordered(self):
+        packets = [FixedRecord(seq=i, value=1) for i in range(1000)]
+        self.write(b"".join(p.serialize() for p in packets))
+
+        decoded = decode_file_parallel(self.path, FixedRecord, workers=2, chunk_size=60, ordered=False)
+        self.assertEqual(sorted(p.seq for p in decoded), list(range(1000)))
+
+    def test_transform(self):
+        self.write(b"".join(FixedRecord(seq=i).serialize() for i in range(100)))
+
+        decoded = decode_file_parallel(self.path, FixedRecord, workers=2, chunk_size=60, transform=_seq)
+        self.assertEqual(list(decoded), list(range(100)))
+
+    def test_empty_file(self):
+        self.write(b"")
+        self.assertEqual(list(decode_file_parallel(self.path, FixedRecord, workers=1)), [])
+
+    def test_truncated_file(self):
+        self.write(FixedRecord(seq=1).serialize()[:-1])
+        with self.assertRaises(DeserializeError):
+            list(decode_file_parallel(self.path, FixedRecord, workers=1))
+
+    def test_variable_size_needs_prefix(self):
+        self.write(b"\x00")
+        with self.assertRaises(ValueError):
+            list(decode_file_parallel(self.path, VariableRecord, workers=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""test_pipeline.py: Tests for the keyed fan-out of packets to workers. """
+
+import multiprocessing
+import os
+import queue
+import threading
+import unittest
+
+from serdepa import SerdepaPacket, nx_uint16, nx_uint32
+from serdepa.pipeline import KeyedFanout
+from serdepa.registry import PacketRegistry
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class Report(SerdepaPacket):
+    _fields_ = [
+        ("type", nx_uint16, 5),
+        ("source", nx_uint16),
+        ("seq", nx_uint32),
+    ]
+    _discriminator_ = "type"
+
+
+class _Collect(object):
+
+    def __init__(self, results):
+        self.results = results
+
+    def __call__(self, packet):
+        self.results.put((os.getpid(), threading.get_ident(), packet.source, packet.seq))
+
+
+def _data(count, sources=7):
+    return [Report(source=i % sources, seq=i).serialize() for i in range(count)]
+
+
+def _by_source(results):
+    seqs = {}
+    workers = {}
+    for pid, thread, source, seq in results:
+        seqs.setdefault(source, []).append(seq)
+        workers.setdefault(source, set()).add((pid, thread))
+    return seqs, workers
+
+
+class KeyedFanoutTester(unittest.TestCase):
+
+    def check(self, results, count, sources=7):
+        seqs, workers = _by_source(results)
+        self.assertEqual(sorted(seqs), list(range(sources)))
+        for source in seqs:
+            self.assertEqual(seqs[source], list(range(source, count, sources)))
+            self.assertEqual(len(workers[source]), 1)
+
+    def test_threads(self):
+        results = queue.Queue()
+        with KeyedFanout(Report, "source", _Collect(results), workers=3, batch_size=10) as fanout:
+            data = _data(1000)
+            for item in data[:500]:
+                fanout.submit(memoryview(item))
+            fanout.submit_many(data[500:])
+        self.assertEqual(fanout.submitted, 1000)
+        self.check([results.get() for _ in range(1000)], 1000)
+
+    def test_processes(self):
+        results = multiprocessing.Queue()
+        with KeyedFanout(Report, "source", _Collect(results), workers=2, processes=True, batch_size=50) as fanout:
+            fanout.submit_many(memoryview(item) for item in _data(400))
+        results = [results.get(timeout=10) for _ in range(400)]
+        self.check(results, 400)
+        self.assertEqual(len(set(pid for pid, thread, source, seq in results)), 2)
+
+    def test_registry_and_errors(self):
+        registry = PacketRegistry()
+        registry.register(Report)
+        results = queue.Queue()
+        fanout = KeyedFanout(registry, Report.field_reader("source"), _Collect(results), workers=2)
+        fanout.submit_many(_data(10))
+        fanout.submit(b"\x00\x05\x00\x01")
+        fanout.submit(b"\x00\x09\x00\x01\x00\x00\x00\x00")
+        fanout.close()
+        self.assertEqual(results.qsize(), 10)
+        self.assertEqual(fanout.errors, {"truncated": 1, "unknown_discriminator": 1})
+
+    def test_short_key(self):
+        results = queue.Queue()
+        fanout = KeyedFanout(Report, "source", _Collect(results), workers=2)
+        fanout.submit(b"\x00\x05\x00")
+        fanout.submit_many([b"", b"\x00"] + _data(5))
+        fanout.close()
+        self.assertEqual(results.qsize(), 5)
+        self.assertEqual(fanout.submitted, 8)
+        self.assertEqual(fanout.errors, {"truncated": 3})
+
+    def test_handler_error(self):
+        def handler(packet):
+            if packet.seq == 3:
+                raise RuntimeError("handler failed")
+
+        fanout = KeyedFanout(Report, "source", handler, workers=2)
+        fanout.submit_many(_data(10))
+        with self.assertRaises(RuntimeError):
+            fanout.close()
+
+    def test_decoder_error(self):
+        def decoder(data):
+            raise ValueError("decoder failed")
+
+        fanout = KeyedFanout(decoder, Report.field_reader("source"), print, workers=2, batch_size=1, max_batches=1)
+        fanout.submit_many(_data(20))
+        with self.assertRaises(ValueError):
+            fanout.close()
+
+    def test_key_needs_class(self):
+        with self.assertRaises(ValueError):
+            KeyedFanout(PacketRegistry(), "source", print, workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""test_registry.py: Tests for discriminator based packet dispatch. """
+
+import unittest
+from codecs import decode
+
+from serdepa import SerdepaPacket, Length, List, nx_uint8, nx_uint16, nx_int8
+from serdepa.exceptions import DeserializeError, PacketDefinitionError
+from serdepa.registry import PacketRegistry
+
+
+class Beacon(SerdepaPacket):
+    _fields_ = [
+        ("type", nx_uint8, 0x01),
+        ("source", nx_uint16),
+    ]
+    _discriminator_ = "type"
+
+
+class Data(SerdepaPacket):
+    _fields_ = [
+        ("type", nx_uint8),
+        ("length", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+    ]
+    _discriminator_ = ("type", 0x02)
+
+
+class AmFrame(SerdepaPacket):
+    _fields_ = [
+        ("type", nx_uint8, 0x00),
+        ("destination", nx_uint16),
+        ("source", nx_uint16),
+        ("am", nx_int8, -1),
+        ("payload", List(nx_uint8)),
+    ]
+    _discriminator_ = "am"
+
+
+class AmAck(SerdepaPacket):
+    _fields_ = [
+        ("type", nx_uint8, 0x00),
+        ("destination", nx_uint16),
+        ("source", nx_uint16),
+        ("am", nx_int8, 0x3D),
+    ]
+    _discriminator_ = "am"
+
+
+class FieldReaderTester(unittest.TestCase):
+
+    def test_field_offset(self):
+        self.assertEqual(AmFrame.field_offset("type"), 0)
+        self.assertEqual(AmFrame.field_offset("am"), 5)
+        self.assertEqual(Data.field_offset("data"), 2)
+        with self.assertRaises(PacketDefinitionError):
+            AmFrame.field_offset("missing")
+
+    def test_field_reader(self):
+        read = AmFrame.field_reader("source")
+        self.assertEqual(read(decode("000001ABCDFF", "hex")), 0xABCD)
+        self.assertEqual(read(decode("EE000001ABCDFF", "hex"), 1), 0xABCD)
+        self.assertEqual(Data.field_reader("length")(decode("020301", "hex")), 3)
+        with self.assertRaises(PacketDefinitionError):
+            AmFrame.field_reader("payload")
+
+
+class RegistryTester(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = PacketRegistry()
+        self.registry.register(Beacon)
+        self.registry.register(Data)
+
+    def test_decode(self):
+        packet = self.registry.decode(decode("01ABCD", "hex"))
+        self.assertIsInstance(packet, Beacon)
+        self.assertEqual(packet.source, 0xABCD)
+
+        packet = self.registry.decode(decode("02020102", "hex"))
+        self.assertIsInstance(packet, Data)
+        self.assertEqual(list(packet.data), [1, 2])
+
+    def test_decorator(self):
+        registry = PacketRegistry()
+
+        @registry.register
+        class Other(SerdepaPacket):
+            _fields_ = [("kind", nx_uint8, 7)]
+            _discriminator_ = "kind"
+
+        self.assertIsInstance(registry.decode(decode("07", "hex")), Other)
+
+    def test_unknown(self):
+        with self.assertRaises(DeserializeError) as cm:
+            self.registry.decode(decode("09ABCD", "hex"))
+        self.assertEqual(cm.exception.reason, "unknown_discriminator")
+        with self.assertRaises(DeserializeError) as cm:
+            self.registry.decode(b"")
+        self.assertEqual(cm.exception.reason, "truncated")
+
+    def test_duplicate_value(self):
+        class Clash(SerdepaPacket):
+            _fields_ = [("type", nx_uint8, 0x01)]
+            _discriminator_ = "type"
+
+        with self.assertRaises(PacketDefinitionError):
+            self.registry.register(Clash)
+
+    def test_mismatched_offset(self):
+        with self.assertRaises(PacketDefinitionError):
+            self.registry.register(AmAck)
+
+    def test_nested(self):
+        am = PacketRegistry()
+        am.register(AmFrame)
+        am.register(AmAck)
+        self.registry.register(am, 0x00)
+
+        packet = self.registry.decode(decode("00FFFF00013D", "hex"))
+        self.assertIsInstance(packet, AmAck)
+        packet = self.registry.decode(decode("00FFFF0001FF0102", "hex"))
+        self.assertIsInstance(packet, AmFrame)
+        self.assertEqual(list(packet.payload), [1, 2])
+        self.assertIs(self.registry.lookup(decode("01ABCD", "hex")), Beacon)
+
+    def test_explicit_discriminator(self):
+        registry = PacketRegistry(offset=5, field_type=nx_int8)
+        registry.register(AmFrame)
+        self.assertIn(-1, registry)
+        self.assertIn(0xFF, registry)
+        self.assertEqual(len(registry), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
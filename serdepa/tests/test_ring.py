@@ -0,0 +1,142 @@
+"""test_ring.py: Tests for the shared memory packet ring. """
+
+import multiprocessing
+import unittest
+
+from serdepa import SerdepaPacket, Length, List, nx_uint8, nx_uint16, nx_uint32
+from serdepa.exceptions import SerializeError
+from serdepa.ring import PacketRing
+
+
+__author__ = "Raido Pahtma, Kaarel Ratas"
+__license__ = "MIT"
+
+
+class Record(SerdepaPacket):
+    _fields_ = [
+        ("seq", nx_uint32),
+        ("length", Length(nx_uint8, "data")),
+        ("data", List(nx_uint8)),
+    ]
+
+
+class Fixed(SerdepaPacket):
+    _fields_ = [
+        ("seq", nx_uint32),
+        ("value", nx_uint16),
+    ]
+
+
+def _records(count):
+    return [Record(seq=i, data=list(range(i % 9))) for i in range(count)]
+
+
+def _consume(name, lock, index, queue):
+    _consume_ring(PacketRing.attach(name, lock), index, queue)
+
+
+def _consume_ring(ring, index, queue):
+    try:
+        queue.put([packet.seq for packet in ring.reader(index, Fixed)])
+    finally:
+        ring.close()
+
+
+class RingTester(unittest.TestCase):
+
+    def setUp(self):
+        self.rings = []
+
+    def tearDown(self):
+        for ring in self.rings:
+            ring.close()
+
+    def ring(self, *args, **kwargs):
+        ring = PacketRing.create(*args, **kwargs)
+        self.rings.append(ring)
+        return ring
+
+    def test_wraps_around(self):
+        ring = self.ring(capacity=101)
+        reader = ring.reader(0, Record)
+        packets = _records(200)
+        received = []
+        for i in range(0, len(packets), 5):
+            self.assertEqual(ring.publish_many(packets[i:i + 5]), 5)
+            received.extend(reader.read())
+        self.assertEqual(received, packets)
+        ring.finish()
+        self.assertEqual(reader.read(), [])
+
+    def test_views(self):
+        ring = self.ring(capacity=64)
+        reader = ring.reader(0)
+        ring.publish_many(_records(3))
+        views = reader.views(max_count=2)
+        self.assertEqual([view.tobytes() for view in views], [packet.serialize() for packet in _records(2)])
+        self.assertIsInstance(views[0], memoryview)
+        self.assertEqual([view.tobytes() for view in reader.views()], [_records(3)[2].serialize()])
+        self.assertEqual(reader.views(timeout=0), [])
+        with self.assertRaises(ValueError):
+            views[0].tobytes()  # released
+        reader.release()
+
+    def test_full(self):
+        ring = self.ring(capacity=32)
+        reader = ring.reader(0, Fixed)
+        self.assertEqual(ring.publish_many([Fixed(seq=i) for i in range(3)]), 3)
+        with self.assertRaises(TimeoutError):
+            ring.publish(Fixed(seq=3), timeout=0.01)
+        self.assertEqual([packet.seq for packet in reader.read()], [0, 1, 2])
+        ring.publish(Fixed(seq=3), timeout=0.01)
+        self.assertEqual(reader.read()[0].seq, 3)
+        with self.assertRaises(SerializeError):
+            ring.publish(Record(data=list(range(40))))
+        reader.release()
+
+    def test_consumers(self):
+        ring = self.ring(capacity=256, consumers=2)
+        readers = [ring.reader(0, Fixed), ring.reader(1, Fixed)]
+        ring.publish_many([Fixed(seq=i) for i in range(6)])
+        ring.finish()
+        self.assertEqual([[packet.seq for packet in reader] for reader in readers], [[0, 2, 4], [1, 3, 5]])
+
+        ring = self.ring(capacity=256, consumers=2, partition=False)
+        readers = [ring.reader(0, Fixed), ring.reader(1, Fixed)]
+        ring.publish_many([Fixed(seq=i) for i in range(3)])
+        ring.finish()
+        self.assertEqual([[packet.seq for packet in reader] for reader in readers], [[0, 1, 2], [0, 1, 2]])
+
+    def test_attach_again(self):
+        ring = self.ring(capacity=256, consumers=2)
+        ring.publish_many([Fixed(seq=i) for i in range(10)])
+        reader = ring.reader(1, Fixed)
+        self.assertEqual([packet.seq for packet in reader.read(max_count=2)], [1, 3])
+
+        attached = PacketRing.attach(ring.name, ring.lock)
+        try:
+            ring.finish()
+            self.assertEqual([packet.seq for packet in attached.reader(1, Fixed)], [5, 7, 9])
+        finally:
+            attached.close()
+
+    def test_processes(self):
+        ring = self.ring(capacity=1000, consumers=2)
+        queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_consume, args=(ring.name, ring.lock, 0, queue)),
+            multiprocessing.Process(target=_consume_ring, args=(ring, 1, queue)),
+        ]
+        for process in processes:
+            process.start()
+        for i in range(0, 2000, 50):
+            ring.publish_many([Fixed(seq=j, value=j % 7) for j in range(i, i + 50)], timeout=10)
+        ring.finish()
+        results = sorted([queue.get(timeout=10), queue.get(timeout=10)])
+        for process in processes:
+            process.join()
+        self.assertEqual(results, [list(range(0, 2000, 2)), list(range(1, 2000, 2))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,22 @@
 """test_serdepa.py: Tests for serdepa packets. """
 
+import array
+import copy
+import io
 import unittest
 from codecs import decode, encode
+from concurrent.futures import ThreadPoolExecutor
 
 from serdepa import (
-    SerdepaPacket, Length, List, Array, ByteString,
+    SerdepaPacket, Length, List, Array, ByteString, Union, Checksum,
     nx_uint8, nx_uint16, nx_uint32, nx_uint64,
     nx_int8, nx_int16, nx_int32, nx_int64,
     uint8, uint16, uint32, uint64,
-    int8, int16, int32, int64
+    int8, int16, int32, int64,
+    varuint, varint, nx_bits, bits,
+    nx_float, float64, FixedPoint, PackedList, PackedArray
 )
-from serdepa.exceptions import DeserializeError
+from serdepa.exceptions import DeserializeError, PacketDefinitionError, SerializeError
 
 
 __author__ = "Raido Pahtma, Kaarel Ratas"
@@ -608,5 +614,869 @@ class InvalidLengthTester(unittest.TestCase):
             packet.deserialize(self.long_input)
 
 
+class PrototypeIsolationTester(unittest.TestCase):
+
+    class VarLenPacket(SerdepaPacket):
+        _fields_ = (
+            ("hdr", nx_uint16),
+            ("tail", ByteString())
+        )
+
+    def test_bytestring_not_shared(self):
+        first = self.VarLenPacket()
+        second = self.VarLenPacket()
+        first.deserialize(decode("00010203", "hex"))
+        second.deserialize(decode("000405", "hex"))
+        self.assertEqual(first.tail, 0x0203)
+        self.assertEqual(second.tail, 0x05)
+
+    def test_length_not_shared(self):
+        first = OnePacket()
+        second = OnePacket()
+        self.assertIsNot(first._length._type, second._length._type)
+
+    def test_array_serialize_does_not_modify(self):
+        packet = SimpleArray()
+        packet.data.append(1)
+        self.assertEqual(packet.serialize(), decode("01000000000000000000", "hex"))
+        self.assertEqual(len(packet.data), 1)
+
+    def test_concurrent_decode(self):
+        packets = []
+        for i in range(200):
+            packet = OnePacket(header=i % 256, timestamp=i)
+            for j in range(i % 9):
+                packet.data.append(j)
+            packet.tail.append(i % 256)
+            packets.append(packet)
+        serialized = [p.serialize() for p in packets]
+
+        def roundtrip(data):
+            packet = OnePacket()
+            packet.deserialize(data)
+            return packet.serialize()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(5):
+                self.assertEqual(list(executor.map(roundtrip, serialized)), serialized)
+
+
+class MemoryProfileTester(unittest.TestCase):
+
+    def test_deep_sizeof_grows_with_elements(self):
+        packet = AnotherPacket()
+        empty = packet.deep_sizeof()
+        packet.data.append(PointStruct(x=1, y=2))
+        self.assertGreater(packet.deep_sizeof(), empty + PointStruct().deep_sizeof() // 2)
+
+    def test_per_field(self):
+        packet = AnotherPacket()
+        packet.data.append(PointStruct(x=1, y=2))
+        fields = packet.deep_sizeof(per_field=True)
+        self.assertEqual(list(fields), ["header", "timestamp", "origin", "points", "data"])
+        self.assertEqual(fields["origin"], packet.origin.deep_sizeof())
+        self.assertLess(sum(fields.values()), packet.deep_sizeof())
+
+    def test_memory_profile(self):
+        profile = OnePacket.memory_profile()
+        self.assertEqual(profile["header"], 0)
+        self.assertEqual(profile["timestamp"], 0)
+        self.assertGreater(profile["length"], 0)
+        self.assertGreater(profile["data"], 0)
+
+
+class Temperature(SerdepaPacket):
+    _fields_ = [
+        ("celsius", nx_int16),
+    ]
+
+
+class Humidity(SerdepaPacket):
+    _fields_ = [
+        ("percent", nx_uint8),
+        ("raw", nx_uint16),
+    ]
+
+
+class Samples(SerdepaPacket):
+    _fields_ = [
+        ("samples", List(nx_uint8)),
+    ]
+
+
+class Reading(SerdepaPacket):
+    _fields_ = [
+        ("node", nx_uint16),
+        ("kind", nx_uint8),
+        ("payload", Union("kind", {1: Temperature, 2: Humidity})),
+        ("seq", nx_uint8),
+    ]
+
+
+class TailReading(SerdepaPacket):
+    _fields_ = [
+        ("kind", nx_uint8),
+        ("payload", Union("kind", {1: Temperature, 3: Samples})),
+    ]
+
+
+class UnionTester(unittest.TestCase):
+    temperature = "0102" "01" "FFF6" "07"
+    humidity = "0102" "02" "2A0123" "08"
+
+    def test_default_not_shared(self):
+        class Defaulted(SerdepaPacket):
+            _fields_ = [
+                ("kind", nx_uint8),
+                ("payload", Union("kind", {1: Temperature, 2: Humidity}), Temperature(celsius=5)),
+            ]
+
+        first, second = Defaulted(), Defaulted()
+        first.payload.celsius = 7
+        self.assertEqual(second.payload.celsius, 5)
+        self.assertEqual(Defaulted().kind, 1)
+
+    def test_deserialize(self):
+        packet = Reading()
+        packet.deserialize(decode(self.temperature, "hex"))
+        self.assertEqual(packet.kind, 1)
+        self.assertIsInstance(packet.payload, Temperature)
+        self.assertEqual(packet.payload.celsius, -10)
+        self.assertEqual(packet.seq, 7)
+
+        packet.deserialize(decode(self.humidity, "hex"))
+        self.assertIsInstance(packet.payload, Humidity)
+        self.assertEqual(packet.payload.raw, 0x0123)
+        self.assertEqual(packet.seq, 8)
+
+    def test_serialize_sets_tag(self):
+        packet = Reading(node=0x0102, seq=8)
+        packet.payload = Humidity(percent=42, raw=0x0123)
+        self.assertEqual(packet.kind, 2)
+        self.assertEqual(packet.serialize(), decode(self.humidity, "hex"))
+
+        packet.kind = 1
+        self.assertEqual(packet.serialize(), decode(self.humidity, "hex"))
+
+    def test_keyword_initialization(self):
+        packet = Reading(node=0x0102, payload=Temperature(celsius=-10), seq=7)
+        self.assertEqual(packet.kind, 1)
+        self.assertEqual(packet.serialize(), decode(self.temperature, "hex"))
+
+    def test_invalid_assignment(self):
+        packet = Reading()
+        with self.assertRaises(ValueError):
+            packet.payload = Samples()
+
+    def test_unknown_tag(self):
+        packet = Reading()
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode("010205FFF607", "hex"))
+        self.assertEqual(cm.exception.reason, "unknown_tag")
+
+    def test_tail_payload(self):
+        packet = TailReading()
+        packet.deserialize(decode("03010203", "hex"))
+        self.assertEqual(list(packet.payload.samples), [1, 2, 3])
+        self.assertEqual(packet.serialize(), decode("03010203", "hex"))
+
+    def test_sizes(self):
+        self.assertEqual(Reading.minimal_size(), 6)
+        self.assertIsNone(Reading.static_size())
+        self.assertIsNone(Reading.field_offset("seq"))
+
+    def test_invalid_tag_field(self):
+        with self.assertRaises(PacketDefinitionError):
+            class Invalid(SerdepaPacket):
+                _fields_ = [
+                    ("payload", Union("kind", {1: Temperature})),
+                    ("kind", nx_uint8),
+                ]
+            Invalid()
+
+
+
+class Counters(SerdepaPacket):
+    _fields_ = [
+        ("header", nx_uint16),
+        ("uptime", varuint),
+        ("offset", varint),
+        ("count", Length(varuint, "deltas")),
+        ("deltas", List(varint)),
+        ("tail", nx_uint8),
+    ]
+
+
+class VarTail(SerdepaPacket):
+    _fields_ = [
+        ("header", nx_uint8),
+        ("values", List(varuint)),
+    ]
+
+
+class VarIntTester(unittest.TestCase):
+
+    def test_encoding(self):
+        for value, encoded in ((0, "00"), (1, "01"), (127, "7F"), (128, "8001"), (300, "AC02"),
+                               (2 ** 64 - 1, "FFFFFFFFFFFFFFFFFF01")):
+            self.assertEqual(varuint(initial=value).serialize(), decode(encoded, "hex"))
+        for value, encoded in ((0, "00"), (-1, "01"), (1, "02"), (-64, "7F"), (64, "8001"),
+                               (-2 ** 63, "FFFFFFFFFFFFFFFFFF01")):
+            self.assertEqual(varint(initial=value).serialize(), decode(encoded, "hex"))
+            field = varint()
+            self.assertEqual(field.deserialize(decode("AA" + encoded, "hex"), 1), 1 + len(encoded) // 2)
+            self.assertEqual(field.value, value)
+
+    def test_packet(self):
+        packet = Counters(header=0x0102, uptime=300, offset=-3, tail=9)
+        packet.deltas.extend([1, -1, 200] + [0] * 150)
+        data = packet.serialize()
+        self.assertEqual(data[:11], decode("0102" "AC02" "05" "9901" "02" "01" "9003", "hex"))
+        self.assertEqual(packet.serialized_size(), len(data))
+
+        result = Counters()
+        result.deserialize(data)
+        self.assertEqual(result.uptime, 300)
+        self.assertEqual(result.offset, -3)
+        self.assertEqual(result.count, 153)
+        self.assertEqual(list(result.deltas), [1, -1, 200] + [0] * 150)
+        self.assertEqual(result.tail, 9)
+        self.assertEqual(result.serialize(), data)
+
+    def test_tail_list(self):
+        packet = VarTail()
+        packet.deserialize(decode("07" "01" "AC02" "7F" "FFFFFFFFFFFFFFFFFF01", "hex"))
+        self.assertEqual(list(packet.values), [1, 300, 127, 2 ** 64 - 1])
+        packet.deserialize(decode("07" "000102", "hex"))
+        self.assertEqual(list(packet.values), [0, 1, 2])
+
+    def test_invalid(self):
+        packet = VarTail()
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode("07" "01" "AC", "hex"))
+        self.assertEqual(cm.exception.reason, "truncated")
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode("07" + "FF" * 10 + "01", "hex"))
+        self.assertEqual(cm.exception.reason, "overflow")
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode("07" + "FF" * 9 + "7F", "hex"))
+        self.assertEqual(cm.exception.reason, "overflow")
+
+        packet = Counters()
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode("0102" "AC02" "05" "03" "0102", "hex"))
+        self.assertEqual(cm.exception.reason, "truncated")
+
+    def test_sizes(self):
+        self.assertEqual(Counters.minimal_size(), 2 + 1 + 1 + 1 + 0 + 1)
+        self.assertIsNone(Counters.static_size())
+        self.assertEqual(Counters.field_offset("header"), 0)
+        self.assertEqual(Counters.field_offset("uptime"), 2)
+        self.assertIsNone(Counters.field_offset("offset"))
+        Counters.field_reader("header")
+        with self.assertRaises(PacketDefinitionError):
+            Counters.field_reader("uptime")
+
+    def test_array(self):
+        class VarArray(SerdepaPacket):
+            _fields_ = [
+                ("values", Array(varint, 3)),
+                ("tail", nx_uint8),
+            ]
+        packet = VarArray(tail=1)
+        packet.values.append(-200)
+        self.assertEqual(packet.serialize(), decode("8F03" "00" "00" "01", "hex"))
+        self.assertEqual(packet.serialized_size(), 5)
+        self.assertEqual(VarArray.minimal_size(), 4)
+
+        packet.deserialize(decode("01" "8F03" "03" "01", "hex"))
+        self.assertEqual(list(packet.values), [-1, -200, -2])
+
+
+class BulkIntListTester(unittest.TestCase):
+
+    def test_roundtrip(self):
+        for _type, data in ((nx_uint16, "0001FFFF"), (int32, "FEFFFFFF01000000")):
+            class Tail(SerdepaPacket):
+                _fields_ = [("values", List(_type))]
+            packet = Tail()
+            packet.deserialize(decode(data, "hex"))
+            self.assertTrue(all(isinstance(v, _type) for v in list.__iter__(packet.values)))
+            self.assertEqual(packet.serialize(), decode(data, "hex"))
+        self.assertEqual(list(packet.values), [-2, 1])
+
+
+
+FLAG = nx_bits(1)
+
+
+class SensorHeader(SerdepaPacket):
+    _fields_ = [
+        ("version", nx_bits(3), 2),
+        ("alarm", FLAG),
+        ("kind", nx_bits(4)),
+        ("node", nx_uint16),
+        ("channel", nx_bits(5)),
+        ("valid", FLAG),
+        ("low", bits(2)),
+        ("high", bits(6)),
+        ("level", nx_uint8),
+    ]
+
+
+class BitFieldTester(unittest.TestCase):
+    data = "5A" "0102" "C8" "C6" "07"
+
+    def test_deserialize(self):
+        packet = SensorHeader()
+        packet.deserialize(decode(self.data, "hex"))
+        self.assertEqual(packet.version, 2)
+        self.assertEqual(packet.alarm, 1)
+        self.assertEqual(packet.kind, 0xA)
+        self.assertEqual(packet.node, 0x0102)
+        self.assertEqual(packet.channel, 0x19)
+        self.assertEqual(packet.valid, 0)
+        self.assertEqual(packet.low, 2)
+        self.assertEqual(packet.high, 0x31)
+        self.assertEqual(packet.level, 7)
+
+    def test_serialize(self):
+        packet = SensorHeader(alarm=1, kind=0xA, node=0x0102, channel=0x19, low=2, high=0x31, level=7)
+        self.assertEqual(packet.version, 2)
+        self.assertEqual(packet.serialize(), decode(self.data, "hex"))
+        self.assertEqual(packet.serialized_size(), 6)
+
+    def test_sizes(self):
+        self.assertEqual(SensorHeader.minimal_size(), 6)
+        self.assertEqual(SensorHeader.static_size(), 6)
+        self.assertEqual(SensorHeader.field_offset("kind"), 0)
+        self.assertEqual(SensorHeader.field_offset("node"), 1)
+        self.assertEqual(SensorHeader.field_offset("low"), 4)
+        self.assertEqual(SensorHeader.field_offset("level"), 5)
+        self.assertEqual(SensorHeader.field_reader("level")(decode(self.data, "hex")), 7)
+
+    def test_partial_byte(self):
+        class Flags(SerdepaPacket):
+            _fields_ = [
+                ("a", nx_bits(1)),
+                ("b", nx_bits(2)),
+            ]
+        packet = Flags(a=1, b=3)
+        self.assertEqual(packet.serialize(), decode("E0", "hex"))
+        packet.deserialize(decode("40", "hex"))
+        self.assertEqual((packet.a, packet.b), (0, 2))
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(b"")
+        self.assertEqual(cm.exception.reason, "truncated")
+
+    def test_value_too_large(self):
+        packet = SensorHeader(kind=16)
+        with self.assertRaises(SerializeError):
+            packet.serialize()
+
+    def test_shared_prototype(self):
+        self.assertEqual(FLAG.serialized_size(), 1)
+        self.assertEqual(nx_bits(12).serialized_size(), 2)
+
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+Q8 = FixedPoint(nx_int16, 2 ** -8)
+
+
+class Measurement(SerdepaPacket):
+    _fields_ = [
+        ("temperature", nx_float),
+        ("pressure", float64),
+        ("humidity", Q8),
+        ("count", Length(nx_uint8, "samples")),
+        ("samples", PackedList(nx_float)),
+        ("offsets", PackedArray(FixedPoint(int16, 0.5), 2)),
+        ("tail", List(Q8)),
+    ]
+
+
+class FloatTester(unittest.TestCase):
+    data = (
+        "40490FDB" "0000000000C05F40" "0280" "03" "3F800000" "BF800000" "41200000" "FEFF" "0300"
+        "0001" "FF80"
+    )
+
+    def test_deserialize(self):
+        packet = Measurement()
+        packet.deserialize(decode(self.data, "hex"))
+        self.assertAlmostEqual(packet.temperature, 3.1415927, places=6)
+        self.assertEqual(packet.pressure, 127.0)
+        self.assertEqual(packet.humidity, 2.5)
+        self.assertEqual(packet.count, 3)
+        self.assertIsInstance(packet.samples.as_array(), array.array)
+        self.assertEqual(list(packet.samples), [1.0, -1.0, 10.0])
+        self.assertEqual(list(packet.offsets), [-1.0, 1.5])
+        self.assertEqual(list(packet.tail), [1 / 256.0, -0.5])
+
+    def test_serialize(self):
+        packet = Measurement(temperature=3.1415927, pressure=127, humidity=2.5, samples=[1, -1])
+        packet.samples.append(10)
+        packet.offsets.extend([-1, 1.5])
+        packet.tail.extend([1 / 256.0, -0.5])
+        self.assertEqual(packet.serialize(), decode(self.data, "hex"))
+        self.assertEqual(packet.serialized_size(), len(self.data) // 2)
+
+    def test_sizes(self):
+        self.assertEqual(Measurement.minimal_size(), 4 + 8 + 2 + 1 + 0 + 4 + 0)
+        self.assertEqual(Measurement.field_offset("humidity"), 12)
+        self.assertIsNone(Measurement.field_offset("offsets"))
+        self.assertEqual(Measurement.field_reader("pressure")(decode(self.data, "hex")), 127.0)
+
+    def test_packed_array_padding(self):
+        packet = Measurement()
+        packet.offsets.append(2)
+        self.assertEqual(packet.serialize()[-4:], decode("04000000", "hex"))
+
+    def test_prototypes_isolated(self):
+        first = Measurement()
+        first.samples.append(1)
+        self.assertEqual(len(Measurement().samples), 0)
+
+    def test_truncated(self):
+        packet = Measurement()
+        with self.assertRaises(DeserializeError) as cm:
+            packet.deserialize(decode(self.data[:40], "hex"))
+        self.assertEqual(cm.exception.reason, "truncated")
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        packet = Measurement()
+        packet.deserialize(decode(self.data, "hex"))
+        samples = packet.samples.as_numpy()
+        self.assertEqual(samples.dtype, numpy.float32)
+        self.assertEqual(samples.tolist(), [1.0, -1.0, 10.0])
+        samples[0] = 2
+        self.assertEqual(packet.samples[0], 2.0)
+
+
+class Bulk(SerdepaPacket):
+    _fields_ = [
+        ("header", nx_uint16),
+        ("length", Length(nx_uint16, "payload")),
+        ("payload", ByteString()),
+        ("samples", PackedArray(uint16, 300)),
+        ("crc", Checksum("crc16-ccitt")),
+    ]
+
+
+class SegmentsTester(unittest.TestCase):
+
+    def test_segments(self):
+        packet = Bulk(header=1, payload=bytearray(range(256)) * 8)
+        packet.samples.extend(range(300))
+        segments = packet.serialize_segments()
+        self.assertEqual(b"".join(segments), packet.serialize())
+        self.assertEqual([type(segment) for segment in segments], [bytes, memoryview, memoryview, bytes])
+        self.assertEqual(segments[0], decode("00010800", "hex"))
+        self.assertEqual(len(segments[2]), 600)
+        self.assertEqual(segments[3], packet.serialize()[-2:])
+
+        # The views refer to the field storage, nothing was copied
+        packet.payload[0] = 0xFF
+        self.assertEqual(segments[1][0], 0xFF)
+
+        buffer = bytearray(len(packet.serialize()) + 1)
+        self.assertEqual(packet.serialize_into(buffer, 1), len(buffer))
+        self.assertEqual(bytes(buffer[1:]), packet.serialize())
+
+    def test_small_segments_joined(self):
+        packet = Bulk(header=1, payload=b"abc")
+        packet.samples.extend(range(100))
+        segments = packet.serialize_segments()
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(b"".join(segments), packet.serialize())
+
+    def test_checksum(self):
+        packet = Bulk(header=1, payload=bytearray(1000))
+        result = Bulk()
+        result.deserialize(b"".join(packet.serialize_segments()))
+        self.assertEqual(result.payload, 0)
+        self.assertEqual(len(result.payload), 1000)
+
+
+
+class Telemetry(SerdepaPacket):
+    _fields_ = [
+        ("kind", nx_uint8),
+        ("payload", Union("kind", {1: Temperature, 2: Humidity})),
+        ("flags", nx_bits(4)),
+        ("mode", nx_bits(4)),
+        ("origin", PointStruct),
+        ("count", Length(nx_uint8, "hops")),
+        ("hops", List(PointStruct)),
+        ("samples", Array(nx_int16, 2)),
+        ("ratio", Q8),
+        ("levels", PackedArray(nx_uint8, 3)),
+        ("crc", Checksum("crc8")),
+        ("name", ByteString(3)),
+    ]
+
+
+class DictTester(unittest.TestCase):
+    values = {
+        "kind": 2,
+        "payload": {"percent": 40, "raw": 0x0123},
+        "flags": 3,
+        "mode": 12,
+        "origin": {"x": 1, "y": -1},
+        "count": 2,
+        "hops": [{"x": 2, "y": 3}, {"x": -4, "y": 5}],
+        "samples": [7, -7],
+        "ratio": 1.5,
+        "name": b"abc",
+        "crc": 0,
+        "levels": [1, 2, 3],
+    }
+
+    def packet(self):
+        packet = Telemetry(kind=2, flags=3, mode=12, ratio=1.5, name=b"abc", levels=[1, 2, 3])
+        packet.payload = Humidity(percent=40, raw=0x0123)
+        packet.origin.x, packet.origin.y = 1, -1
+        packet.hops.extend([PointStruct(x=2, y=3), PointStruct(x=-4, y=5)])
+        packet.samples.extend([7, -7])
+        return packet
+
+    def test_to_dict(self):
+        packet = Telemetry()
+        packet.deserialize(self.packet().serialize())
+        values = dict(self.values, crc=packet.crc)
+        self.assertEqual(packet.to_dict(), values)
+        self.assertEqual(type(packet.to_dict()["kind"]), int)
+
+    def test_from_dict(self):
+        packet = Telemetry.from_dict(self.values)
+        self.assertEqual(packet.serialize(), self.packet().serialize())
+        self.assertEqual(Telemetry.from_dict(packet.to_dict()).serialize(), packet.serialize())
+
+    def test_from_dict_union_needs_tag(self):
+        values = dict(self.values)
+        del values["kind"]
+        with self.assertRaises(ValueError):
+            Telemetry.from_dict(values)
+
+    def test_to_dicts(self):
+        packets = [PointStruct(x=i, y=-i) for i in range(3)]
+        data = b"".join(packet.serialize() for packet in packets)
+        expected = [{"x": i, "y": -i} for i in range(3)]
+        self.assertEqual(PointStruct.to_dicts(data), expected)
+        self.assertEqual(PointStruct.to_dicts(bytearray(data)), expected)
+        self.assertEqual(PointStruct.to_dicts(packets), expected)
+        with self.assertRaises(DeserializeError):
+            PointStruct.to_dicts(data[:-1])
+
+        data = self.packet().serialize() * 2
+        self.assertEqual(len(Telemetry.to_dicts(data)), 2)
+        self.assertEqual(Telemetry.to_dicts(data)[1]["hops"], self.values["hops"])
+
+    def test_subclass_has_own_converters(self):
+        PointStruct().to_dict()
+
+        class Point3(PointStruct):
+            _fields_ = [
+                ("z", nx_int32),
+            ]
+        self.assertEqual(Point3(z=4).to_dict(), {"z": 4})
+
+
+
+class RoutingTable(SerdepaPacket):
+    _fields_ = [
+        ("origin", PackedArray(PointStruct, 2)),
+        ("count", Length(nx_uint8, "routes")),
+        ("routes", PackedList(PointStruct)),
+    ]
+
+
+class ColumnsTester(unittest.TestCase):
+    data = "00000001FFFFFFFF" "0000000000000000" "03" "000000020000000A" "0000000300000014" "000000040000001E"
+
+    def test_deserialize(self):
+        packet = RoutingTable()
+        packet.deserialize(decode(self.data, "hex"))
+        self.assertEqual(packet.count, 3)
+        self.assertEqual(packet.routes.column("x"), array.array(packet.routes.column("x").typecode, [2, 3, 4]))
+        self.assertEqual(list(packet.routes.column("y")), [10, 20, 30])
+        self.assertEqual(packet.routes[-1].y, 30)
+        self.assertEqual([route.x for route in packet.routes], [2, 3, 4])
+        self.assertEqual(packet.origin[0], PointStruct(x=1, y=-1))
+        self.assertEqual(PointStruct(x=1, y=-1), packet.origin[0])
+        self.assertEqual(packet.origin.column("y")[1], 0)
+        with self.assertRaises(IndexError):
+            packet.routes[3]
+        with self.assertRaises(AttributeError):
+            packet.routes.column("z")
+
+    def test_serialize(self):
+        packet = RoutingTable()
+        packet.origin.append(PointStruct(x=1, y=-1))
+        packet.routes.append(PointStruct(x=2, y=10))
+        packet.routes.append({"x": 3, "y": 20})
+        packet.routes.extend([(4, 30)])
+        self.assertEqual(packet.serialize(), decode(self.data, "hex"))
+
+        packet.routes[0].y = 11
+        packet.routes[1] = PointStruct(x=5, y=6)
+        self.assertEqual(packet.to_dict()["routes"], [{"x": 2, "y": 11}, {"x": 5, "y": 6}, {"x": 4, "y": 30}])
+        self.assertEqual(RoutingTable.from_dict(packet.to_dict()), packet)
+        self.assertEqual(packet.routes._values.packets()[1], PointStruct(x=5, y=6))
+
+    def test_invalid_item(self):
+        packet = RoutingTable()
+        packet.routes.append({"x": 1, "y": 2})
+        for item in ({"x": 3, "y": 2 ** 31}, (3,), PointStruct(x=3, y=-2 ** 31 - 1)):
+            with self.assertRaises(SerializeError):
+                packet.routes.append(item)
+            with self.assertRaises(SerializeError):
+                packet.routes[0] = item
+        self.assertEqual(packet.to_dict()["routes"], [{"x": 1, "y": 2}])
+        self.assertEqual(packet.serialize()[16:], decode("010000000100000002", "hex"))
+
+    def test_instances_independent(self):
+        first = RoutingTable()
+        first.routes.append(PointStruct(x=1, y=1))
+        second = RoutingTable()
+        self.assertEqual(len(second.routes), 0)
+
+    def test_needs_fixed_layout(self):
+        with self.assertRaises(PacketDefinitionError):
+            PackedList(AnotherPacket)
+
+
+class Observation(SerdepaPacket):
+    _fields_ = [
+        ("origin", PointStruct),
+        ("kind", nx_uint8),
+        ("rssi", nx_int16),
+        ("node", uint16),
+    ]
+
+
+class FilterTester(unittest.TestCase):
+
+    def setUp(self):
+        self.packets = [
+            Observation(origin=PointStruct(x=i, y=-i), kind=i % 3, rssi=-40 - i, node=i % 7) for i in range(100)
+        ]
+        self.data = b"".join(packet.serialize() for packet in self.packets)
+
+    def expected(self, condition):
+        return [packet for packet in self.packets if condition(packet)]
+
+    def test_predicate(self):
+        match = Observation.predicate(kind=2, rssi__gt=-60)
+        self.assertTrue(match(self.packets[2].serialize()))
+        self.assertFalse(match(self.packets[3].serialize()))
+        self.assertFalse(match(self.packets[59].serialize()))
+        self.assertTrue(match(b"\x00" + self.packets[5].serialize(), 1))
+
+    def test_buffer(self):
+        result = list(Observation.filter(self.data, kind__ne=0, origin__x__lt=10, node__in={1, 2}))
+        self.assertEqual(result, self.expected(lambda p: p.kind != 0 and p.origin.x < 10 and p.node in (1, 2)))
+        self.assertEqual(list(Observation.filter(bytearray(self.data), rssi__le=-138, _decode=False)),
+                         [packet.serialize() for packet in self.packets[98:]])
+        with self.assertRaises(DeserializeError):
+            list(Observation.filter(self.data[:-1], kind=1))
+
+    def test_file_and_records(self):
+        result = list(Observation.filter(io.BytesIO(self.data), origin__y__ge=-4))
+        self.assertEqual(result, self.packets[:5])
+        records = [packet.serialize() for packet in self.packets] + [b"\x00"]
+        self.assertEqual(list(Observation.filter(records, kind=1, node=1)),
+                         self.expected(lambda p: p.kind == 1 and p.node == 1))
+
+    def test_field_names(self):
+        class Named(SerdepaPacket):
+            _fields_ = [
+                ("source", nx_uint8),
+                ("decode", nx_uint8),
+            ]
+
+        data = b"".join(Named(source=i, decode=i % 2).serialize() for i in range(4))
+        self.assertEqual([packet.source for packet in Named.filter(data, source__ge=1, decode=1)], [1, 3])
+
+    def test_invalid(self):
+        with self.assertRaises(PacketDefinitionError):
+            Observation.predicate(missing=1)
+        with self.assertRaises(PacketDefinitionError):
+            Observation.predicate(origin=1)
+        with self.assertRaises(PacketDefinitionError):
+            AnotherPacket.predicate(data=1)
+        with self.assertRaises(PacketDefinitionError) as cm:
+            Observation.predicate(node__foo=5)
+        self.assertIn("Unknown operator foo", str(cm.exception))
+        with self.assertRaises(PacketDefinitionError) as cm:
+            Observation.predicate(origin__x__above=5)
+        self.assertIn("Unknown operator above", str(cm.exception))
+        with self.assertRaises(ValueError):
+            Observation.predicate()
+        with self.assertRaises(ValueError):
+            list(AnotherPacket.filter(b"", header=1))
+
+
+
+class Label(SerdepaPacket):
+    _fields_ = [
+        ("id", nx_uint16),
+        ("tag", ByteString(4)),
+    ]
+
+
+class Forward(SerdepaPacket):
+    _fields_ = [
+        ("version", nx_bits(3), 1),
+        ("hops", nx_bits(5)),
+        ("origin", PointStruct),
+        ("gain", FixedPoint(nx_int16, 0.5)),
+        ("label", Label),
+        ("crc", Checksum("crc16-ccitt")),
+        ("count", Length(nx_uint8, "payload")),
+        ("payload", List(nx_uint8)),
+        ("after", nx_uint8),
+    ]
+
+
+class ViewTester(unittest.TestCase):
+
+    def setUp(self):
+        self.packet = Forward(hops=3, origin=PointStruct(x=10, y=-20), gain=1.5, label=Label(tag=b"abcd"),
+                             after=9)
+        self.packet.payload.extend([nx_uint8(7), nx_uint8(8)])
+        self.data = bytearray(b"\xFF" + self.packet.serialize())
+
+    def test_read(self):
+        view = Forward.view(self.data, 1)
+        self.assertEqual((view.version, view.hops), (1, 3))
+        self.assertEqual((view.origin.x, view.origin.y), (10, -20))
+        self.assertEqual(view.gain, 1.5)
+        self.assertEqual(bytes(view.label.tag), b"abcd")
+        self.assertEqual(view.count, 2)
+        self.assertEqual(view.packet(), self.packet)
+        self.assertIsNone(view.size)
+
+    def test_write_in_place(self):
+        view = Forward.view(memoryview(self.data), 1)
+        view.hops += 1
+        view.origin.x = 11
+        view.gain = -2.0
+        view.label.tag[0:1] = b"z"
+        view.update_checksums()
+        self.assertEqual(self.data[0], 0xFF)
+
+        self.packet.hops = 4
+        self.packet.origin.x = 11
+        self.packet.gain = -2.0
+        self.packet.label.tag[0] = ord("z")
+        self.assertEqual(self.data[1:], self.packet.serialize())
+        self.assertEqual(view.packet(), self.packet)
+
+        view.origin = PointStruct(x=1, y=2)
+        self.assertEqual(PointStruct.view(self.data, 2), PointStruct(x=1, y=2))
+
+    def test_errors(self):
+        view = Forward.view(self.data, 1)
+        with self.assertRaises(SerializeError):
+            view.hops = 32
+        with self.assertRaises(SerializeError):
+            view.origin.x = 2 ** 31
+        with self.assertRaises(SerializeError):
+            view.label.tag = b"abc"
+        with self.assertRaises(AttributeError):
+            view.count = 3
+        with self.assertRaises(PacketDefinitionError):
+            view.payload
+        with self.assertRaises(PacketDefinitionError):
+            view.after
+        with self.assertRaises(AttributeError):
+            view.missing = 1
+        with self.assertRaises(DeserializeError):
+            Forward.view(self.data[:10])
+        with self.assertRaises(TypeError):
+            PointStruct.view(b"\x00" * 8).x = 1
+
+    def test_after_fixed_array(self):
+        class Fixed(SerdepaPacket):
+            _fields_ = [
+                ("hdr", nx_uint8),
+                ("arr", Array(nx_uint8, 4)),
+                ("seq", nx_uint32),
+            ]
+
+        data = bytearray(Fixed(hdr=1, arr=[1, 2, 3, 4], seq=7).serialize())
+        view = Fixed.view(data)
+        self.assertEqual(view.seq, 7)
+        view.seq = 8
+        self.assertEqual(data[5:], b"\x00\x00\x00\x08")
+        with self.assertRaises(PacketDefinitionError):
+            view.arr
+
+    def test_consecutive_packets(self):
+        data = bytearray(b"".join(PointStruct(x=i, y=i).serialize() for i in range(5)))
+        for offset in range(0, len(data), PointStruct.static_size()):
+            view = PointStruct.view(data, offset)
+            view.y = view.x * 2
+        self.assertEqual(PointStruct.to_dicts(data)[4], {"x": 4, "y": 8})
+
+
+
+class CloneTester(unittest.TestCase):
+
+    def setUp(self):
+        self.packet = Telemetry.from_dict(DictTester.values)
+
+    def check_independent(self, clone):
+        self.assertEqual(clone, self.packet)
+        clone.payload.percent = 41
+        clone.flags = 4
+        clone.origin.x = 10
+        clone.hops[0].y = 30
+        clone.hops.append(PointStruct())
+        clone.samples[1].value = 70
+        clone.levels[0] = 9
+        clone.name[0] = 0x7A
+        self.assertEqual(self.packet.to_dict(), Telemetry.from_dict(DictTester.values).to_dict())
+        self.assertNotEqual(clone, self.packet)
+
+    def test_clone(self):
+        self.check_independent(self.packet.clone())
+
+    def test_copy(self):
+        self.check_independent(copy.copy(self.packet))
+        self.check_independent(copy.deepcopy(self.packet))
+        self.assertEqual(copy.deepcopy([self.packet])[0], self.packet)
+        copies = copy.deepcopy([self.packet, self.packet])
+        self.assertIs(copies[0], copies[1])
+        self.assertIsNot(copies[0], self.packet)
+
+    def test_overrides(self):
+        clone = self.packet.clone(payload=Temperature(celsius=-5), origin=PointStruct(x=7, y=8), hops=[])
+        self.assertEqual(clone.kind, 1)
+        self.assertEqual(clone.payload.celsius, -5)
+        self.assertEqual((clone.origin.x, clone.origin.y), (7, 8))
+        self.assertEqual(len(clone.hops), 0)
+        self.assertEqual(bytes(clone.name), b"abc")
+        decoded = Telemetry()
+        decoded.deserialize(clone.serialize())
+        self.assertEqual(decoded, clone)
+        with self.assertRaises(TypeError):
+            self.packet.clone(missing=1)
+
+    def test_constructor_copies_packets(self):
+        origin = PointStruct(x=1, y=2)
+        packet = Observation(origin=origin)
+        origin.x = 5
+        self.assertEqual(packet.origin.x, 1)
+
+
 if __name__ == '__main__':
     unittest.main()
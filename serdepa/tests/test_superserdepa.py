@@ -3,8 +3,11 @@
 import unittest
 from codecs import decode, encode
 
+import pickle
+import threading
+
 from serdepa import (
-    SerdepaPacket, Length, List, Array, ByteString,
+    validate_all, SerdepaPacket, Length, List, Array, ByteString,
     nx_uint8, nx_uint16, nx_uint32, nx_uint64,
     nx_int8, nx_int16, nx_int32, nx_int64,
     uint8, uint16, uint32, uint64,
@@ -21,11 +24,13 @@ class FieldsTester(unittest.TestCase):
                     ('testfield', nx_uint8),
                     ('testfield', nx_uint64)
                 )
+            TestPacket()
         class TestPacket(SerdepaPacket):
             _fields_ = (
                 ('testfield1', nx_uint8),
                 ('testfield2', nx_uint64)
             )
+        TestPacket()
 
     def test_length_default_value(self):
         with self.assertRaises(PacketDefinitionError):
@@ -34,11 +39,13 @@ class FieldsTester(unittest.TestCase):
                     ('length_field', Length(nx_uint8, 'list_field'), 5),
                     ('list_field', List(nx_uint8))
                 )
+            TestPacket()
         class TestPacket(SerdepaPacket):
             _fields_ = (
                 ('length_field', Length(nx_uint8, 'list_field')),
                 ('list_field', List(nx_uint8))
             )
+        TestPacket()
 
     def test_missing_field_type(self):
         with self.assertRaises(PacketDefinitionError):
@@ -46,10 +53,12 @@ class FieldsTester(unittest.TestCase):
                 _fields_ = [
                     ['testfield']
                 ]
+            TestPacket()
         class TestPacket(SerdepaPacket):
             _fields_ = [
                 ['testfield', nx_uint8]
             ]
+        TestPacket()
 
     def test_invalid_field_type(self):
         with self.assertRaises(PacketDefinitionError):
@@ -57,10 +66,12 @@ class FieldsTester(unittest.TestCase):
                 _fields_ = [
                     ['testfield', int]
                 ]
+            TestPacket()
         class TestPacket(SerdepaPacket):
             _fields_ = [
                 ['testfield', nx_int16]
             ]
+        TestPacket()
 
     def test_undefined_length_list(self):
         with self.assertRaises(PacketDefinitionError):
@@ -69,10 +80,12 @@ class FieldsTester(unittest.TestCase):
                     ('testfield', List(nx_int8)),
                     ('testfield2', nx_uint8)
                 )
+            TestPacket()
         class TestPacket(SerdepaPacket):
             _fields_ = (
                 ('testfield', List(nx_int8)),
             )
+        TestPacket()
 
     def test_existing_property(self):
         with self.assertRaises(PacketDefinitionError):
@@ -82,8 +95,134 @@ class FieldsTester(unittest.TestCase):
                     ('testfield2', nx_uint8),
                 )
                 testfield2 = 1
+            TestPacket()
         class TestPacket(SerdepaPacket):
             _fields_ = (
                 ('testfield', nx_int8),
                 ('testfield2', nx_uint8),
             )
+        TestPacket()
+
+
+class LazyPreparationTester(unittest.TestCase):
+
+    def test_prepared_on_first_use(self):
+        class Lazy(SerdepaPacket):
+            _fields_ = (
+                ('a', nx_uint8),
+                ('b', nx_uint16),
+            )
+        self.assertNotIn('_fields', Lazy.__dict__)
+        self.assertNotIn('a', Lazy.__dict__)
+        self.assertEqual(Lazy.minimal_size(), 3)
+        self.assertIn('_fields', Lazy.__dict__)
+        self.assertEqual(Lazy(a=1, b=2).serialize(), decode('010002', 'hex'))
+
+    def test_error_on_every_use(self):
+        class Invalid(SerdepaPacket):
+            _fields_ = (
+                ('testfield', List(nx_int8)),
+                ('testfield2', nx_uint8)
+            )
+        for _ in range(2):
+            with self.assertRaises(PacketDefinitionError):
+                Invalid()
+            with self.assertRaises(PacketDefinitionError):
+                Invalid.static_size()
+        self.assertNotIn('testfield', Invalid.__dict__)
+
+    def test_validate_all(self):
+        class Valid(SerdepaPacket):
+            _fields_ = (
+                ('testfield', nx_uint8),
+            )
+
+        class Invalid(SerdepaPacket):
+            _fields_ = (
+                ('testfield', nx_uint8),
+                ('testfield', nx_uint8)
+            )
+        with self.assertRaises(PacketDefinitionError):
+            validate_all([Valid, Invalid])
+        validate_all([Valid])
+        self.assertIn('_fields', Valid.__dict__)
+
+    def test_root_is_not_prepared(self):
+        with self.assertRaises(AttributeError):
+            SerdepaPacket.missing
+        self.assertNotIn('_fields', SerdepaPacket.__dict__)
+
+        class Lazy(SerdepaPacket):
+            _fields_ = (
+                ('testfield', nx_uint8),
+            )
+        self.assertNotIn('_fields', Lazy.__dict__)
+
+    def test_root_is_empty(self):
+        packet = SerdepaPacket()
+        self.assertEqual(packet.serialize(), b'')
+        self.assertEqual(packet.deserialize(b''), 0)
+        self.assertEqual(SerdepaPacket.minimal_size(), 0)
+        self.assertNotIn('_fields', SerdepaPacket.__dict__)
+
+    def test_subclass(self):
+        class Base(SerdepaPacket):
+            _fields_ = (
+                ('a', nx_uint8),
+            )
+
+        class Derived(Base):
+            _fields_ = (
+                ('b', nx_uint8),
+            )
+
+        class Invalid(Base):
+            _fields_ = (
+                ('a', nx_uint8),
+            )
+        self.assertEqual(Base.minimal_size(), 1)
+        for _ in range(2):
+            with self.assertRaises(PacketDefinitionError):
+                Invalid()
+        self.assertIn('_fields', Derived.__dict__)
+        self.assertEqual(Derived.minimal_size(), 1)
+
+        class Later(Base):
+            _fields_ = (
+                ('c', nx_uint16),
+            )
+        self.assertIn('_fields', Later.__dict__)
+        self.assertEqual(Later.minimal_size(), 2)
+
+    def test_unpickled_instance(self):
+        data = pickle.dumps(Pickled(a=5))
+        del Pickled._fields
+        del Pickled.a
+        packet = pickle.loads(data)
+        self.assertEqual(packet.a, 5)
+
+    def test_threads(self):
+        class Shared(SerdepaPacket):
+            _fields_ = [('f{}'.format(i), nx_uint8, i) for i in range(50)]
+        results = []
+        start = threading.Barrier(4)
+
+        def use():
+            start.wait()
+            results.append(Shared().serialize())
+        threads = [threading.Thread(target=use) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [bytes(bytearray(range(50)))] * 4)
+
+
+class Pickled(SerdepaPacket):
+    _fields_ = (
+        ('a', nx_uint8),
+    )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,16 @@ setup(name='serdepa',
       author_email='github@thinnect.com',
       license='MIT',
       packages=['serdepa'],
-      install_requires=['six'],
-      test_suite='nose.collector',
-      tests_require=['nose'],
+      python_requires='>=3.9',
+      extras_require={'numpy': ['numpy']},
+      test_suite='serdepa.tests',
+      classifiers=[
+          'License :: OSI Approved :: MIT License',
+          'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3 :: Only',
+          'Programming Language :: Python :: 3.9',
+          'Programming Language :: Python :: 3.10',
+          'Programming Language :: Python :: 3.11',
+          'Programming Language :: Python :: 3.12',
+      ],
       zip_safe=False)